@@ -0,0 +1,172 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+class AlertDispatcher:
+    """Deliver alert emails from a background thread over one reused SMTP connection.
+
+    Alerts submitted within coalesce_seconds of each other are merged into a single
+    digest per recipient, and each recipient gets at most one email per
+    min_interval_seconds (held alerts are folded into the next digest, not dropped).
+    """
+
+    def __init__(self, email_address, email_password, smtp_host=None, smtp_port=None,
+                 use_tls=None, use_auth=None, coalesce_seconds=30, min_interval_seconds=300):
+        self.email_address = email_address
+        self.email_password = email_password
+        self.smtp_host = smtp_host or os.getenv('SMTP_HOST', 'smtp.gmail.com')
+        self.smtp_port = int(smtp_port or os.getenv('SMTP_PORT', 587))
+        self.use_tls = use_tls if use_tls is not None else os.getenv('SMTP_STARTTLS', '1') == '1'
+        # Local stand-in servers (e.g. `python -m aiosmtpd -n`) take mail without TLS or login
+        self.use_auth = use_auth if use_auth is not None else os.getenv('SMTP_AUTH', '1') == '1'
+        self.coalesce_seconds = coalesce_seconds
+        self.min_interval_seconds = min_interval_seconds
+
+        self.queue = queue.Queue()
+        self.pending = {}     # recipient -> [(subject, message), ...] waiting to go out
+        self.last_sent = {}   # recipient -> monotonic time of last delivery
+        self.server = None
+        self.thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, subject, message, recipient=None):
+        """Queue an alert without blocking the caller"""
+        if not self.email_address or (self.use_auth and not self.email_password):
+            logger.warning("Email credentials not configured properly")
+            return
+        self.queue.put((recipient or self.email_address, subject, message))
+
+    def close(self, timeout=30):
+        """Send everything still queued or held, then drop the SMTP connection"""
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            # Block until there is work, or until a held recipient may be sent again
+            try:
+                item = self.queue.get(timeout=self._next_due())
+            except queue.Empty:
+                item = False
+            if item is None:
+                stopping = True
+            elif item:
+                self._hold(item)
+                # Collect anything else that fires within the coalescing window
+                deadline = time.monotonic() + self.coalesce_seconds
+                while not stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self.queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                    else:
+                        self._hold(item)
+            self._deliver(force=stopping)
+        self._disconnect()
+
+    def _hold(self, item):
+        recipient, subject, message = item
+        self.pending.setdefault(recipient, []).append((subject, message))
+
+    def _next_due(self):
+        if not self.pending:
+            return None
+        now = time.monotonic()
+        waits = [
+            self.last_sent.get(recipient, 0) + self.min_interval_seconds - now
+            for recipient in self.pending
+        ]
+        return max(min(waits), 0.1)
+
+    def _deliver(self, force=False):
+        now = time.monotonic()
+        for recipient in list(self.pending):
+            last = self.last_sent.get(recipient)
+            if not force and last is not None and now - last < self.min_interval_seconds:
+                continue
+            alerts = self.pending.pop(recipient)
+            if len(alerts) == 1:
+                subject, message = alerts[0]
+            else:
+                subject = f"{alerts[-1][0]} (+{len(alerts) - 1} more)"
+                message = ("\n\n" + "-" * 50 + "\n\n").join(message for _, message in alerts)
+            if self._send(recipient, subject, message):
+                self.last_sent[recipient] = time.monotonic()
+            else:
+                # Keep the alerts for the next attempt
+                self.pending[recipient] = alerts + self.pending.get(recipient, [])
+                self.last_sent[recipient] = time.monotonic()
+
+    def _connect(self):
+        # smtplib and the MIME classes are only imported once there is something to send
+        import smtplib
+        logger.debug("Connecting to SMTP server %s:%s...", self.smtp_host, self.smtp_port)
+        server = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=30)
+        if self.use_tls:
+            server.starttls()
+        if self.use_auth:
+            try:
+                server.login(self.email_address, self.email_password)
+            except smtplib.SMTPException:
+                server.close()
+                raise
+        return server
+
+    def _disconnect(self):
+        import smtplib
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+
+    def _send(self, recipient, subject, message):
+        import smtplib
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.text import MIMEText
+        msg = MIMEMultipart()
+        msg['From'] = self.email_address
+        msg['To'] = recipient
+        msg['Subject'] = subject
+        msg.attach(MIMEText(message, 'plain'))
+
+        # Reuse the open connection; reconnect once if it has gone away
+        with metrics.SMTP_SEND_SECONDS.time():
+            for attempt in range(2):
+                try:
+                    if self.server is None:
+                        self.server = self._connect()
+                    self.server.send_message(msg)
+                    logger.info("Email sent successfully to %s: %s", recipient, subject)
+                    metrics.ALERTS_SENT.inc()
+                    return True
+                except smtplib.SMTPServerDisconnected as e:
+                    self.server = None
+                    if attempt == 1:
+                        logger.error("Error sending email: %s", e)
+                except smtplib.SMTPException as e:
+                    # Rejected login, sender or recipients: reconnecting won't help, and the
+                    # connection (if any) is still usable for the next alert.
+                    # SMTPException subclasses OSError, so this must come before OSError.
+                    logger.error("Error sending email: %s", e)
+                    break
+                except OSError as e:
+                    # Connection refused, reset or timed out
+                    self.server = None
+                    if attempt == 1:
+                        logger.error("Error sending email: %s", e)
+        metrics.ALERT_ERRORS.inc()
+        return False
@@ -0,0 +1,271 @@
+import json
+import os
+import time
+from collections import deque, namedtuple
+
+from readings import format_epoch
+
+DEFAULT_RULES_FILE = "alert_rules.json"
+DEFAULT_COOLDOWN_SECONDS = 300
+# Alerts on samples recorded more than this before the previous poll (a delayed ring sync) are not sent
+DEFAULT_MAX_ALERT_AGE_SECONDS = 300
+
+# The monitor's long-standing alert: a heart rate change of 10+ bpm within 5 minutes
+DEFAULT_RULES = [
+    {'name': 'rapid_change', 'metric': 'heart_rate', 'type': 'delta', 'change': 10, 'window_seconds': 300},
+]
+
+Alert = namedtuple('Alert', ['user_id', 'rule', 'metric', 'epoch', 'value', 'detail'])
+
+class MinMaxWindow:
+    """Trailing min and max over a time window via monotonic deques, O(1) amortized per sample"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.max_deque = deque()
+        self.min_deque = deque()
+
+    def push(self, epoch, value):
+        while self.max_deque and self.max_deque[-1][1] <= value:
+            self.max_deque.pop()
+        self.max_deque.append((epoch, value))
+        while self.min_deque and self.min_deque[-1][1] >= value:
+            self.min_deque.pop()
+        self.min_deque.append((epoch, value))
+        cutoff = epoch - self.seconds
+        while self.max_deque[0][0] < cutoff:
+            self.max_deque.popleft()
+        while self.min_deque[0][0] < cutoff:
+            self.min_deque.popleft()
+
+    @property
+    def minimum(self):
+        return self.min_deque[0][1]
+
+    @property
+    def maximum(self):
+        return self.max_deque[0][1]
+
+def parse_quiet_hours(spec):
+    """["22:00", "07:00"] -> (start, end) in seconds since local midnight, or None"""
+    if not spec:
+        return None
+    start, end = spec
+    to_seconds = lambda text: int(text[:2]) * 3600 + int(text[3:5]) * 60
+    return to_seconds(start), to_seconds(end)
+
+def in_quiet_hours(quiet_hours, epoch):
+    if quiet_hours is None:
+        return False
+    local = time.localtime(epoch)
+    seconds = local.tm_hour * 3600 + local.tm_min * 60 + local.tm_sec
+    start, end = quiet_hours
+    # A range like 22:00-07:00 wraps past midnight
+    return start <= seconds < end if start <= end else seconds >= start or seconds < end
+
+class Rule:
+    """One compiled rule with its own dedup and cooldown state"""
+    __slots__ = ('name', 'metric', 'cooldown', 'quiet_hours', 'last_fired')
+
+    def __init__(self, spec, quiet_hours):
+        self.name = spec['name']
+        self.metric = spec['metric']
+        self.cooldown = spec.get('cooldown_seconds', DEFAULT_COOLDOWN_SECONDS)
+        self.quiet_hours = parse_quiet_hours(spec['quiet_hours']) if 'quiet_hours' in spec else quiet_hours
+        self.last_fired = None
+
+    def fire(self, user_id, epoch, value, detail):
+        """An Alert unless the rule is cooling down or in quiet hours"""
+        if self.last_fired is not None and epoch - self.last_fired < self.cooldown:
+            return None
+        if in_quiet_hours(self.quiet_hours, epoch):
+            return None
+        self.last_fired = epoch
+        return Alert(user_id, self.name, self.metric, epoch, value, detail)
+
+class ThresholdRule(Rule):
+    """Fires when the value moves above `above` or below `below` (once per excursion)"""
+    __slots__ = ('above', 'below', 'active')
+
+    def __init__(self, spec, quiet_hours):
+        super().__init__(spec, quiet_hours)
+        self.above = spec.get('above')
+        self.below = spec.get('below')
+        self.active = False
+
+    def check(self, user_id, epoch, value, windows):
+        matched = (self.above is not None and value > self.above) or (self.below is not None and value < self.below)
+        was_active = self.active
+        self.active = matched
+        if matched and not was_active:
+            bound = f"above {self.above}" if self.above is not None and value > self.above else f"below {self.below}"
+            return self.fire(user_id, epoch, value, f"{self.metric} {value} {bound}")
+        return None
+
+class DeltaRule(Rule):
+    """Fires when the value has risen or dropped by `change` within `window_seconds`"""
+    __slots__ = ('change', 'window_seconds', 'direction')
+
+    def __init__(self, spec, quiet_hours):
+        super().__init__(spec, quiet_hours)
+        self.change = spec['change']
+        self.window_seconds = spec['window_seconds']
+        self.direction = spec.get('direction', 'any')
+
+    def check(self, user_id, epoch, value, windows):
+        window = windows[self.window_seconds]
+        rise = value - window.minimum
+        drop = window.maximum - value
+        if rise >= self.change and self.direction in ('any', 'up'):
+            return self.fire(user_id, epoch, value, f"{self.metric} rose {rise} to {value} within {self.window_seconds}s")
+        if drop >= self.change and self.direction in ('any', 'down'):
+            return self.fire(user_id, epoch, value, f"{self.metric} dropped {drop} to {value} within {self.window_seconds}s")
+        return None
+
+class SustainedRule(Rule):
+    """Fires once the value has stayed above `above` (or below `below`) for `duration_seconds`"""
+    __slots__ = ('above', 'below', 'duration', 'run_start', 'fired_this_run')
+
+    def __init__(self, spec, quiet_hours):
+        super().__init__(spec, quiet_hours)
+        self.above = spec.get('above')
+        self.below = spec.get('below')
+        self.duration = spec['duration_seconds']
+        self.run_start = None
+        self.fired_this_run = False
+
+    def check(self, user_id, epoch, value, windows):
+        matched = (self.above is not None and value > self.above) or (self.below is not None and value < self.below)
+        if not matched:
+            self.run_start = None
+            return None
+        if self.run_start is None:
+            self.run_start = epoch
+            self.fired_this_run = False
+        if not self.fired_this_run and epoch - self.run_start >= self.duration:
+            self.fired_this_run = True
+            bound = f"above {self.above}" if self.above is not None else f"below {self.below}"
+            return self.fire(user_id, epoch, value, f"{self.metric} {bound} for {epoch - self.run_start}s")
+        return None
+
+RULE_TYPES = {'threshold': ThresholdRule, 'delta': DeltaRule, 'sustained': SustainedRule}
+
+def validate_rule(spec):
+    for field in ('name', 'metric', 'type'):
+        if field not in spec:
+            raise ValueError(f"Alert rule needs {field}: {spec}")
+    if spec['type'] not in RULE_TYPES:
+        raise ValueError(f"Unknown alert rule type {spec['type']!r} in rule {spec['name']}")
+    if spec['type'] in ('threshold', 'sustained') and spec.get('above') is None and spec.get('below') is None:
+        raise ValueError(f"Alert rule {spec['name']} needs above or below")
+    required = {'delta': ('change', 'window_seconds'), 'sustained': ('duration_seconds',)}.get(spec['type'], ())
+    for field in required:
+        if field not in spec:
+            raise ValueError(f"Alert rule {spec['name']} needs {field}")
+
+class CompiledRules:
+    """All of one user's rules for one metric, sharing one trailing window per window length"""
+
+    def __init__(self, user_id, specs, quiet_hours):
+        self.user_id = user_id
+        self.rules = [RULE_TYPES[spec['type']](spec, quiet_hours) for spec in specs]
+        self.windows = {
+            rule.window_seconds: MinMaxWindow(rule.window_seconds)
+            for rule in self.rules if isinstance(rule, DeltaRule)
+        }
+        self.last_epoch = None
+
+    def push(self, epoch, value):
+        """Evaluate a sample. Returns fired Alerts; samples not newer than the last are ignored"""
+        if self.last_epoch is not None and epoch <= self.last_epoch:
+            return []
+        self.last_epoch = epoch
+        for window in self.windows.values():
+            window.push(epoch, value)
+        alerts = []
+        for rule in self.rules:
+            alert = rule.check(self.user_id, epoch, value, self.windows)
+            if alert:
+                alerts.append(alert)
+        return alerts
+
+class AlertEngine:
+    """Per-user declarative alert rules, compiled once and evaluated sample by sample.
+
+    Config (JSON):
+        {"rules": [...default rules...],
+         "quiet_hours": ["22:00", "07:00"],
+         "users": {"alice": {"rules": [...], "quiet_hours": [...]}}}
+    A user's own rules are used in addition to the defaults unless they set
+    "replace_defaults": true.
+    """
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.default_rules = config.get('rules', DEFAULT_RULES)
+        self.quiet_hours = parse_quiet_hours(config.get('quiet_hours'))
+        self.users = config.get('users', {})
+        for spec in self.default_rules:
+            validate_rule(spec)
+        for user in self.users.values():
+            for spec in user.get('rules', []):
+                validate_rule(spec)
+        self.compiled = {}
+
+    def rules_for(self, user_id, metric):
+        key = (user_id, metric)
+        compiled = self.compiled.get(key)
+        if compiled is None:
+            user = self.users.get(user_id, {})
+            specs = [] if user.get('replace_defaults') else list(self.default_rules)
+            specs += user.get('rules', [])
+            quiet_hours = parse_quiet_hours(user['quiet_hours']) if 'quiet_hours' in user else self.quiet_hours
+            compiled = self.compiled[key] = CompiledRules(user_id, [s for s in specs if s['metric'] == metric],
+                                                          quiet_hours)
+        return compiled
+
+    def evaluate(self, user_id, metric, epoch, value):
+        """Alerts fired by one new sample"""
+        compiled = self.rules_for(user_id, metric)
+        if not compiled.rules:
+            return []
+        return compiled.push(epoch, value)
+
+    def warm_up(self, user_id, metric, samples):
+        """Feed already-handled (epoch, value) samples through the rules, discarding what they fire"""
+        compiled = self.rules_for(user_id, metric)
+        if compiled.rules:
+            for epoch, value in samples:
+                compiled.push(epoch, value)
+
+def recent_alerts(alerts, now_epoch, previous_poll=None, max_age_seconds=DEFAULT_MAX_ALERT_AGE_SECONDS):
+    """Alerts on samples recorded since the previous poll (or, on the first poll, just before now_epoch).
+
+    max_age_seconds of slack covers the ring's upload delay, and basing the cutoff on the
+    previous poll keeps alerts from the whole gap when polls are far apart (overnight backoff).
+    """
+    since = now_epoch if previous_poll is None else min(now_epoch, previous_poll)
+    cutoff = since - max_age_seconds
+    return [alert for alert in alerts if alert.epoch >= cutoff]
+
+def load_alert_rules(path=None):
+    """AlertEngine from ALERT_RULES_FILE (default alert_rules.json), or the default rules if there is none"""
+    path = path or os.getenv('ALERT_RULES_FILE', DEFAULT_RULES_FILE)
+    if not os.path.exists(path):
+        return AlertEngine()
+    with open(path) as f:
+        return AlertEngine(json.load(f))
+
+def build_rule_alert_email(alerts, context=None):
+    """(subject, message) combining the alerts fired for one user, followed by any context text"""
+    first = alerts[0]
+    if len(alerts) == 1:
+        subject = f"⚠️ {first.rule} - {first.metric} {first.value}"
+    else:
+        subject = f"⚠️ {len(alerts)} alerts - {', '.join(sorted({alert.rule for alert in alerts}))}"
+    message = f"Alert for {first.user_id}:\n"
+    for alert in alerts:
+        message += f"\n{format_epoch(alert.epoch)}: [{alert.rule}] {alert.detail}"
+    if context:
+        message += f"\n\n{context}"
+    return subject, message
@@ -0,0 +1,97 @@
+from collections import namedtuple
+from datetime import datetime
+
+from readings import Reading, parse_timestamp
+
+try:
+    # Decodes straight from the response bytes, several times faster than json on heartrate pages
+    from orjson import loads
+except ImportError:
+    from json import loads
+
+# Typed records for the API payloads the monitors read. Fields the API may omit or
+# send as null are None; fields a record is useless without raise ValueError instead.
+
+ReadinessContributors = namedtuple('ReadinessContributors', [
+    'activity_balance', 'body_temperature', 'hrv_balance', 'previous_day_activity',
+    'previous_night', 'recovery_index', 'resting_heart_rate', 'sleep_balance'
+], defaults=[None] * 8)
+
+DailyReadiness = namedtuple('DailyReadiness', [
+    'id', 'day', 'score', 'temperature_deviation', 'temperature_trend_deviation', 'timestamp', 'contributors'
+], defaults=[None, None, None, None, ReadinessContributors()])
+
+PersonalInfo = namedtuple('PersonalInfo', ['id', 'age', 'weight', 'height', 'biological_sex', 'email'],
+                          defaults=[None] * 5)
+
+# One Garmin overnight HRV reading; epoch comes from Garmin's local wall-clock startTimeLocal
+HrvSummary = namedtuple('HrvSummary', ['epoch', 'avg_hrv', 'start_time_local'])
+
+def _required(record, field, kind):
+    value = record.get(field)
+    if value is None:
+        raise ValueError(f"{kind} record is missing {field}: {record}")
+    return value
+
+def reading_from_record(record):
+    """Reading from a /heartrate record; bpm and timestamp are required, source is optional"""
+    # Checked inline rather than via _required: this runs once per 5-second sample
+    timestamp = record.get('timestamp')
+    bpm = record.get('bpm')
+    if timestamp is None or bpm is None:
+        raise ValueError(f"heartrate record is missing {'timestamp' if timestamp is None else 'bpm'}: {record}")
+    return Reading(parse_timestamp(timestamp), bpm, record.get('source'))
+
+def readiness_from_record(record):
+    """DailyReadiness from a /daily_readiness record; only day is required"""
+    contributors = record.get('contributors') or {}
+    return DailyReadiness(
+        record.get('id'),
+        _required(record, 'day', 'daily_readiness'),
+        record.get('score'),
+        record.get('temperature_deviation'),
+        record.get('temperature_trend_deviation'),
+        record.get('timestamp'),
+        ReadinessContributors(
+            contributors.get('activity_balance'),
+            contributors.get('body_temperature'),
+            contributors.get('hrv_balance'),
+            contributors.get('previous_day_activity'),
+            contributors.get('previous_night'),
+            contributors.get('recovery_index'),
+            contributors.get('resting_heart_rate'),
+            contributors.get('sleep_balance')
+        )
+    )
+
+def personal_info_from_record(record):
+    """PersonalInfo from a /personal_info response; every field is optional"""
+    return PersonalInfo(
+        record.get('id'),
+        record.get('age'),
+        record.get('weight'),
+        record.get('height'),
+        record.get('biological_sex'),
+        record.get('email')
+    )
+
+def decode_page(body, decode=None):
+    """(records, next_token) from a raw collection page, each record passed through decode if given"""
+    page = loads(body)
+    records = page.get('data') or []
+    if decode is not None:
+        records = [decode(record) for record in records]
+    return records, page.get('next_token')
+
+def decode_personal_info(body):
+    return personal_info_from_record(loads(body))
+
+def hrv_summaries(payload):
+    """HrvSummary list from a Garmin get_hrv_data payload, skipping entries without a time or value"""
+    summaries = []
+    for item in (payload or {}).get('hrvSummaries') or []:
+        timestamp = item.get('startTimeLocal')
+        value = item.get('avgHrv')
+        if timestamp and value is not None:
+            summaries.append(HrvSummary(int(datetime.fromisoformat(timestamp).timestamp()), value, timestamp))
+    return summaries
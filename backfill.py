@@ -0,0 +1,190 @@
+import argparse
+import gzip
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, time, timedelta, timezone
+from dotenv import load_dotenv
+
+import requests
+import oura_client
+
+# Days per request for each endpoint, kept within the API's range limits
+SHARD_DAYS = {
+    'heartrate': 1,
+    'daily_readiness': 30,
+}
+ENDPOINTS = ['heartrate', 'daily_readiness', 'personal_info']
+
+class Checkpoint:
+    """Set of finished shard keys persisted to disk so an interrupted backfill resumes.
+
+    Keys are appended one per line, so marking a shard costs the same however many are
+    already done. A line cut short by a crash matches no shard and is simply refetched.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = set()
+        text = ""
+        if os.path.exists(path):
+            with open(path) as f:
+                text = f.read()
+            self.done = set(text.splitlines())
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.file = open(path, 'a')
+        if text and not text.endswith("\n"):
+            # Don't append onto a partial line left by a crash
+            self.file.write("\n")
+
+    def __contains__(self, key):
+        return key in self.done
+
+    def mark(self, key):
+        with self.lock:
+            self.done.add(key)
+            self.file.write(key + "\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def write_atomic(path, data):
+    """Write bytes to path via a temp file and rename, so a crash never leaves a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def write_day(out_dir, user_id, endpoint, day, records):
+    """Write one day's records as gzip-compressed JSON lines"""
+    path = os.path.join(out_dir, user_id, endpoint, f"day={day}.jsonl.gz")
+    lines = "".join(json.dumps(record) + "\n" for record in records)
+    write_atomic(path, gzip.compress(lines.encode()))
+
+def plan_shards(user, endpoints, start, end):
+    """Split [start, end] into (user, endpoint, shard_start, shard_end) pieces"""
+    shards = []
+    for endpoint in endpoints:
+        if endpoint == 'personal_info':
+            shards.append((user, endpoint, end, end))
+            continue
+        step = timedelta(days=SHARD_DAYS[endpoint])
+        shard_start = start
+        while shard_start <= end:
+            shard_end = min(shard_start + step - timedelta(days=1), end)
+            shards.append((user, endpoint, shard_start, shard_end))
+            shard_start = shard_end + timedelta(days=1)
+    return shards
+
+def fetch_shard(out_dir, user, endpoint, shard_start, shard_end):
+    """Fetch one shard and write it out partitioned by day. Returns the record count"""
+    api_key = user['api_key']
+    user_id = user['user_id']
+
+    if endpoint == 'personal_info':
+        response = oura_client.get(endpoint, api_key, use_cache=False)
+        response.raise_for_status()
+        write_day(out_dir, user_id, endpoint, shard_end.isoformat(), [response.json()])
+        return 1
+
+    if endpoint == 'heartrate':
+        params = {
+            "start_datetime": datetime.combine(shard_start, time.min, timezone.utc).isoformat(),
+            "end_datetime": datetime.combine(shard_end + timedelta(days=1), time.min, timezone.utc).isoformat()
+        }
+    else:
+        params = {"start_date": shard_start.isoformat(), "end_date": shard_end.isoformat()}
+
+    by_day = {}
+    # History is written straight to disk, so don't let it churn the response cache
+    for record in oura_client.iter_collection(endpoint, api_key, params, use_cache=False):
+        day = record['day'] if 'day' in record else record['timestamp'][:10]
+        by_day.setdefault(day, []).append(record)
+
+    # Write every day in the shard, even empty ones, so gaps are distinguishable from unfetched days
+    day = shard_start
+    while day <= shard_end:
+        write_day(out_dir, user_id, endpoint, day.isoformat(), by_day.get(day.isoformat(), []))
+        day += timedelta(days=1)
+    return sum(len(records) for records in by_day.values())
+
+def complete_before():
+    """First day that may still gain data: today, in UTC (heart rate shards) or local time (daily records)"""
+    return min(date.today(), datetime.now(timezone.utc).date())
+
+def backfill(users, endpoints, start, end, out_dir, workers=4):
+    """Fetch all shards for all users with a bounded thread pool, skipping checkpointed ones.
+
+    Shards reaching today are fetched but not checkpointed, so a later run fetches the rest of the day.
+    """
+    checkpoint = Checkpoint(os.path.join(out_dir, ".checkpoint"))
+    incomplete = complete_before()
+    shards = []
+    for user in users:
+        shards.extend(plan_shards(user, endpoints, start, end))
+
+    todo = [shard for shard in shards if shard_key(*shard) not in checkpoint]
+    print(f"{len(shards)} shards planned, {len(shards) - len(todo)} already done")
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch_shard, out_dir, *shard): shard for shard in todo}
+        for future in as_completed(futures):
+            shard = futures[future]
+            key = shard_key(*shard)
+            try:
+                count = future.result()
+            except (requests.exceptions.RequestException, ValueError, OSError) as e:
+                # API, decode or disk errors fail this shard only; the rest of the run carries on
+                failed += 1
+                print(f"Error fetching {key}: {e}")
+                continue
+            if shard[3] < incomplete:
+                checkpoint.mark(key)
+            print(f"Done {key} ({count} records)")
+    checkpoint.close()
+
+    if failed:
+        print(f"\n{failed} shards failed; re-run the same command to retry them")
+    return failed
+
+def shard_key(user, endpoint, shard_start, shard_end):
+    return f"{user['user_id']}/{endpoint}/{shard_start.isoformat()}/{shard_end.isoformat()}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill Oura history to day-partitioned gzip JSONL")
+    parser.add_argument('--start', required=True, type=date.fromisoformat, help="First day, YYYY-MM-DD")
+    parser.add_argument('--end', type=date.fromisoformat, default=date.today(), help="Last day, YYYY-MM-DD (default today)")
+    parser.add_argument('--endpoints', default=",".join(ENDPOINTS), help="Comma-separated endpoints")
+    parser.add_argument('--out', default="backfill", help="Output directory")
+    parser.add_argument('--workers', type=int, default=4, help="Parallel requests")
+    parser.add_argument('--users-file', help="JSON list of users (as for multi_user_monitor.py)")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    if args.users_file:
+        with open(args.users_file) as f:
+            users = json.load(f)
+    else:
+        api_key = os.getenv('OURA_API_KEY')
+        if not api_key:
+            print("Error: Oura API key not found in .env file")
+            print("Please set OURA_API_KEY in your .env file or pass --users-file")
+            return 1
+        users = [{'user_id': os.getenv('OURA_USER_ID', 'default'), 'api_key': api_key}]
+
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(",") if endpoint.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    failed = backfill(users, endpoints, args.start, args.end, args.out, args.workers)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
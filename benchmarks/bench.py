@@ -0,0 +1,161 @@
+import argparse
+import contextlib
+import io
+import json
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+
+import oura_client
+import hr_vectorized
+from api_models import decode_page, reading_from_record
+from alert_rules import AlertEngine
+from oura_heart_rate import OuraHeartRate, analyze_heart_rate, format_timestamp, monitor_tick
+from online_analyzer import OnlineAnalyzer
+from poll_scheduler import AdaptivePollScheduler
+from readings import HeartRateSeries, normalize
+from sample_store import HeartRateStore
+from stress_baseline import WellnessTable, score_table
+from stress_monitor import analyze_wellness, assess_stress_level
+from benchmarks.synthetic import heart_rate_readings, readiness_days
+from benchmarks.fake_oura_server import FakeOuraServer
+
+class NullDispatcher:
+    """Alert sink that drops everything, so benchmarks never touch SMTP"""
+
+    def __init__(self):
+        self.alerts = 0
+
+    def submit(self, subject, message, recipient=None):
+        self.alerts += 1
+
+    def close(self):
+        pass
+
+def measure(func, items, repeat):
+    """Best-of-repeat wall time plus peak traced memory of one extra run"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'seconds': best,
+        'items': items,
+        'items_per_second': items / best if best else float('inf'),
+        'peak_mib': peak / (1024 * 1024)
+    }
+
+def bench_analysis(days, repeat):
+    start = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+    raw = list(heart_rate_readings(start, days=days))
+    data = {'data': raw}
+    series = HeartRateSeries(raw)
+    timestamps, bpm = series.to_arrays()
+    oura = OuraHeartRate('bench')
+    n = len(raw)
+    # A day of 5-second samples is ~17k records, well past one API page
+    page = json.dumps({'data': raw, 'next_token': None}).encode()
+
+    def online():
+        analyzer = OnlineAnalyzer()
+        analyzer.feed(series)
+        analyzer.result(3600)
+
+    def sync_check():
+        with contextlib.redirect_stdout(io.StringIO()):
+            oura.check_sync_status(data)
+
+    return {
+        'analyze_heart_rate (dicts)': measure(lambda: analyze_heart_rate(data), n, repeat),
+        'analyze_heart_rate (series)': measure(lambda: analyze_heart_rate(series), n, repeat),
+        'hr_vectorized.analyze_arrays': measure(lambda: hr_vectorized.analyze_arrays(timestamps, bpm), n, repeat),
+        'OnlineAnalyzer.feed (3 windows)': measure(online, n, repeat),
+        'HeartRateSeries from dicts': measure(lambda: HeartRateSeries(raw), n, repeat),
+        'heartrate page json.loads + normalize': measure(
+            lambda: list(normalize(json.loads(page)['data'])), n, repeat),
+        'heartrate page decode_page (typed)': measure(
+            lambda: decode_page(page, reading_from_record), n, repeat),
+        'check_sync_status (dicts)': measure(sync_check, n, repeat),
+        'format_timestamp (iso strings)': measure(
+            lambda: [format_timestamp(r['timestamp']) for r in raw[:10000]], min(n, 10000), repeat),
+    }
+
+def bench_stress(days, users, repeat):
+    records_by_user = {f"user{seed}": readiness_days(date(2024, 1, 1), days=days, seed=seed) for seed in range(users)}
+    records = [record for user_records in records_by_user.values() for record in user_records]
+    payloads = [{'data': [record]} for record in records]
+    table = WellnessTable.from_readiness(records_by_user)
+
+    def score():
+        for payload in payloads:
+            assess_stress_level(analyze_wellness(payload))
+
+    return {
+        'analyze_wellness + assess_stress_level': measure(score, len(payloads), repeat),
+        'score_table (30-day baselines)': measure(lambda: score_table(table), len(table), repeat),
+    }
+
+def bench_monitor_tick(repeat, latency, rate_limit_probability):
+    """A cold tick (empty store, full hour) and a cold tick followed by 12 steady 5 minute ticks"""
+    results = {}
+    with FakeOuraServer(latency=latency, rate_limit_probability=rate_limit_probability) as server:
+        oura = OuraHeartRate('bench-token')
+        oura.base_url = server.base_url
+        # Ticks stay in the past so the client never clamps them to the real clock
+        base = datetime.now().astimezone() - timedelta(hours=2)
+        steady_ticks = [base + timedelta(minutes=5 * i) for i in range(13)]
+
+        def run(ticks):
+            store = HeartRateStore(':memory:')
+            analyzer = OnlineAnalyzer(windows=(300, 3600))
+            dispatcher = NullDispatcher()
+            scheduler = AdaptivePollScheduler()
+            alert_engine = AlertEngine()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for tick in ticks:
+                    monitor_tick(oura, store, 'bench', analyzer, dispatcher, scheduler, alert_engine, now=tick)
+            store.close()
+
+        results['monitor_tick (cold, 1h)'] = measure(lambda: run([base]), 1, repeat)
+        results['monitor_tick (cold + 12 steady)'] = measure(lambda: run(steady_ticks), 13, repeat)
+        results['fake API requests served'] = {'items': server.requests, 'rate_limited': server.rate_limited}
+    return results
+
+def print_report(results):
+    print(f"{'benchmark':40} {'seconds':>10} {'items/s':>14} {'peak MiB':>10}")
+    print("-" * 78)
+    for name, result in results.items():
+        if 'seconds' not in result:
+            print(f"{name:40} {result}")
+            continue
+        print(f"{name:40} {result['seconds']:>10.4f} {result['items_per_second']:>14,.0f} {result['peak_mib']:>10.2f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark analysis, scoring and monitor ticks on synthetic data")
+    parser.add_argument('--days', type=float, default=1, help="Days of 5-second heart rate samples")
+    parser.add_argument('--users', type=int, default=100, help="Users for readiness scoring")
+    parser.add_argument('--readiness-days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0, help="Fake API latency per request (seconds)")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="Share of fake API requests answered with 429")
+    parser.add_argument('--json', help="Also write results to this file")
+    args = parser.parse_args(argv)
+
+    oura_client.BACKOFF_FACTOR = 0
+    results = {}
+    results.update(bench_analysis(args.days, args.repeat))
+    results.update(bench_stress(args.readiness_days, args.users, args.repeat))
+    results.update(bench_monitor_tick(args.repeat, args.latency, args.rate_limit))
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import json
+import random
+import threading
+import time
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from benchmarks.synthetic import heart_rate_readings, readiness_days, personal_info
+
+class FakeOuraServer:
+    """Local stand-in for api.ouraring.com's /v2/usercollection endpoints.
+
+    Serves synthetic heartrate, daily_readiness and personal_info data with next_token
+    pagination, plus configurable per-request latency and a share of 429 responses.
+    Point the client at it by setting oura_client.BASE_URL (or OuraHeartRate.base_url)
+    to server.base_url.
+    """
+
+    def __init__(self, page_size=1000, latency=0.0, rate_limit_probability=0.0, seed=0):
+        self.page_size = page_size
+        self.latency = latency
+        self.rate_limit_probability = rate_limit_probability
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.rate_limited = 0
+        self.results = {}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}/v2/usercollection"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _records(self, endpoint, token, query):
+        """Full (unpaginated) result for a query, generated once and memoized"""
+        key = (endpoint, token, query.get('start_datetime'), query.get('end_datetime'),
+               query.get('start_date'), query.get('end_date'))
+        with self.lock:
+            if key in self.results:
+                return self.results[key]
+        seed = sum(token.encode())
+        if endpoint == 'heartrate':
+            start = int(datetime.fromisoformat(query['start_datetime']).timestamp())
+            end = int(datetime.fromisoformat(query['end_datetime']).timestamp())
+            # Align to the 5 second grid so overlapping requests return the same samples
+            start -= start % 5
+            records = list(heart_rate_readings(start, days=(end - start + 1) / 86400, seed=seed))
+        elif endpoint == 'daily_readiness':
+            start = date.fromisoformat(query['start_date'])
+            end = date.fromisoformat(query['end_date'])
+            records = readiness_days(start, days=(end - start).days + 1, seed=seed)
+        else:
+            records = None
+        with self.lock:
+            self.results[key] = records
+        return records
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out as separate writes; don't let Nagle delay keep-alive replies
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, status, payload, headers=None):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with server.lock:
+                    server.requests += 1
+                    limited = server.rng.random() < server.rate_limit_probability
+                    if limited:
+                        server.rate_limited += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if limited:
+                    self.send_json(429, {'detail': 'Too Many Requests'}, {'Retry-After': '0'})
+                    return
+
+                url = urlparse(self.path)
+                endpoint = url.path.rstrip('/').rsplit('/', 1)[-1]
+                query = {name: values[0] for name, values in parse_qs(url.query).items()}
+                token = self.headers.get('Authorization', '').replace('Bearer ', '')
+
+                if endpoint == 'personal_info':
+                    self.send_json(200, personal_info(sum(token.encode())))
+                    return
+                if endpoint not in ('heartrate', 'daily_readiness'):
+                    self.send_json(404, {'detail': 'Not Found'})
+                    return
+
+                records = server._records(endpoint, token, query)
+                offset = int(query.get('next_token', 0))
+                page = records[offset:offset + server.page_size]
+                next_offset = offset + server.page_size
+                self.send_json(200, {
+                    'data': page,
+                    'next_token': str(next_offset) if next_offset < len(records) else None
+                })
+
+        return Handler
@@ -0,0 +1,76 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+# Entry points a cron job or container starts, cheapest first
+DEFAULT_MODULES = ("ingest", "daemon", "oura_heart_rate", "multi_user_monitor", "stress_baseline", "replay")
+
+def import_wall_seconds(module, repeat):
+    """Best-of-repeat wall time of a fresh interpreter that only imports module"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def import_times(module):
+    """{imported module: (self_us, cumulative_us)} from python -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time:   self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+def bench_module(module, repeat, top, startup_modules=()):
+    times = import_times(module)
+    heaviest = sorted(times.items(), key=lambda item: item[1][1], reverse=True)
+    return {
+        'wall_seconds': import_wall_seconds(module, repeat),
+        'import_seconds': times[module][1] / 1e6 if module in times else None,
+        'modules_imported': len(times),
+        # Top-level packages only, so a heavy dependency shows once rather than with each
+        # submodule, and none the bare interpreter loads anyway (site, .pth hooks)
+        'heaviest': [
+            {'module': name, 'cumulative_ms': cumulative / 1000, 'self_ms': own / 1000}
+            for name, (own, cumulative) in heaviest
+            if '.' not in name and name != module and name not in startup_modules
+        ][:top]
+    }
+
+def print_report(interpreter_seconds, results):
+    print(f"bare interpreter: {interpreter_seconds * 1000:.0f}ms")
+    for module, result in results.items():
+        print(f"{module}: {result['wall_seconds'] * 1000:.0f}ms process, "
+              f"{result['import_seconds'] * 1000:.0f}ms importing {result['modules_imported']} modules")
+        for entry in result['heaviest']:
+            print(f"  {entry['module']:30} {entry['cumulative_ms']:>8.1f}ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of each entry point")
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES, help="Modules to import")
+    parser.add_argument('--top', type=int, default=8, help="Heaviest imports to list per module")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help="Also write results to this file")
+    args = parser.parse_args(argv)
+
+    interpreter_seconds = import_wall_seconds("sys", args.repeat)
+    startup_modules = set(import_times("sys"))
+    results = {module: bench_module(module, args.repeat, args.top, startup_modules) for module in args.modules}
+    print_report(interpreter_seconds, results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'interpreter_seconds': interpreter_seconds, 'modules': results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import math
+import random
+from datetime import date, datetime, timedelta, timezone
+
+SAMPLE_SECONDS = 5
+
+def heart_rate_readings(start_epoch, days=1, seed=0, sample_seconds=SAMPLE_SECONDS, gap_probability=0.0005):
+    """Yield raw /heartrate records: a diurnal curve with noise, activity bursts and sync gaps"""
+    rng = random.Random(seed)
+    resting = rng.randint(50, 65)
+    epoch = start_epoch
+    end = start_epoch + days * 86400
+    burst = 0
+    while epoch < end:
+        hour = (epoch % 86400) / 3600
+        asleep = hour < 6 or hour >= 23
+        # Lower at night, peaking mid-afternoon
+        base = resting + (0 if asleep else 12 + 8 * math.sin((hour - 9) / 24 * 2 * math.pi))
+        if burst:
+            burst -= 1
+            base += 45
+        elif not asleep and rng.random() < 0.0008:
+            burst = rng.randint(60, 360)
+        bpm = int(max(35, min(200, rng.gauss(base, 3))))
+        yield {
+            'bpm': bpm,
+            'source': 'sleep' if asleep else ('workout' if burst else 'awake'),
+            'timestamp': datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+        }
+        if rng.random() < gap_probability:
+            # Ring off the finger / not synced for a while
+            epoch += rng.randint(600, 3600)
+        epoch += sample_seconds
+
+def fleet_heart_rate(users, start_epoch, days=1):
+    """{user_id: [readings]} for a fleet of synthetic users"""
+    return {
+        f"user{i}": list(heart_rate_readings(start_epoch, days=days, seed=i))
+        for i in range(users)
+    }
+
+def readiness_days(start_day, days=30, seed=0):
+    """Raw /daily_readiness records for consecutive days"""
+    rng = random.Random(seed)
+    records = []
+    for offset in range(days):
+        day = start_day + timedelta(days=offset)
+        records.append({
+            'id': f"{seed}-{day.isoformat()}",
+            'day': day.isoformat(),
+            'score': rng.randint(55, 95),
+            'temperature_deviation': round(rng.gauss(0, 0.35), 2),
+            'temperature_trend_deviation': round(rng.gauss(0, 0.2), 2),
+            'timestamp': datetime.combine(day, datetime.min.time(), timezone.utc).isoformat(),
+            'contributors': {
+                'activity_balance': rng.randint(50, 100),
+                'body_temperature': rng.randint(60, 100),
+                'hrv_balance': rng.randint(45, 100),
+                'previous_day_activity': rng.randint(50, 100),
+                'previous_night': rng.randint(50, 100),
+                'recovery_index': rng.randint(45, 100),
+                'resting_heart_rate': rng.randint(50, 100),
+                'sleep_balance': rng.randint(50, 100),
+            }
+        })
+    return records
+
+def personal_info(seed=0):
+    rng = random.Random(seed)
+    return {
+        'id': f"user-{seed}",
+        'age': rng.randint(20, 70),
+        'weight': round(rng.uniform(50, 100), 1),
+        'height': round(rng.uniform(1.5, 2.0), 2),
+        'biological_sex': rng.choice(['male', 'female']),
+        'email': f"user{seed}@example.com"
+    }
+
+def garmin_hrv_payload(day, seed=0):
+    """A Garmin get_hrv_data-style payload with overnight hrvSummaries"""
+    rng = random.Random(f"{seed}-{day}")
+    start = datetime.combine(date.fromisoformat(day), datetime.min.time())
+    summaries = []
+    for minutes in range(0, 8 * 60, 5):
+        summaries.append({
+            'startTimeLocal': (start + timedelta(minutes=minutes)).isoformat(),
+            'avgHrv': round(rng.gauss(45, 8), 1)
+        })
+    return {'hrvSummaries': summaries}
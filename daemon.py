@@ -0,0 +1,294 @@
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import metrics
+from alert_dispatcher import AlertDispatcher
+from ingest import (GARMIN_DAY_FETCHED, HEART_RATE, GarminSource, IngestPipeline, OuraHeartRateSource, Sample,
+                    load_users, sources_for_user)
+from oura_client import TokenBucket
+from poll_scheduler import AdaptivePollScheduler
+from sample_store import HeartRateStore, DEFAULT_STORE_PATH
+
+logger = logging.getLogger(__name__)
+
+# Stored heart rate replayed into the alert rules at startup, covering their windows
+WARM_UP_SECONDS = 3600
+# Stored daily metrics replayed at startup: today's and yesterday's, stamped at the start of their day
+DAILY_WARM_UP_SECONDS = 2 * 86400
+
+class Job:
+    """One source polled on its own schedule, with the bookkeeping /health reports"""
+
+    def __init__(self, source, clock=time.time):
+        self.source = source
+        self.clock = clock
+        # Heart rate backs off while the ring is stale or asleep; daily metrics poll at a fixed interval
+        self.scheduler = None
+        if getattr(source, 'adaptive', False):
+            self.scheduler = AdaptivePollScheduler(base_seconds=source.interval_seconds, clock=clock)
+        self.started = clock()
+        self.last_success = None
+        self.last_error = None
+
+    def next_delay(self, samples):
+        if self.scheduler is None:
+            return self.source.interval_seconds
+        latest = samples[-1] if samples else None
+        self.scheduler.observe(
+            len(samples),
+            latest.epoch if latest else None,
+            latest.activity if latest else None
+        )
+        return self.scheduler.seconds_until_next()
+
+    def max_quiet_seconds(self):
+        """How long the job may go without a successful poll before it counts as unhealthy"""
+        interval = self.scheduler.max_seconds if self.scheduler else self.source.interval_seconds
+        return 3 * interval
+
+    def healthy(self):
+        since = self.last_success if self.last_success is not None else self.started
+        return self.clock() - since <= self.max_quiet_seconds()
+
+async def run_in_thread(func):
+    """Await func() run in a daemon thread.
+
+    Unlike asyncio.to_thread, nothing waits for the thread at shutdown: a request stuck
+    on a slow API is abandoned rather than holding up exit.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(result, error):
+        if not future.done():
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def target():
+        result = error = None
+        try:
+            result = func()
+        except Exception as e:
+            error = e
+        try:
+            loop.call_soon_threadsafe(resolve, result, error)
+        except RuntimeError:
+            # The loop has already closed; the result is no longer wanted
+            pass
+
+    threading.Thread(target=target, daemon=True).start()
+    return await future
+
+class Daemon:
+    """Every monitor as a scheduled job on one asyncio event loop.
+
+    Blocking API calls run in worker threads within a global concurrency limit, and every
+    HTTP request they make waits on a token bucket per API token or Garmin account.
+    Samples are processed on the loop thread, which is the only one that touches the
+    store. SIGTERM and SIGINT stop scheduling new polls, let in-flight ones finish for
+    up to grace_seconds, abandon the rest and return so the caller can flush.
+    """
+
+    def __init__(self, pipeline, sources, max_concurrency=20, token_rate=0.5, token_burst=5,
+                 grace_seconds=10, clock=time.time):
+        self.pipeline = pipeline
+        self.jobs = [Job(source, clock) for source in sources]
+        self.max_concurrency = max_concurrency
+        self.grace_seconds = grace_seconds
+        self.clock = clock
+        self.stopping = None
+        # One bucket per account, shared by all of its jobs (a user's heart rate and readiness polls)
+        self.buckets = {}
+        for job in self.jobs:
+            account = getattr(job.source, 'account', job.source.name)
+            if account not in self.buckets:
+                self.buckets[account] = TokenBucket(token_rate, token_burst)
+            if hasattr(job.source, 'use_rate_limit'):
+                job.source.use_rate_limit(self.buckets[account])
+
+    async def wait(self, seconds):
+        """Sleep for seconds, returning early if the daemon is stopping"""
+        try:
+            await asyncio.wait_for(self.stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def poll(self, job, semaphore):
+        now = datetime.now().astimezone()
+        async with semaphore:
+            samples = await run_in_thread(lambda: list(job.source.poll(now)))
+        # A process's first poll (every --once run) takes the previous one to be an interval ago
+        previous_poll = job.last_success
+        if previous_poll is None:
+            previous_poll = now.timestamp() - job.source.interval_seconds
+        added = self.pipeline.process(samples, int(now.timestamp()), previous_poll)
+        if added:
+            logger.info("%s: %s new samples", job.source.name, added)
+        return samples
+
+    async def run_job(self, job, offset_seconds, semaphore):
+        await self.wait(offset_seconds)
+        while not self.stopping.is_set():
+            if job.scheduler and job.scheduler.last_poll is not None:
+                metrics.SCHEDULER_LAG.observe(max(0, self.clock() - job.scheduler.next_wakeup()),
+                                              user=job.source.user_id)
+            samples = []
+            try:
+                samples = await self.poll(job, semaphore)
+                job.last_success = self.clock()
+                job.last_error = None
+            except Exception as e:
+                # One failing source must not stop the others
+                job.last_error = str(e)
+                logger.error("Error polling %s: %s", job.source.name, e)
+            await self.wait(job.next_delay(samples))
+
+    async def run_once(self):
+        """Poll every source once within the concurrency and rate limits. Returns the number of failed polls"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(
+            *(self.poll(job, semaphore) for job in self.jobs),
+            return_exceptions=True
+        )
+        failed = 0
+        for job, result in zip(self.jobs, results):
+            if isinstance(result, Exception):
+                failed += 1
+                logger.error("Error polling %s: %s", job.source.name, result)
+        return failed
+
+    def health(self):
+        """(healthy, details) for the /health endpoint"""
+        now = self.clock()
+        jobs = {
+            job.source.name: {
+                'healthy': job.healthy(),
+                'last_success_age': None if job.last_success is None else round(now - job.last_success, 1),
+                'last_error': job.last_error
+            }
+            for job in self.jobs
+        }
+        return all(job['healthy'] for job in jobs.values()), {'jobs': jobs}
+
+    def stop(self):
+        if not self.stopping.is_set():
+            logger.info("Shutting down")
+            self.stopping.set()
+
+    async def run(self):
+        self.stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self.stop)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        # Spread first polls across the shortest interval so they don't all land at once
+        spacing = min((job.source.interval_seconds for job in self.jobs), default=0) / max(len(self.jobs), 1)
+        tasks = [
+            asyncio.create_task(self.run_job(job, i * spacing, semaphore))
+            for i, job in enumerate(self.jobs)
+        ]
+        await self.stopping.wait()
+
+        done, pending = await asyncio.wait(tasks, timeout=self.grace_seconds)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(signum)
+
+def warm_up(pipeline, store, sources, now=None, seconds=WARM_UP_SECONDS, daily_seconds=DAILY_WARM_UP_SECONDS):
+    """Pick up where the previous process stopped.
+
+    Recent stored samples of every metric go through dedup and the alert rules (without
+    alerting), each heart rate source resumes from the newest stored sample, and Garmin
+    sources skip past days already fetched after they ended, so a restart or a --once
+    run neither re-alerts on nor re-fetches what was already handled.
+    """
+    now = now or datetime.now().astimezone()
+    for source in sources:
+        if isinstance(source, OuraHeartRateSource):
+            series = store.get_series(source.user_id, now - timedelta(seconds=seconds), now)
+            pipeline.warm_up(
+                Sample(source.source, source.user_id, HEART_RATE, reading.epoch, reading.bpm, reading.source)
+                for reading in series
+            )
+            if len(series):
+                source.latest = datetime.fromtimestamp(series.latest_epoch).astimezone()
+            continue
+
+        start = now - timedelta(seconds=daily_seconds)
+        pipeline.warm_up(
+            Sample(source.source, source.user_id, metric, epoch, value)
+            for metric in getattr(source, 'metric_names', ())
+            for epoch, value in store.get_samples(source.source, source.user_id, metric, start, now)
+        )
+        if isinstance(source, GarminSource):
+            oldest = datetime.combine(now.date() - timedelta(days=source.lookback_days), datetime.min.time()).astimezone()
+            fetched = store.get_samples(source.source, source.user_id, GARMIN_DAY_FETCHED, oldest, now)
+            source.completed_days = {date.fromtimestamp(epoch) for epoch, _ in fetched}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run every configured Oura and Garmin monitor from one process")
+    parser.add_argument('--once', action='store_true',
+                        help="Poll every source once, send any alerts and exit (for cron or serverless runs)")
+    args = parser.parse_args(argv)
+
+    if not args.once:
+        print("Starting Oura monitoring daemon")
+        print("-------------------------------")
+    from dotenv import load_dotenv
+    load_dotenv()
+    metrics.configure_logging()
+
+    users = load_users()
+    sources = [source for user in users for source in sources_for_user(user)]
+    if not sources:
+        print("Error: no Oura API key or Garmin credentials configured")
+        print("Please set OURA_API_KEY and/or GARMIN_EMAIL and GARMIN_PASSWORD in your .env file")
+        return 1
+
+    store = HeartRateStore(os.getenv('OURA_STORE_PATH', DEFAULT_STORE_PATH))
+    dispatcher = AlertDispatcher(os.getenv('EMAIL_ADDRESS'), os.getenv('EMAIL_APP_PASSWORD'))
+    recipients = {user['user_id']: user.get('email_address') for user in users}
+    pipeline = IngestPipeline(store, dispatcher, recipients)
+    warm_up(pipeline, store, sources)
+    daemon = Daemon(
+        pipeline,
+        sources,
+        max_concurrency=int(os.getenv('OURA_MAX_CONCURRENCY', 20)),
+        token_rate=float(os.getenv('OURA_TOKEN_RATE', 0.5)),
+        token_burst=int(os.getenv('OURA_TOKEN_BURST', 5))
+    )
+
+    if args.once:
+        try:
+            failed = asyncio.run(daemon.run_once())
+        finally:
+            dispatcher.close()
+            store.close()
+        return 1 if failed else 0
+
+    metrics.set_health_check(daemon.health)
+    metrics.start_metrics_server()
+    print(f"Running {len(sources)} jobs for {len(users)} users")
+
+    try:
+        asyncio.run(daemon.run())
+    finally:
+        # Flush queued and coalesced alerts, then close the store
+        dispatcher.close()
+        store.close()
+    print("Daemon stopped")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,141 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta, timezone
+from dotenv import load_dotenv
+
+import numpy as np
+
+from hr_vectorized import rolling_stats
+from sample_store import HeartRateStore, DEFAULT_STORE_PATH
+
+COLUMNS = ['user_id', 'day', 'samples', 'average', 'minimum', 'maximum', 'changes', 'resting_hr']
+RESTING_WINDOW_SECONDS = 300
+# Windows holding fewer samples (half of a 5-second feed) straddle a gap and aren't resting HR
+RESTING_MIN_SAMPLES = 30
+
+# Each worker process opens its own store connection once, in open_store()
+_store = None
+
+def open_store(path):
+    """Pool initializer: give this worker its own connection to the sample store"""
+    global _store
+    _store = HeartRateStore(path)
+
+def summarize_days(timestamps, bpm, threshold=10):
+    """Per-UTC-day rows of (day, samples, average, minimum, maximum, changes, resting_hr).
+
+    resting_hr is None for a day without a fully covered 5 minute window.
+    """
+    if len(timestamps) == 0:
+        return []
+    values = bpm.astype(np.int16)
+    days = timestamps // 86400
+    # Start index of each day's run of samples
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(days)) + 1, [len(days)]))
+    starts = bounds[:-1]
+    counts = np.diff(bounds)
+
+    sums = np.add.reduceat(values, starts, dtype=np.int64)
+    minimums = np.minimum.reduceat(values, starts)
+    maximums = np.maximum.reduceat(values, starts)
+
+    # Significant changes, ignoring the jump from one day's last sample to the next day's first
+    hits = (np.abs(np.diff(values)) >= threshold) & (days[1:] == days[:-1])
+    changes = np.add.reduceat(np.concatenate((hits, [False])).astype(np.int64), starts)
+
+    # Resting HR: the lowest trailing 5 minute mean, over windows that lie within the day and are
+    # densely sampled, so neither a lone sample after a gap nor the previous evening counts
+    rolling_mean, _ = rolling_stats(timestamps, bpm, RESTING_WINDOW_SECONDS)
+    window_counts = np.arange(1, len(timestamps) + 1) - np.searchsorted(
+        timestamps, timestamps - RESTING_WINDOW_SECONDS, side='right')
+    covered = (window_counts >= RESTING_MIN_SAMPLES) & (timestamps - RESTING_WINDOW_SECONDS >= days * 86400)
+    resting = np.minimum.reduceat(np.where(covered, rolling_mean, np.inf), starts)
+
+    return [
+        (
+            (date(1970, 1, 1) + timedelta(days=int(days[start]))).isoformat(),
+            int(count),
+            round(float(total) / count, 1),
+            int(low),
+            int(high),
+            int(change_count),
+            round(float(rest), 1) if np.isfinite(rest) else None
+        )
+        for start, count, total, low, high, change_count, rest
+        in zip(starts, counts, sums, minimums, maximums, changes, resting)
+    ]
+
+def summarize_user(user_id, start_datetime, end_datetime, threshold=10):
+    """Worker task: load one user's samples straight from the store and summarize them by day.
+
+    Only the summary rows travel back to the parent, never the samples themselves.
+    """
+    timestamps, bpm = _store.get_arrays(user_id, start_datetime, end_datetime)
+    return [(user_id, *row) for row in summarize_days(timestamps, bpm, threshold)]
+
+def build_report(store, user_ids, start_day, end_day, workers=None, threshold=10):
+    """Summary rows for every user and day in [start_day, end_day], analyzed across a process pool"""
+    global _store
+    start_datetime = datetime.combine(start_day, time.min, timezone.utc)
+    end_datetime = datetime.combine(end_day, time.max, timezone.utc)
+    workers = workers or os.cpu_count() or 1
+    tasks = [(user_id, start_datetime, end_datetime, threshold) for user_id in user_ids]
+    if workers == 1 or store.path == ':memory:':
+        _store = store
+        try:
+            results = [summarize_user(*task) for task in tasks]
+        finally:
+            _store = None
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=open_store, initargs=(store.path,)) as pool:
+            results = list(pool.map(summarize_user, *zip(*tasks))) if tasks else []
+    rows = [row for result in results for row in result]
+    rows.sort(key=lambda row: (row[0], row[1]))
+    return rows
+
+def print_table(rows):
+    print(f"{'user':16} {'day':10} {'samples':>8} {'avg':>6} {'min':>4} {'max':>4} {'changes':>8} {'resting':>8}")
+    print("-" * 72)
+    for user_id, day, samples, average, minimum, maximum, changes, resting in rows:
+        resting = '-' if resting is None else f"{resting:.1f}"
+        print(f"{user_id:16} {day:10} {samples:>8} {average:>6.1f} {minimum:>4} {maximum:>4} {changes:>8} {resting:>8}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Daily heart rate summary for many users from the local sample store")
+    parser.add_argument('--start', required=True, type=date.fromisoformat, help="First day, YYYY-MM-DD")
+    parser.add_argument('--end', type=date.fromisoformat, default=date.today(), help="Last day, YYYY-MM-DD (default today)")
+    parser.add_argument('--users-file', help="JSON list of users (default: every user in the store)")
+    parser.add_argument('--workers', type=int, help="Analysis processes (default: one per core)")
+    parser.add_argument('--threshold', type=int, default=10, help="bpm jump counted as a significant change")
+    parser.add_argument('--csv', help="Also write the table to this CSV file")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    store = HeartRateStore(os.getenv('OURA_STORE_PATH', DEFAULT_STORE_PATH))
+    try:
+        if args.users_file:
+            with open(args.users_file) as f:
+                user_ids = [user['user_id'] for user in json.load(f)]
+        else:
+            user_ids = store.user_ids()
+        rows = build_report(store, user_ids, args.start, args.end, args.workers, args.threshold)
+    finally:
+        store.close()
+
+    if not rows:
+        print("No stored heart rate data for these users and dates", file=sys.stderr)
+        return 1
+    print_table(rows)
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(rows)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
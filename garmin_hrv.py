@@ -1,4 +1,5 @@
-from garminconnect import Garmin
+from api_models import hrv_summaries
+from garmin_session import garmin_session
 import json
 import os
 from datetime import datetime, date, timedelta
@@ -19,16 +20,10 @@ def get_hrv_data(client, date_str):
             return None
         
         # Extract the HRV values and timestamps
-        measurements = []
-        for item in hrv_data.get('hrvSummaries', []):
-            timestamp = item.get('startTimeLocal', '')
-            hrv_value = item.get('avgHrv', 0)
-            measurements.append({
-                'timestamp': timestamp,
-                'hrv': hrv_value
-            })
-        
-        return measurements
+        return [
+            {'timestamp': summary.start_time_local, 'hrv': summary.avg_hrv}
+            for summary in hrv_summaries(hrv_data)
+        ]
     except Exception as e:
         print(f"Error fetching HRV data: {e}")
         return None
@@ -52,11 +47,13 @@ def monitor_hrv(interval_minutes=5):
     
     try:
         # Initialize Garmin client
-        client = Garmin(email=email, password=password)
-        client.login()
+        session = garmin_session(email, password)
+        client = session.connect()
         print("Successfully connected to Garmin Connect")
         
         while True:
+            # Refreshes the session token ahead of expiry
+            client = session.connect()
             today = date.today().strftime("%Y-%m-%d")
             yesterday = (date.today() - timedelta(days=1)).strftime("%Y-%m-%d")
             
@@ -0,0 +1,183 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_CACHE = ".garmin_tokens"
+# Refresh the short-lived OAuth2 token this long before it expires
+REFRESH_MARGIN_SECONDS = 300
+
+class TokenCache:
+    """Garmin OAuth tokens per account, stored Fernet-encrypted in one file.
+
+    A companion lock file serializes logins and saves across processes, so a fleet of
+    workers restarting together performs one SSO login and the rest resume its tokens,
+    and no worker's save overwrites another account's entry.
+    """
+
+    def __init__(self, path, key):
+        from cryptography.fernet import Fernet
+        self.path = path
+        self.fernet = Fernet(key)
+        # The file lock is re-entrant within a thread, since a login saves while holding it
+        self.thread_lock = threading.RLock()
+        self.lock_file = None
+        self.lock_depth = 0
+
+    def _read_all(self):
+        from cryptography.fernet import InvalidToken
+        try:
+            with open(self.path, 'rb') as f:
+                return json.loads(self.fernet.decrypt(f.read()))
+        except FileNotFoundError:
+            return {}
+        except (InvalidToken, ValueError):
+            logger.warning("Ignoring unreadable Garmin token cache %s", self.path)
+            return {}
+
+    def load(self, email):
+        """Saved garth token string for an account, or None"""
+        return self._read_all().get(email)
+
+    def save(self, email, tokens):
+        # Read-modify-write of the shared file, so it must not interleave with another worker's
+        with self.lock():
+            tokens_by_email = self._read_all()
+            tokens_by_email[email] = tokens
+            data = self.fernet.encrypt(json.dumps(tokens_by_email).encode())
+            tmp = f"{self.path}.tmp"
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+
+    @contextmanager
+    def lock(self):
+        """Exclusive access to the cache file across threads and processes"""
+        with self.thread_lock:
+            if self.lock_depth == 0:
+                self.lock_file = open(f"{self.path}.lock", 'w')
+                fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+            self.lock_depth += 1
+            try:
+                yield
+            finally:
+                self.lock_depth -= 1
+                if self.lock_depth == 0:
+                    fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+                    self.lock_file.close()
+                    self.lock_file = None
+
+def token_cache_from_env():
+    """TokenCache from GARMIN_TOKEN_KEY and GARMIN_TOKEN_CACHE, or None if no key is set"""
+    key = os.getenv('GARMIN_TOKEN_KEY')
+    if not key:
+        logger.warning("GARMIN_TOKEN_KEY not set; Garmin sessions will not be persisted")
+        return None
+    return TokenCache(os.getenv('GARMIN_TOKEN_CACHE', DEFAULT_TOKEN_CACHE), key)
+
+class GarminSession:
+    """One logged-in Garmin Connect client shared by every Garmin fetch in the process.
+
+    Resumes saved tokens instead of running the SSO login when it can, refreshes the
+    OAuth2 token shortly before it expires, and writes refreshed tokens back to the cache.
+    A full login only happens with no usable saved tokens or if Garmin rejects them.
+    """
+
+    def __init__(self, email, password, token_cache=None, refresh_margin=REFRESH_MARGIN_SECONDS):
+        self.email = email
+        self.password = password
+        self.token_cache = token_cache
+        self.refresh_margin = refresh_margin
+        self.client = None
+        self.lock = threading.Lock()
+        # Optional TokenBucket (see oura_client) each API call waits on
+        self.rate_limit = None
+
+    def _save(self, client):
+        if self.token_cache is not None:
+            self.token_cache.save(self.email, client.garth.dumps())
+
+    def _resume(self):
+        tokens = self.token_cache.load(self.email) if self.token_cache else None
+        if not tokens:
+            return None
+        from garminconnect import Garmin
+        client = Garmin(email=self.email, password=self.password)
+        try:
+            client.login(tokens)
+        except Exception as e:
+            logger.info("Saved Garmin session for %s not usable (%s)", self.email, e)
+            return None
+        logger.info("Resumed Garmin Connect session for %s", self.email)
+        return client
+
+    def _full_login(self):
+        from garminconnect import Garmin
+        client = Garmin(email=self.email, password=self.password)
+        client.login()
+        logger.info("Logged in to Garmin Connect as %s", self.email)
+        self._save(client)
+        return client
+
+    def _login(self, resume=True):
+        if self.token_cache is None:
+            return self._full_login()
+        with self.token_cache.lock():
+            # Another process may have logged in while we waited for the lock
+            client = self._resume() if resume else None
+            return client or self._full_login()
+
+    def _refresh_if_due(self, client):
+        token = client.garth.oauth2_token
+        if token is not None and token.expires_at - time.time() > self.refresh_margin:
+            return
+        client.garth.refresh_oauth2()
+        logger.debug("Refreshed Garmin OAuth2 token for %s", self.email)
+        self._save(client)
+
+    def connect(self):
+        """The logged-in client, with a token that stays valid for at least refresh_margin seconds"""
+        with self.lock:
+            if self.client is None:
+                self.client = self._login()
+            try:
+                self._refresh_if_due(self.client)
+            except Exception as e:
+                logger.info("Garmin token refresh failed for %s (%s), logging in again", self.email, e)
+                self.client = self._login(resume=False)
+            return self.client
+
+    def call(self, method, *args):
+        from garminconnect import GarminConnectAuthenticationError
+        client = self.connect()
+        self._wait_for_rate_limit()
+        try:
+            return getattr(client, method)(*args)
+        except GarminConnectAuthenticationError:
+            logger.info("Garmin session rejected for %s, logging in again", self.email)
+            with self.lock:
+                self.client = self._login(resume=False)
+                client = self.client
+            self._wait_for_rate_limit()
+            return getattr(client, method)(*args)
+
+    def _wait_for_rate_limit(self):
+        if self.rate_limit is not None:
+            self.rate_limit.acquire()
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def garmin_session(email, password):
+    """The process-wide GarminSession for an account, persisting tokens if GARMIN_TOKEN_KEY is set"""
+    with _sessions_lock:
+        session = _sessions.get(email)
+        if session is None:
+            session = _sessions[email] = GarminSession(email, password, token_cache_from_env())
+        return session
@@ -1,4 +1,4 @@
-from garminconnect import Garmin
+from garmin_session import garmin_session
 import json
 import os
 from datetime import date
@@ -27,8 +27,7 @@ def main():
     # Initialize API
     try:
         print("\nAttempting to connect to Garmin Connect...")
-        client = Garmin(email=email, password=password)
-        client.login()
+        client = garmin_session(email, password).connect()
         
         # Get basic user info
         print("\nFetching user info...")
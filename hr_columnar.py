@@ -0,0 +1,267 @@
+"""Compact per-user, per-day heart rate files.
+
+Layout of <root>/<user_id>/<YYYY-MM-DD>.hrc (little-endian):
+
+    header   MAGIC, version, source count, sample count, day start epoch
+    index    24 x (first row, its epoch) for each hour of the day, so a range
+             query only decodes the hours it touches
+    sources  length-prefixed UTF-8 source names for codes 1..n (0 is None)
+    columns  uint32 timestamp deltas (the first is relative to the day start),
+             uint8 bpm, uint8 source code; aligned to 4 bytes
+
+A day of 5-second samples is ~100KB against ~1.3MB of API JSON, and the reader
+maps the file and slices the bpm and source columns without copying or parsing.
+"""
+
+import argparse
+import gzip
+import json
+import mmap
+import os
+import struct
+import sys
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from readings import HeartRateSeries, normalize
+
+MAGIC = b'OHRC'
+VERSION = 1
+HEADER = struct.Struct('<4sBBHII')
+INDEX_ENTRY = struct.Struct('<II')
+HOURS = 24
+SUFFIX = '.hrc'
+
+def day_start(day):
+    return int(datetime.combine(day, datetime.min.time(), timezone.utc).timestamp())
+
+def encode_day(day, timestamps, bpm, sources):
+    """Encode one UTC day's sorted, de-duplicated columns. sources is a list of names or None"""
+    start = day_start(day)
+    count = len(timestamps)
+    names = [name for name in dict.fromkeys(sources) if name is not None]
+    codes = {None: 0}
+    codes.update((name, code) for code, name in enumerate(names, 1))
+
+    index = bytearray()
+    hour_rows = np.searchsorted(timestamps, start + 3600 * np.arange(HOURS))
+    for row in hour_rows.tolist():
+        epoch = int(timestamps[row]) if row < count else 0
+        index += INDEX_ENTRY.pack(row, epoch)
+
+    table = bytearray()
+    for name in names:
+        encoded = name.encode()
+        table += struct.pack('<B', len(encoded)) + encoded
+
+    prefix = HEADER.pack(MAGIC, VERSION, len(names), 0, count, start) + index + table
+    prefix += b'\0' * (-len(prefix) % 4)
+    deltas = np.diff(np.asarray(timestamps, dtype=np.int64), prepend=start).astype(np.uint32)
+    return b''.join([
+        prefix,
+        deltas.tobytes(),
+        np.asarray(bpm, dtype=np.uint8).tobytes(),
+        np.array([codes[name] for name in sources], dtype=np.uint8).tobytes()
+    ])
+
+class ColumnarDay:
+    """Read-only, memory-mapped view of one day file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, source_count, _, self.count, self.start = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f"{path} is not a version {VERSION} heart rate column file")
+
+        offset = HEADER.size
+        self.index = [INDEX_ENTRY.unpack_from(self.map, offset + i * INDEX_ENTRY.size) for i in range(HOURS)]
+        offset += HOURS * INDEX_ENTRY.size
+        self.source_names = [None]
+        for _ in range(source_count):
+            length = self.map[offset]
+            self.source_names.append(self.map[offset + 1:offset + 1 + length].decode())
+            offset += 1 + length
+        offset += -offset % 4
+
+        self.deltas = np.frombuffer(self.map, dtype=np.uint32, count=self.count, offset=offset)
+        offset += 4 * self.count
+        self.bpm = np.frombuffer(self.map, dtype=np.uint8, count=self.count, offset=offset)
+        self.sources = np.frombuffer(self.map, dtype=np.uint8, count=self.count, offset=offset + self.count)
+
+    def rows(self, start_epoch, end_epoch):
+        """(first row, epochs from that row up to the end of the last touched hour)"""
+        first_hour = min(max((start_epoch - self.start) // 3600, 0), HOURS - 1)
+        last_hour = min(max((end_epoch - self.start) // 3600, 0), HOURS - 1)
+        row, epoch = self.index[first_hour]
+        stop = self.index[last_hour + 1][0] if last_hour + 1 < HOURS else self.count
+        if row >= stop:
+            return row, np.empty(0, dtype=np.int64)
+        epochs = np.cumsum(self.deltas[row + 1:stop], dtype=np.int64)
+        return row, np.concatenate(([epoch], epochs + epoch))
+
+    def between(self, start_epoch, end_epoch):
+        """(int64 epochs, uint8 bpm, uint8 source codes) for start_epoch <= epoch <= end_epoch.
+
+        bpm and source codes are zero-copy views into the mapped file.
+        """
+        row, epochs = self.rows(start_epoch, end_epoch)
+        lo = np.searchsorted(epochs, start_epoch, side='left')
+        hi = np.searchsorted(epochs, end_epoch, side='right')
+        return epochs[lo:hi], self.bpm[row + lo:row + hi], self.sources[row + lo:row + hi]
+
+    def to_arrays(self):
+        """All of the day's (int64 epoch, uint8 bpm, uint8 source code) columns"""
+        return self.between(self.start, self.start + 86399)
+
+    def close(self):
+        self.deltas = self.bpm = self.sources = None
+        try:
+            self.map.close()
+        except BufferError:
+            # A caller still holds a view into the file; the mapping is freed with it
+            pass
+
+class ColumnarStore:
+    """Directory of per-user, per-day column files with a HeartRateStore-like API"""
+
+    def __init__(self, root):
+        self.root = root
+        self.open_days = {}
+
+    def path(self, user_id, day):
+        return os.path.join(self.root, user_id, f"{day.isoformat()}{SUFFIX}")
+
+    def day(self, user_id, day):
+        """The mapped file for a user and day, or None if there is none"""
+        key = (user_id, day)
+        if key not in self.open_days:
+            path = self.path(user_id, day)
+            self.open_days[key] = ColumnarDay(path) if os.path.exists(path) else None
+        return self.open_days[key]
+
+    def write_day(self, user_id, day, timestamps, bpm, sources):
+        """Replace a day's file atomically"""
+        self._release(user_id, day)
+        path = self.path(user_id, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(encode_day(day, timestamps, bpm, sources))
+        os.replace(tmp, path)
+
+    def add_readings(self, user_id, readings):
+        """Merge API readings or Reading records into the day files, skipping samples already stored.
+
+        Returns the number added.
+        """
+        by_day = {}
+        for reading in normalize(readings):
+            day = datetime.fromtimestamp(reading.epoch, timezone.utc).date()
+            by_day.setdefault(day, {})[reading.epoch] = reading
+        added = 0
+        for day, new in by_day.items():
+            existing = self.day(user_id, day)
+            merged = {}
+            if existing is not None:
+                epochs, bpm, codes = existing.to_arrays()
+                names = existing.source_names
+                merged = {
+                    epoch: (value, names[code])
+                    for epoch, value, code in zip(epochs.tolist(), bpm.tolist(), codes.tolist())
+                }
+            before = len(merged)
+            for epoch, reading in new.items():
+                merged.setdefault(epoch, (reading.bpm, reading.source))
+            if len(merged) == before:
+                continue
+            added += len(merged) - before
+            ordered = sorted(merged)
+            self.write_day(user_id, day, ordered, [merged[epoch][0] for epoch in ordered],
+                           [merged[epoch][1] for epoch in ordered])
+        return added
+
+    def _days(self, start_datetime, end_datetime):
+        day = start_datetime.astimezone(timezone.utc).date()
+        last = end_datetime.astimezone(timezone.utc).date()
+        while day <= last:
+            yield day
+            day += timedelta(days=1)
+
+    def _columns(self, user_id, start_datetime, end_datetime):
+        start_epoch = int(start_datetime.timestamp())
+        end_epoch = int(end_datetime.timestamp())
+        for day in self._days(start_datetime, end_datetime):
+            columns = self.day(user_id, day)
+            if columns is not None:
+                yield columns, columns.between(start_epoch, end_epoch)
+
+    def get_arrays(self, user_id, start_datetime, end_datetime):
+        """Samples in [start, end] as (int64 epoch, uint8 bpm) arrays.
+
+        A range inside a single day returns a zero-copy bpm view into the mapped file.
+        """
+        parts = [(epochs, bpm) for _, (epochs, bpm, _) in self._columns(user_id, start_datetime, end_datetime)]
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint8)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    def get_series(self, user_id, start_datetime, end_datetime):
+        """Samples in [start, end] as a HeartRateSeries"""
+        series = HeartRateSeries()
+        for columns, (epochs, bpm, codes) in self._columns(user_id, start_datetime, end_datetime):
+            # Translate the file's source codes into the process-wide interned codes
+            remap = np.array([HeartRateSeries._source_code(name) for name in columns.source_names], dtype=np.uint8)
+            series.epochs.frombytes(epochs.astype(np.uint32).tobytes())
+            series.bpms.frombytes(bpm.tobytes())
+            series.sources.frombytes(remap[codes].tobytes())
+        return series
+
+    def _release(self, user_id, day):
+        columns = self.open_days.pop((user_id, day), None)
+        if columns is not None:
+            columns.close()
+
+    def close(self):
+        for key in list(self.open_days):
+            self._release(*key)
+
+def load_json_records(path):
+    """Heart rate records from an API response (.json with a 'data' list) or backfill output (.jsonl.gz)"""
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rt') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    with open(path) as f:
+        payload = json.load(f)
+    return payload.get('data', []) if isinstance(payload, dict) else payload
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert heart rate JSON into per-day column files")
+    parser.add_argument('files', nargs='+', help="API response .json files or backfill .jsonl.gz files")
+    parser.add_argument('--user', default=os.getenv('OURA_USER_ID', 'default'), help="User the samples belong to")
+    parser.add_argument('--out', default="columns", help="Output directory")
+    args = parser.parse_args(argv)
+
+    store = ColumnarStore(args.out)
+    try:
+        total = 0
+        for path in args.files:
+            try:
+                records = load_json_records(path)
+            except (OSError, ValueError) as e:
+                print(f"Error reading {path}: {e}", file=sys.stderr)
+                return 1
+            added = store.add_readings(args.user, records)
+            total += added
+            print(f"{path}: {len(records)} records, {added} new samples")
+        print(f"Stored {total} samples under {os.path.join(args.out, args.user)}")
+    finally:
+        store.close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
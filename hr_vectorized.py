@@ -0,0 +1,73 @@
+import numpy as np
+
+from readings import HeartRateSeries, normalize, epoch_to_iso
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+def readings_to_arrays(readings):
+    """Convert readings (API dict, HeartRateSeries or iterable) once into (int64 epoch, uint8 bpm) arrays"""
+    if isinstance(readings, HeartRateSeries):
+        return readings.to_arrays()
+    if isinstance(readings, dict):
+        readings = readings.get('data') or []
+    timestamps = []
+    bpms = []
+    for reading in normalize(readings):
+        timestamps.append(reading.epoch)
+        bpms.append(reading.bpm)
+    return np.array(timestamps, dtype=np.int64), np.array(bpms, dtype=np.uint8)
+
+def rolling_stats(timestamps, bpm, window_seconds):
+    """Trailing time-window mean and standard deviation at every sample"""
+    values = bpm.astype(np.float64)
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    csum_sq = np.concatenate(([0.0], np.cumsum(values * values)))
+    # Index of the first sample inside each trailing window
+    starts = np.searchsorted(timestamps, timestamps - window_seconds, side='right')
+    ends = np.arange(1, len(values) + 1)
+    counts = ends - starts
+    mean = (csum[ends] - csum[starts]) / counts
+    var = (csum_sq[ends] - csum_sq[starts]) / counts - mean * mean
+    return mean.astype(np.float32), np.sqrt(np.maximum(var, 0)).astype(np.float32)
+
+def analyze_arrays(timestamps, bpm, threshold=10, percentiles=DEFAULT_PERCENTILES, rolling_seconds=300):
+    """Vectorized analyze_heart_rate over columnar arrays.
+
+    Returns the same keys as analyze_heart_rate plus 'percentiles' and trailing
+    'rolling_mean' / 'rolling_std' arrays aligned with the input samples.
+    """
+    if len(bpm) == 0:
+        return None
+
+    values = bpm.astype(np.int16)
+    diffs = np.abs(np.diff(values))
+    hits = np.flatnonzero(diffs >= threshold) + 1
+    significant_changes = [
+        {
+            'time': epoch_to_iso(int(timestamps[i])),
+            'epoch': int(timestamps[i]),
+            'from': int(values[i - 1]),
+            'to': int(values[i]),
+            'change': int(diffs[i - 1])
+        }
+        for i in hits
+    ]
+
+    rolling_mean, rolling_std = rolling_stats(timestamps, bpm, rolling_seconds)
+
+    return {
+        'average': float(values.mean(dtype=np.float64)),
+        'maximum': int(values.max()),
+        'minimum': int(values.min()),
+        'significant_changes': significant_changes,
+        'percentiles': dict(zip(percentiles, np.percentile(values, percentiles).tolist())),
+        'rolling_mean': rolling_mean,
+        'rolling_std': rolling_std
+    }
+
+def analyze_readings(data, **kwargs):
+    """Convert readings to arrays once and analyze them with the vectorized engine"""
+    if not data:
+        return None
+    timestamps, bpm = readings_to_arrays(data)
+    return analyze_arrays(timestamps, bpm, **kwargs)
@@ -0,0 +1,331 @@
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import metrics
+import oura_client
+from api_models import hrv_summaries, readiness_from_record
+from alert_dispatcher import AlertDispatcher
+from alert_rules import build_rule_alert_email, load_alert_rules, recent_alerts
+from garmin_session import garmin_session
+from oura_heart_rate import OuraHeartRate
+from readings import Reading, parse_timestamp
+from sample_store import HeartRateStore, DEFAULT_STORE_PATH
+from stress_monitor import analyze_wellness
+
+logger = logging.getLogger(__name__)
+
+# One normalized measurement from any vendor. activity carries Oura's per-sample
+# heart rate source ('awake', 'sleep', ...) where there is one.
+Sample = namedtuple('Sample', ['source', 'user_id', 'metric', 'epoch', 'value', 'activity'], defaults=[None])
+
+HEART_RATE = 'heart_rate'
+
+# Daily metrics are stamped with the start of their day (HRV with the night before), so a
+# fresh one can be well over a day old; older ones are re-fetches and don't alert again
+DAILY_ALERT_MAX_AGE_SECONDS = 2 * 86400
+
+# Garmin get_stats() fields ingested as daily metrics
+GARMIN_STATS = {
+    'resting_hr': 'restingHeartRate',
+    'average_stress': 'averageStressLevel',
+    'steps': 'totalSteps',
+}
+
+# Daily readiness fields ingested as metrics (see stress_monitor.analyze_wellness)
+READINESS_METRICS = ('readiness_score', 'hrv_balance', 'recovery_index', 'resting_hr', 'temperature')
+
+# Stored once a past Garmin day has been fetched after it ended, so later runs skip it
+GARMIN_DAY_FETCHED = 'day_fetched'
+
+def day_epoch(day):
+    """Epoch of local midnight starting day, the timestamp of its daily metrics"""
+    return int(datetime.combine(day, datetime.min.time()).timestamp())
+
+class OuraHeartRateSource:
+    """Oura /heartrate samples since the previous poll (with a small overlap for late syncs)"""
+    source = 'oura'
+    metric_names = (HEART_RATE,)
+    # Polled on the adaptive schedule that backs off while the ring is stale or asleep
+    adaptive = True
+
+    def __init__(self, user_id, api_key, interval_seconds=300, lookback_hours=1, overlap_minutes=10):
+        self.user_id = user_id
+        self.client = OuraHeartRate(api_key)
+        # Rate limits apply per API token, shared with the user's other Oura sources
+        self.account = ('oura', api_key)
+        self.interval_seconds = interval_seconds
+        self.lookback_hours = lookback_hours
+        self.overlap_minutes = overlap_minutes
+        self.latest = None
+
+    @property
+    def name(self):
+        return f"oura heartrate ({self.user_id})"
+
+    def use_rate_limit(self, bucket):
+        oura_client.set_rate_limit(self.client.api_key, bucket)
+
+    def poll(self, now):
+        if self.latest is None:
+            start = now - timedelta(hours=self.lookback_hours)
+        else:
+            start = self.latest - timedelta(minutes=self.overlap_minutes)
+        latest = None
+        for reading in self.client.iter_heart_rate(start, now):
+            yield Sample(self.source, self.user_id, HEART_RATE, reading.epoch, reading.bpm, reading.source)
+            latest = reading.epoch if latest is None else max(latest, reading.epoch)
+        # Only advance once the whole window has been read, so a failed poll is retried in full
+        if latest is not None:
+            self.latest = datetime.fromtimestamp(latest).astimezone()
+
+class OuraReadinessSource:
+    """Today's Oura daily readiness score and contributors, one sample per metric.
+
+    Repeated polls are answered from the client's response cache until its TTL expires.
+    """
+    source = 'oura'
+    metric_names = READINESS_METRICS
+
+    def __init__(self, user_id, api_key, interval_seconds=900):
+        self.user_id = user_id
+        self.api_key = api_key
+        self.account = ('oura', api_key)
+        self.interval_seconds = interval_seconds
+
+    @property
+    def name(self):
+        return f"oura readiness ({self.user_id})"
+
+    def use_rate_limit(self, bucket):
+        oura_client.set_rate_limit(self.api_key, bucket)
+
+    def poll(self, now):
+        today = now.date().isoformat()
+        params = {"start_date": today, "end_date": today}
+        for record in oura_client.iter_collection("daily_readiness", self.api_key, params, decode=readiness_from_record):
+            wellness = analyze_wellness([record])
+            epoch = parse_timestamp(record.timestamp) if record.timestamp else int(now.timestamp())
+            for metric, value in wellness.items():
+                if value is not None:
+                    yield Sample(self.source, self.user_id, metric, epoch, value)
+
+class GarminSource:
+    """Garmin overnight HRV and daily stats.
+
+    Today is re-fetched on every poll; earlier days in the lookback are fetched once
+    after they are complete and then skipped. That fetch also yields a GARMIN_DAY_FETCHED
+    sample so a new process can restore completed_days from the store.
+    """
+    source = 'garmin'
+    metric_names = ('hrv',) + tuple(GARMIN_STATS)
+
+    def __init__(self, user_id, session, interval_seconds=300, lookback_days=1):
+        self.user_id = user_id
+        self.session = session
+        self.account = ('garmin', session.email)
+        self.interval_seconds = interval_seconds
+        self.lookback_days = lookback_days
+        self.completed_days = set()
+
+    @property
+    def name(self):
+        return f"garmin ({self.user_id})"
+
+    def use_rate_limit(self, bucket):
+        self.session.rate_limit = bucket
+
+    def poll(self, now):
+        today = now.date()
+        oldest = today - timedelta(days=self.lookback_days)
+        self.completed_days = {day for day in self.completed_days if day >= oldest}
+        day = oldest
+        while day <= today:
+            if day not in self.completed_days:
+                yield from self.fetch_day(day)
+                if day < today:
+                    yield Sample(self.source, self.user_id, GARMIN_DAY_FETCHED, day_epoch(day), 1)
+                    self.completed_days.add(day)
+            day += timedelta(days=1)
+
+    def fetch_day(self, day):
+        day_str = day.isoformat()
+        for summary in hrv_summaries(self.session.call('get_hrv_data', day_str)):
+            yield Sample(self.source, self.user_id, 'hrv', summary.epoch, summary.avg_hrv)
+
+        stats = self.session.call('get_stats', day_str) or {}
+        for metric, key in GARMIN_STATS.items():
+            value = stats.get(key)
+            if value is not None:
+                yield Sample(self.source, self.user_id, metric, day_epoch(day), value)
+
+class IngestPipeline:
+    """Shared dedup, storage and alerting stages for Samples from any source"""
+
+    def __init__(self, store, dispatcher=None, recipients=None, alert_engine=None):
+        self.store = store
+        self.dispatcher = dispatcher
+        self.recipients = recipients or {}
+        self.alert_engine = alert_engine or load_alert_rules()
+        # (source, user_id, metric) -> last (epoch, value) seen, for dedup
+        self.latest = {}
+
+    def dedup(self, samples):
+        """Drop samples older than the newest seen for their series, and unchanged repeats of it"""
+        latest = self.latest
+        for sample in samples:
+            key = (sample.source, sample.user_id, sample.metric)
+            last = latest.get(key)
+            if last is not None and (sample.epoch < last[0] or (sample.epoch, sample.value) == last):
+                metrics.DUPLICATE_SAMPLES.inc(source=sample.source)
+                continue
+            latest[key] = (sample.epoch, sample.value)
+            yield sample
+
+    def persist(self, heart_rate, other):
+        for user_id, readings in heart_rate.items():
+            self.store.add_readings(user_id, readings)
+        if other:
+            self.store.add_samples(other)
+
+    def recent(self, alerts, now_epoch, previous_poll=None):
+        """Alerts worth sending: heart rate recorded since the previous poll, daily metrics from the last two days"""
+        heart_rate = [alert for alert in alerts if alert.metric == HEART_RATE]
+        daily = [alert for alert in alerts if alert.metric != HEART_RATE]
+        return (recent_alerts(heart_rate, now_epoch, previous_poll)
+                + recent_alerts(daily, now_epoch, max_age_seconds=DAILY_ALERT_MAX_AGE_SECONDS))
+
+    def alert(self, alerts, now_epoch, previous_poll=None):
+        """One email per user for what this batch fired on recent samples.
+
+        Samples from a late ring sync have already updated rule state; their alerts are dropped here.
+        """
+        by_user = {}
+        for alert in self.recent(alerts, now_epoch, previous_poll):
+            by_user.setdefault(alert.user_id, []).append(alert)
+        for user_id, user_alerts in by_user.items():
+            if self.dispatcher is not None:
+                subject, message = build_rule_alert_email(user_alerts)
+                self.dispatcher.submit(subject, message, recipient=self.recipients.get(user_id))
+
+    def warm_up(self, samples):
+        """Rebuild dedup and alert rule state from already-stored samples, without storing or alerting on them"""
+        for sample in self.dedup(samples):
+            self.alert_engine.evaluate(sample.user_id, sample.metric, sample.epoch, sample.value)
+
+    def process(self, samples, now_epoch=None, previous_poll=None):
+        """Run samples polled at now_epoch through every stage. Returns the number of new samples.
+
+        previous_poll (epoch of the source's last successful poll) bounds which alerts are recent.
+        """
+        if now_epoch is None:
+            now_epoch = int(time.time())
+        heart_rate = {}
+        other = []
+        counts = {}
+        alerts = []
+        evaluate = self.alert_engine.evaluate
+        for sample in self.dedup(samples):
+            alerts.extend(evaluate(sample.user_id, sample.metric, sample.epoch, sample.value))
+            key = (sample.source, sample.metric)
+            counts[key] = counts.get(key, 0) + 1
+            if sample.metric == HEART_RATE:
+                heart_rate.setdefault(sample.user_id, []).append(Reading(sample.epoch, sample.value, sample.activity))
+            else:
+                other.append(sample)
+
+        self.persist(heart_rate, other)
+        for (source, metric), count in counts.items():
+            metrics.INGESTED_SAMPLES.inc(count, source=source, metric=metric)
+        # Dedup only passes samples newer than the last seen, so each user's last reading is the newest
+        for user_id, readings in heart_rate.items():
+            metrics.LAST_SYNC_AGE.set(now_epoch - readings[-1].epoch, user=user_id)
+        self.alert(alerts, now_epoch, previous_poll)
+        return sum(counts.values())
+
+def sources_for_user(user, default_interval_minutes=5):
+    """Every source configured for a user entry: Oura with api_key, Garmin with garmin_email/garmin_password"""
+    interval = user.get('interval_minutes', default_interval_minutes) * 60
+    sources = []
+    if user.get('api_key'):
+        sources.append(OuraHeartRateSource(user['user_id'], user['api_key'], interval_seconds=interval))
+        sources.append(OuraReadinessSource(user['user_id'], user['api_key']))
+    if user.get('garmin_email') and user.get('garmin_password'):
+        session = garmin_session(user['garmin_email'], user['garmin_password'])
+        sources.append(GarminSource(user['user_id'], session, interval_seconds=interval))
+    return sources
+
+def poll_source(pipeline, source, now=None, previous_poll=None):
+    """Poll one source into the pipeline. Returns the number of new samples, or None on error"""
+    now = now or datetime.now().astimezone()
+    try:
+        return pipeline.process(source.poll(now), int(now.timestamp()), previous_poll)
+    except Exception as e:
+        # One failing vendor or user must not stop the others
+        logger.error("Error polling %s: %s", source.name, e)
+        return None
+
+def run(pipeline, sources, clock=time.time, sleep=time.sleep):
+    """Poll every source on its own interval from a single thread, forever"""
+    next_due = {source: clock() for source in sources}
+    last_polls = {}
+    while True:
+        for source in sources:
+            if next_due[source] <= clock():
+                polled_at = clock()
+                added = poll_source(pipeline, source, previous_poll=last_polls.get(source))
+                if added is not None:
+                    last_polls[source] = polled_at
+                if added:
+                    logger.info("%s: %s new samples", source.name, added)
+                next_due[source] = clock() + source.interval_seconds
+        sleep(max(0, min(next_due.values()) - clock()))
+
+def load_users():
+    """Users from OURA_USERS_FILE if set, otherwise the single user configured in .env"""
+    users_file = os.getenv('OURA_USERS_FILE')
+    if users_file:
+        with open(users_file) as f:
+            return json.load(f)
+    return [{
+        'user_id': os.getenv('OURA_USER_ID', 'default'),
+        'api_key': os.getenv('OURA_API_KEY'),
+        'email_address': os.getenv('EMAIL_ADDRESS'),
+        'garmin_email': os.getenv('GARMIN_EMAIL'),
+        'garmin_password': os.getenv('GARMIN_PASSWORD'),
+    }]
+
+def main():
+    print("Starting Oura + Garmin ingest worker")
+    print("------------------------------------")
+    from dotenv import load_dotenv
+    load_dotenv()
+    metrics.configure_logging()
+    metrics.start_metrics_server()
+
+    users = load_users()
+    sources = [source for user in users for source in sources_for_user(user)]
+    if not sources:
+        print("Error: no Oura API key or Garmin credentials configured")
+        print("Please set OURA_API_KEY and/or GARMIN_EMAIL and GARMIN_PASSWORD in your .env file")
+        return 1
+    print(f"Ingesting {len(sources)} sources for {len(users)} users")
+
+    store = HeartRateStore(os.getenv('OURA_STORE_PATH', DEFAULT_STORE_PATH))
+    dispatcher = AlertDispatcher(os.getenv('EMAIL_ADDRESS'), os.getenv('EMAIL_APP_PASSWORD'))
+    recipients = {user['user_id']: user.get('email_address') for user in users}
+    pipeline = IngestPipeline(store, dispatcher, recipients)
+    try:
+        run(pipeline, sources)
+    except KeyboardInterrupt:
+        print("\nIngest stopped by user")
+    finally:
+        dispatcher.close()
+        store.close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
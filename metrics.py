@@ -0,0 +1,200 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+    def _format_labels(self, key, extra=None):
+        pairs = list(zip(self.labels, key)) + (extra or [])
+        if not pairs:
+            return ''
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.extend(self._expose_value(key, value))
+        return lines
+
+    def _expose_value(self, key, value):
+        return [f"{self.name}{self._format_labels(key)} {value}"]
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0, 0.0]
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += 1
+            state[2] += value
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def _expose_value(self, key, state):
+        counts, count, total = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', str(bound))])} {cumulative}")
+        lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', '+Inf')])} {count}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+        return lines
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+REGISTRY = []
+
+API_LATENCY = Histogram('oura_api_request_seconds', "Oura API request latency", ['endpoint'])
+API_BYTES = Counter('oura_api_response_bytes_total', "Response body bytes received from the Oura API", ['endpoint'])
+API_RETRIES = Counter('oura_api_retries_total', "Oura API requests retried", ['endpoint', 'reason'])
+API_ERRORS = Counter('oura_api_errors_total', "Oura API requests that ended in an error", ['endpoint', 'status'])
+API_CACHE_HITS = Counter('oura_api_cache_hits_total', "Oura API requests answered from the response cache", ['endpoint'])
+READINGS_FETCHED = Counter('oura_records_fetched_total', "Records received from Oura collection endpoints", ['endpoint'])
+ANALYSIS_SECONDS = Histogram('analysis_seconds', "Time spent analyzing samples per tick", ['user'])
+SMTP_SEND_SECONDS = Histogram('smtp_send_seconds', "SMTP send latency, including reconnects")
+ALERTS_SENT = Counter('alerts_sent_total', "Alert emails delivered")
+ALERT_ERRORS = Counter('alert_errors_total', "Alert emails that failed to send")
+INGESTED_SAMPLES = Counter('ingest_samples_total', "New samples accepted by the ingest pipeline", ['source', 'metric'])
+DUPLICATE_SAMPLES = Counter('ingest_duplicate_samples_total', "Samples dropped by the ingest pipeline as already seen", ['source'])
+SCHEDULER_LAG = Histogram('scheduler_lag_seconds', "Actual minus planned poll wakeup", ['user'])
+LAST_SYNC_AGE = Gauge('last_sync_age_seconds', "Age of the newest heart rate sample", ['user'])
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+# Callable returning (healthy, details) for /health; None means always healthy
+_health_check = None
+
+def set_health_check(check):
+    """Serve check() results at /health: 200 when healthy, 503 otherwise"""
+    global _health_check
+    _health_check = check
+
+def _metrics_handler():
+    """Request handler class for the metrics server; http.server is only imported when one is started"""
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0]
+            if path == '/metrics':
+                self.send_body(200, 'text/plain; version=0.0.4', render().encode())
+            elif path == '/health':
+                healthy, details = _health_check() if _health_check else (True, {})
+                self.send_body(200 if healthy else 503, 'application/json',
+                               json.dumps({'healthy': healthy, **details}).encode())
+            else:
+                self.send_error(404)
+
+        def send_body(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return MetricsHandler
+
+def start_metrics_server(port=None, host='0.0.0.0'):
+    """Serve /metrics and /health from a daemon thread. Returns the server, or None if no port is configured"""
+    port = port if port is not None else os.getenv('METRICS_PORT')
+    if port is None or port == '':
+        return None
+    from http.server import ThreadingHTTPServer
+    server = ThreadingHTTPServer((host, int(port)), _metrics_handler())
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logging.getLogger(__name__).info("Serving metrics on :%s/metrics", server.server_port)
+    return server
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per log line"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+def configure_logging(level=None, fmt=None):
+    """Set up logging from LOG_LEVEL (default INFO) and LOG_FORMAT ('text' or 'json')"""
+    level = level or os.getenv('LOG_LEVEL', 'INFO')
+    fmt = fmt or os.getenv('LOG_FORMAT', 'text')
+    handler = logging.StreamHandler()
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+
+import oura_client
+import metrics
+import hr_vectorized
+from api_models import decode_page, readiness_from_record
+from alert_rules import build_rule_alert_email, load_alert_rules, recent_alerts
+from oura_heart_rate import OuraHeartRate, heart_rate_status, heart_rate_summary, warm_up_alert_rules
+from sample_store import HeartRateStore, DEFAULT_STORE_PATH
+from alert_dispatcher import AlertDispatcher
+from poll_scheduler import AdaptivePollScheduler
+from stress_monitor import analyze_wellness, assess_stress_level
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_USERS_FILE = "users.json"
+
+def load_users(path=DEFAULT_USERS_FILE):
+    """Load user configs: a JSON list of {user_id, api_key, [email_address, interval_minutes]}"""
+    with open(path) as f:
+        users = json.load(f)
+    for user in users:
+        if not user.get('user_id') or not user.get('api_key'):
+            raise ValueError(f"User entry needs user_id and api_key: {user}")
+    return users
+
+class MultiUserMonitor:
+    """Poll /heartrate and /daily_readiness for many users from one event loop"""
+
+    def __init__(self, users, store, dispatcher, max_concurrency=20, token_rate=0.5, token_burst=5,
+                 default_interval_minutes=5, alert_engine=None):
+        self.users = users
+        self.store = store
+        self.dispatcher = dispatcher
+        self.alert_engine = alert_engine or load_alert_rules()
+        self.default_interval_minutes = default_interval_minutes
+        # Global cap on requests in flight across all users
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        # One bucket per API token so a user never exceeds its own rate limit; oura_client takes
+        # a token before every HTTP request, so each page and retry counts
+        self.buckets = {user['api_key']: oura_client.TokenBucket(token_rate, token_burst) for user in users}
+        for api_key, bucket in self.buckets.items():
+            oura_client.set_rate_limit(api_key, bucket)
+        self.clients = {user['user_id']: OuraHeartRate(user['api_key']) for user in users}
+        # user_id -> epoch of the last successful heart rate poll, which bounds how old an alerting sample may be
+        self.last_polls = {}
+
+    async def call(self, user, func, *args):
+        """Run a blocking API call in a worker thread, within the concurrency limit (requests wait on the rate limit there)"""
+        async with self.semaphore:
+            return await asyncio.to_thread(func, *args)
+
+    async def poll_heart_rate(self, user, now):
+        user_id = user['user_id']
+        oura = self.clients[user_id]
+        latest = self.store.latest_timestamp(user_id)
+        start_time = now - timedelta(hours=1) if latest is None else latest - timedelta(minutes=10)
+
+        # Readings are fetched off-loop; the SQLite store is only touched from the loop thread
+        readings = await self.call(user, lambda: list(oura.iter_heart_rate(start_time, now)))
+        added = self.store.add_readings(user_id, readings)
+        previous_poll = self.last_polls.get(user_id)
+        self.last_polls[user_id] = int(now.timestamp())
+        latest_source = readings[-1].source if readings else None
+
+        with metrics.ANALYSIS_SECONDS.time(user=user_id):
+            timestamps, bpm = self.store.get_arrays(user_id, now - timedelta(hours=1), now)
+            analysis = hr_vectorized.analyze_arrays(timestamps, bpm)
+        if not analysis:
+            logger.info("[%s] No heart rate data available for this period", user_id)
+            return added, None, latest_source
+
+        latest_hr = int(bpm[-1])
+        status = heart_rate_status(latest_hr)
+        metrics.LAST_SYNC_AGE.set(int(now.timestamp()) - int(timestamps[-1]), user=user_id)
+        logger.info("[%s] HR %s bpm (%s), avg %.1f, %s readings fetched",
+                    user_id, latest_hr, status, analysis['average'], len(readings))
+
+        # Rule state is per user, so the overlap with the previous poll is skipped rather than re-alerted,
+        # and samples from a late ring sync update it without alerting
+        alerts = recent_alerts([
+            alert for reading in readings
+            for alert in self.alert_engine.evaluate(user_id, 'heart_rate', reading.epoch, reading.bpm)
+        ], int(now.timestamp()), previous_poll)
+        if alerts:
+            subject, message = build_rule_alert_email(alerts, heart_rate_summary(latest_hr, analysis))
+            self.dispatcher.submit(subject, message, recipient=user.get('email_address'))
+        return added, int(timestamps[-1]), latest_source
+
+    async def poll_readiness(self, user, now):
+        today = now.date().isoformat()
+        params = {"start_date": today, "end_date": today}
+        response = await self.call(user, oura_client.get, "daily_readiness", user['api_key'], params)
+        response.raise_for_status()
+        records, _ = decode_page(response.content, readiness_from_record)
+        wellness = analyze_wellness(records)
+        if wellness:
+            stress_level, reasons = assess_stress_level(wellness)
+            logger.info("[%s] Readiness %s, stress %s", user['user_id'], wellness['readiness_score'], stress_level)
+
+    async def run_user(self, user, offset_seconds):
+        """Poll one user forever, starting after its stagger offset"""
+        import requests
+        interval = user.get('interval_minutes', self.default_interval_minutes) * 60
+        scheduler = AdaptivePollScheduler(base_seconds=interval)
+        await asyncio.sleep(offset_seconds)
+        while True:
+            if scheduler.last_poll is not None:
+                metrics.SCHEDULER_LAG.observe(max(0, scheduler.clock() - scheduler.next_wakeup()),
+                                              user=user['user_id'])
+            now = datetime.now().astimezone()
+            results = await asyncio.gather(
+                self.poll_heart_rate(user, now),
+                self.poll_readiness(user, now),
+                return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, requests.exceptions.RequestException):
+                    logger.error("[%s] Error fetching data: %s", user['user_id'], result)
+                elif isinstance(result, Exception):
+                    logger.error("[%s] Error occurred: %s", user['user_id'], result)
+            # Idle or sleeping wearers are polled less often
+            if isinstance(results[0], tuple):
+                scheduler.observe(*results[0])
+            else:
+                scheduler.observe(0)
+            await asyncio.sleep(scheduler.seconds_until_next())
+
+    async def run(self):
+        for user in self.users:
+            warm_up_alert_rules(self.alert_engine, self.store, user['user_id'])
+        # Spread users evenly across the default interval so polls don't all land at once
+        spacing = self.default_interval_minutes * 60 / max(len(self.users), 1)
+        await asyncio.gather(*(
+            self.run_user(user, i * spacing) for i, user in enumerate(self.users)
+        ))
+
+def main():
+    print("Starting Oura Multi-User Monitor")
+    print("--------------------------------")
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    metrics.configure_logging()
+    metrics.start_metrics_server()
+    users_file = os.getenv('OURA_USERS_FILE', DEFAULT_USERS_FILE)
+    try:
+        users = load_users(users_file)
+    except (OSError, ValueError) as e:
+        print(f"Error loading users from {users_file}: {e}")
+        return
+
+    print(f"Monitoring {len(users)} users")
+    store = HeartRateStore(os.getenv('OURA_STORE_PATH', DEFAULT_STORE_PATH))
+    # One sender account and SMTP connection for every user's alerts
+    dispatcher = AlertDispatcher(os.getenv('EMAIL_ADDRESS'), os.getenv('EMAIL_APP_PASSWORD'))
+    monitor = MultiUserMonitor(
+        users,
+        store,
+        dispatcher,
+        max_concurrency=int(os.getenv('OURA_MAX_CONCURRENCY', 20)),
+        token_rate=float(os.getenv('OURA_TOKEN_RATE', 0.5)),
+        token_burst=int(os.getenv('OURA_TOKEN_BURST', 5))
+    )
+    try:
+        asyncio.run(monitor.run())
+    except KeyboardInterrupt:
+        print("\nMonitoring stopped by user")
+    finally:
+        dispatcher.close()
+        store.close()
+
+if __name__ == "__main__":
+    main()
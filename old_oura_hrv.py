@@ -1,4 +1,6 @@
 import requests
+import oura_client
+from api_models import decode_page, readiness_from_record
 import time
 from datetime import datetime, timedelta
 
@@ -6,10 +8,6 @@ API_KEY = "GCB6HLCP5FTDPDK3HGFKDAUNUHAKPD4V"
 BASE_URL = "https://api.ouraring.com/v2/usercollection/daily_readiness"
 
 def get_readiness_data():
-    headers = {
-        "Authorization": f"Bearer {API_KEY}"
-    }
-    
     # Get data for the last 7 days
     end_date = datetime.now().date()
     start_date = end_date - timedelta(days=7)
@@ -20,31 +18,31 @@ def get_readiness_data():
     }
     
     try:
-        response = requests.get(BASE_URL, headers=headers, params=params)
+        response = oura_client.get(BASE_URL, API_KEY, params=params)
         response.raise_for_status()
-        data = response.json()
-        return data
-    except requests.exceptions.RequestException as e:
+        records, _ = decode_page(response.content, readiness_from_record)
+        return records
+    except (requests.exceptions.RequestException, ValueError) as e:
         print(f"Error fetching readiness data: {e}")
         return None
 
 def display_readiness_data(data):
-    if not data or "data" not in data:
+    if not data:
         print("No readiness data available")
         return
 
     print("\n=== Latest Readiness Data ===")
-    for entry in data["data"]:
-        print(f"\nDate: {entry.get('day')}")
-        print(f"Readiness Score: {entry.get('score')}")
+    for entry in data:
+        print(f"\nDate: {entry.day}")
+        print(f"Readiness Score: {entry.score}")
         
-        contributors = entry.get('contributors', {})
+        contributors = entry.contributors
         print("\nContributors:")
-        print(f"HRV Balance: {contributors.get('hrv_balance')}")
-        print(f"Resting Heart Rate: {contributors.get('resting_heart_rate')}")
-        print(f"Previous Night: {contributors.get('previous_night')}")
-        print(f"Sleep Balance: {contributors.get('sleep_balance')}")
-        print(f"Activity Balance: {contributors.get('activity_balance')}")
+        print(f"HRV Balance: {contributors.hrv_balance}")
+        print(f"Resting Heart Rate: {contributors.resting_heart_rate}")
+        print(f"Previous Night: {contributors.previous_night}")
+        print(f"Sleep Balance: {contributors.sleep_balance}")
+        print(f"Activity Balance: {contributors.activity_balance}")
         print("-" * 50)
 
 def main():
@@ -0,0 +1,108 @@
+from collections import deque
+
+from readings import normalize, epoch_to_iso
+
+DEFAULT_WINDOWS = (300, 3600, 86400)
+
+class WindowStats:
+    """Running average/min/max and significant changes over a trailing time window"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.samples = deque()
+        self.total = 0
+        # Monotonic deques: front is the current max / min
+        self.max_deque = deque()
+        self.min_deque = deque()
+        self.changes = deque()
+
+    def push(self, epoch, bpm, change):
+        self.samples.append((epoch, bpm))
+        self.total += bpm
+        while self.max_deque and self.max_deque[-1][1] <= bpm:
+            self.max_deque.pop()
+        self.max_deque.append((epoch, bpm))
+        while self.min_deque and self.min_deque[-1][1] >= bpm:
+            self.min_deque.pop()
+        self.min_deque.append((epoch, bpm))
+        if change:
+            self.changes.append(change)
+
+    def expire(self, now_epoch):
+        """Drop everything older than the window ending at now_epoch"""
+        cutoff = now_epoch - self.seconds
+        samples = self.samples
+        while samples and samples[0][0] < cutoff:
+            self.total -= samples.popleft()[1]
+        while self.max_deque and self.max_deque[0][0] < cutoff:
+            self.max_deque.popleft()
+        while self.min_deque and self.min_deque[0][0] < cutoff:
+            self.min_deque.popleft()
+        # A change only counts while both of its samples are inside the window
+        while self.changes and self.changes[0][0] < cutoff:
+            self.changes.popleft()
+
+    def result(self):
+        if not self.samples:
+            return None
+        return {
+            'average': self.total / len(self.samples),
+            'maximum': self.max_deque[0][1],
+            'minimum': self.min_deque[0][1],
+            'significant_changes': [change for _, change in self.changes]
+        }
+
+class OnlineAnalyzer:
+    """Incremental analyze_heart_rate: feed only new readings, read results per window.
+
+    Each tick costs O(new samples) amortized, and any number of window lengths are
+    maintained side by side without rescanning. Readings must arrive in time order;
+    anything not newer than the last fed sample is ignored.
+    """
+
+    def __init__(self, windows=DEFAULT_WINDOWS, threshold=10, recent_count=10):
+        self.threshold = threshold
+        self.windows = {seconds: WindowStats(seconds) for seconds in windows}
+        self.last = None
+        self.recent_readings = deque(maxlen=recent_count)
+
+    @property
+    def last_epoch(self):
+        return self.last.epoch if self.last else None
+
+    def feed(self, readings):
+        """Add new readings (raw API dicts, Reading records or a HeartRateSeries). Returns the count used"""
+        used = 0
+        for reading in normalize(readings):
+            previous = self.last
+            if previous is not None and reading.epoch <= previous.epoch:
+                continue
+            change = None
+            if previous is not None:
+                delta = abs(reading.bpm - previous.bpm)
+                if delta >= self.threshold:
+                    change = (previous.epoch, {
+                        'time': epoch_to_iso(reading.epoch),
+                        'epoch': reading.epoch,
+                        'from': previous.bpm,
+                        'to': reading.bpm,
+                        'change': delta
+                    })
+            for window in self.windows.values():
+                window.push(reading.epoch, reading.bpm, change)
+            self.last = reading
+            self.recent_readings.append(reading)
+            used += 1
+        if used:
+            for window in self.windows.values():
+                window.expire(self.last.epoch)
+        return used
+
+    def result(self, seconds, now_epoch=None):
+        """Same fields as analyze_heart_rate for the window of the given length ending at now_epoch"""
+        window = self.windows[seconds]
+        if now_epoch is None:
+            now_epoch = self.last_epoch
+        if now_epoch is not None:
+            window.expire(now_epoch)
+        return window.result()
@@ -0,0 +1,227 @@
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import metrics
+from api_models import decode_page
+from response_cache import ResponseCache, CacheEntry, cache_key, endpoint_name
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://api.ouraring.com/v2/usercollection"
+
+# Statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+CONNECT_TIMEOUT = float(os.getenv('OURA_CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.getenv('OURA_READ_TIMEOUT', 30))
+MAX_RETRIES = int(os.getenv('OURA_MAX_RETRIES', 4))
+BACKOFF_FACTOR = float(os.getenv('OURA_BACKOFF_FACTOR', 0.5))
+MAX_BACKOFF = float(os.getenv('OURA_MAX_BACKOFF', 60))
+POOL_SIZE = int(os.getenv('OURA_POOL_SIZE', 10))
+CACHE_MAX_BYTES = int(os.getenv('OURA_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+# Optional on-disk cache tier that survives restarts; memory only when unset
+CACHE_PATH = os.getenv('OURA_CACHE_PATH')
+
+_session = None
+_session_lock = threading.Lock()
+_cache = None
+# API token -> TokenBucket that every request made with it waits on (see set_rate_limit)
+_rate_limits = {}
+
+class TokenBucket:
+    """Thread-safe token bucket limiting the request rate of a single API token or account"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, blocking the calling thread until one is available"""
+        with self.lock:
+            while True:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                self.sleep((1 - self.tokens) / self.rate)
+
+def set_rate_limit(api_key, bucket):
+    """Make every HTTP request made with api_key (pages and retries alike) take a token from bucket first.
+
+    Responses served from the cache make no request and take no token.
+    """
+    _rate_limits[api_key] = bucket
+
+def get_session():
+    """Return the process-wide keep-alive session shared by all Oura calls"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                # requests is only imported once something is actually fetched
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Accept-Encoding": "gzip, deflate"})
+                _session = session
+    return _session
+
+def get_cache():
+    """Return the process-wide response cache"""
+    global _cache
+    if _cache is None:
+        with _session_lock:
+            if _cache is None:
+                _cache = ResponseCache(max_bytes=CACHE_MAX_BYTES, path=CACHE_PATH)
+    return _cache
+
+def retry_delay(attempt, response=None):
+    """Seconds to wait before the next attempt: Retry-After if given, else backoff with full jitter"""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), MAX_BACKOFF)
+            except ValueError:
+                try:
+                    when = parsedate_to_datetime(retry_after)
+                    wait = (when - datetime.now(timezone.utc)).total_seconds()
+                    return min(max(wait, 0), MAX_BACKOFF)
+                except (TypeError, ValueError):
+                    pass
+    return random.uniform(0, min(MAX_BACKOFF, BACKOFF_FACTOR * (2 ** attempt)))
+
+def get(url, api_key, params=None, timeout=None, max_retries=MAX_RETRIES, use_cache=True):
+    """GET an Oura endpoint over the pooled session, retrying 429/5xx and connection errors.
+
+    Cacheable endpoints (see response_cache.ENDPOINT_TTLS) and past-day ranges are served
+    from the response cache while fresh, and revalidated with ETag/Last-Modified once stale.
+    Returns the final response (callers keep their own status handling). Connection
+    errors and timeouts are re-raised once retries are exhausted.
+    """
+    if not url.startswith("http"):
+        url = f"{BASE_URL}/{url.lstrip('/')}"
+
+    cache = get_cache() if use_cache else None
+    cacheable, ttl = cache.policy(url, params) if cache else (False, None)
+    if not cacheable:
+        return _fetch(url, api_key, params, timeout, max_retries)
+
+    key = cache_key(url, api_key, params)
+    entry = cache.get(key)
+    if entry is not None and entry.is_fresh():
+        metrics.API_CACHE_HITS.inc(endpoint=endpoint_name(url))
+        return cached_response(url, entry)
+
+    extra_headers = {}
+    if entry is not None:
+        if entry.etag:
+            extra_headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            extra_headers["If-Modified-Since"] = entry.last_modified
+
+    response = _fetch(url, api_key, params, timeout, max_retries, extra_headers)
+    now = time.time()
+    expires_at = None if ttl is None else now + ttl
+    if response.status_code == 304 and entry is not None:
+        metrics.API_CACHE_HITS.inc(endpoint=endpoint_name(url))
+        entry.stored_at = now
+        entry.expires_at = expires_at
+        cache.put(key, entry)
+        return cached_response(url, entry)
+    if response.status_code == 200:
+        cache.put(key, CacheEntry(
+            response.content,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            now,
+            expires_at
+        ))
+    return response
+
+def cached_response(url, entry):
+    """Build a 200 Response from a cache entry so callers can't tell it apart from a live one"""
+    import requests
+    from requests.structures import CaseInsensitiveDict
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = entry.body
+    response.headers = CaseInsensitiveDict({"Content-Type": "application/json"})
+    response.encoding = "utf-8"
+    return response
+
+def _fetch(url, api_key, params, timeout, max_retries, extra_headers=None):
+    import requests
+    headers = {"Authorization": f"Bearer {api_key}"}
+    if extra_headers:
+        headers.update(extra_headers)
+    timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+    session = get_session()
+    endpoint = endpoint_name(url)
+    bucket = _rate_limits.get(api_key)
+    logger.debug("GET %s params=%s", url, params)
+
+    for attempt in range(max_retries + 1):
+        if bucket is not None:
+            bucket.acquire()
+        started = time.perf_counter()
+        try:
+            response = session.get(url, headers=headers, params=params, timeout=timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            metrics.API_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint)
+            if attempt == max_retries:
+                metrics.API_ERRORS.inc(endpoint=endpoint, status=type(e).__name__)
+                raise
+            metrics.API_RETRIES.inc(endpoint=endpoint, reason=type(e).__name__)
+            logger.info("Retrying %s after %s", endpoint, e)
+            time.sleep(retry_delay(attempt))
+            continue
+
+        metrics.API_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint)
+        metrics.API_BYTES.inc(len(response.content), endpoint=endpoint)
+        if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+            if response.status_code >= 400:
+                metrics.API_ERRORS.inc(endpoint=endpoint, status=response.status_code)
+            return response
+        metrics.API_RETRIES.inc(endpoint=endpoint, reason=response.status_code)
+        logger.info("Retrying %s after HTTP %s", endpoint, response.status_code)
+        time.sleep(retry_delay(attempt, response))
+
+def iter_collection(url, api_key, params=None, use_cache=True, decode=None):
+    """Yield records from a paginated collection endpoint, following next_token lazily.
+
+    Pages are decoded straight from the response bytes; decode turns each raw record
+    into a typed one (see api_models), otherwise records are yielded as dicts.
+    Raises requests.exceptions.HTTPError on a non-200 page, and ValueError on a body that
+    isn't JSON or a record decode rejects.
+    """
+    params = dict(params or {})
+    while True:
+        response = get(url, api_key, params=params, use_cache=use_cache)
+        if response.status_code != 200:
+            logger.error("Error: %s %s", response.status_code, response.text)
+            response.raise_for_status()
+
+        records, next_token = decode_page(response.content, decode)
+        metrics.READINGS_FETCHED.inc(len(records), endpoint=endpoint_name(url))
+        yield from records
+
+        if not next_token:
+            return
+        params['next_token'] = next_token
@@ -1,17 +1,24 @@
-import requests
 import json
+import logging
 import os
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
 from time import sleep
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import oura_client
+import metrics
+from api_models import reading_from_record
+from online_analyzer import OnlineAnalyzer
+from alert_dispatcher import AlertDispatcher
+from alert_rules import build_rule_alert_email, load_alert_rules, recent_alerts
+from poll_scheduler import AdaptivePollScheduler
+from sample_store import HeartRateStore, DEFAULT_STORE_PATH
+from readings import HeartRateSeries, normalize, parse_timestamp, format_epoch, epoch_to_iso
+
+logger = logging.getLogger(__name__)
 
 class OuraHeartRate:
     def __init__(self, api_key, email_address=None, email_password=None):
         self.api_key = api_key
-        self.base_url = "https://api.ouraring.com/v2/usercollection"
+        self.base_url = oura_client.BASE_URL
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
@@ -23,13 +30,14 @@ class OuraHeartRate:
     
     def send_email(self, subject, message):
         """Send email using Gmail SMTP"""
+        import smtplib
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.text import MIMEText
         if not all([self.email_address, self.email_password]):
-            print("Email credentials not configured properly")
+            logger.warning("Email credentials not configured properly")
             return
         
-        print(f"\nAttempting to send email...")
-        print(f"From: {self.email_address}")
-        print(f"Subject: {subject}")
+        logger.debug("Attempting to send email from %s: %s", self.email_address, subject)
         
         try:
             msg = MIMEMultipart()
@@ -39,28 +47,31 @@ class OuraHeartRate:
             
             msg.attach(MIMEText(message, 'plain'))
             
-            print("Connecting to Gmail SMTP server...")
+            logger.debug("Connecting to Gmail SMTP server...")
             server = smtplib.SMTP('smtp.gmail.com', 587)
             server.starttls()
             
-            print("Attempting login...")
+            logger.debug("Attempting login...")
             server.login(self.email_address, self.email_password)
             
-            print("Sending email...")
+            logger.debug("Sending email...")
             server.send_message(msg)
             server.quit()
-            print("Email sent successfully!")
+            logger.info("Email sent successfully!")
             
         except Exception as e:
-            print(f"Error sending email: {e}")
+            logger.error("Error sending email: %s", e)
     
     def check_sync_status(self, data):
-        """Check if the Oura ring has synced recently using the provided data"""
-        if data and 'data' in data and data['data']:
-            latest = max(data['data'], key=lambda x: x['timestamp'])
-            latest_time = datetime.fromisoformat(latest['timestamp'].replace('Z', '+00:00'))
-            time_since_sync = datetime.now().astimezone() - latest_time
-            minutes_since_sync = time_since_sync.total_seconds() / 60
+        """Check if the Oura ring has synced recently using the provided data (API dict or HeartRateSeries)"""
+        if isinstance(data, HeartRateSeries):
+            latest_epoch = data.latest_epoch
+        elif data and 'data' in data and data['data']:
+            latest_epoch = max(reading.epoch for reading in normalize(data['data']))
+        else:
+            latest_epoch = None
+        if latest_epoch is not None:
+            minutes_since_sync = (datetime.now().timestamp() - latest_epoch) / 60
             
             if minutes_since_sync > 30:  # If no data in last 30 minutes
                 print(f"\n⚠️ Warning: Last sync was {minutes_since_sync:.1f} minutes ago")
@@ -69,14 +80,19 @@ class OuraHeartRate:
             return True
         return False
 
-    def get_heart_rate(self, start_datetime, end_datetime):
-        """Get heart rate data for a specific time range"""
+    def iter_heart_rate(self, start_datetime, end_datetime):
+        """Yield heart rate Readings one at a time, following next_token page by page.
+
+        Raises requests.exceptions.RequestException if a page cannot be fetched, and
+        ValueError if a page or record cannot be decoded.
+        """
         endpoint = f"{self.base_url}/heartrate"
         
         # Ensure we're not requesting future data
         now = datetime.now().astimezone()
         if end_datetime > now:
             end_datetime = now
+        if start_datetime >= end_datetime:
             start_datetime = end_datetime - timedelta(hours=1)
         
         # Format times in UTC
@@ -85,66 +101,212 @@ class OuraHeartRate:
             "end_datetime": end_datetime.astimezone().isoformat()
         }
         
-        print(f"\nDebug - API Request:")
-        print(f"Endpoint: {endpoint}")
-        print(f"Start: {params['start_datetime']}")
-        print(f"End: {params['end_datetime']}")
+        logger.debug("Heart rate request %s from %s to %s",
+                     endpoint, params['start_datetime'], params['end_datetime'])
         
-        response = requests.get(endpoint, headers=self.headers, params=params)
-        if response.status_code == 200:
-            return response.json()
+        yield from oura_client.iter_collection(endpoint, self.api_key, params, decode=reading_from_record)
+
+    def get_heart_rate(self, start_datetime, end_datetime):
+        """Get heart rate data for a specific time range, across all pages"""
+        import requests
+        try:
+            return {'data': list(self.iter_heart_rate(start_datetime, end_datetime)), 'next_token': None}
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error("Error fetching heart rate data: %s", e)
+            return None
+
+    def sync_heart_rate(self, store, user_id, now=None, overlap_minutes=10, lookback_hours=1):
+        """Fetch only samples newer than the store's high-water mark and append them"""
+        import requests
+        now = now or datetime.now().astimezone()
+        latest = store.latest_timestamp(user_id)
+        if latest is None:
+            start_time = now - timedelta(hours=lookback_hours)
         else:
-            print(f"Error: {response.status_code}")
-            print(response.text)
+            # Re-request a small overlap so samples that synced late are not missed
+            start_time = latest - timedelta(minutes=overlap_minutes)
+        
+        try:
+            return store.add_readings(user_id, self.iter_heart_rate(start_time, now))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error("Error fetching heart rate data: %s", e)
             return None
 
 def format_timestamp(timestamp):
-    """Convert timestamp to local time string"""
-    dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-    return dt.astimezone().strftime('%Y-%m-%d %H:%M:%S')
+    """Convert an ISO timestamp or epoch seconds to local time string"""
+    if isinstance(timestamp, str):
+        timestamp = parse_timestamp(timestamp)
+    return format_epoch(int(timestamp))
 
 def analyze_heart_rate(data):
-    """Analyze heart rate data and return insights"""
-    if not data or 'data' not in data:
-        return None
-    
-    readings = data['data']
-    if not readings:
+    """Analyze heart rate data and return insights.
+
+    Accepts an API response dict or any iterable of raw readings or Reading records
+    (e.g. iter_heart_rate), which is consumed in a single pass.
+    """
+    if not data:
         return None
+    if isinstance(data, dict):
+        if 'data' not in data:
+            return None
+        data = data['data']
     
-    # Calculate statistics
-    hr_values = [reading['bpm'] for reading in readings]
-    avg_hr = sum(hr_values) / len(hr_values)
-    max_hr = max(hr_values)
-    min_hr = min(hr_values)
+    count = 0
+    total = 0
+    max_hr = None
+    min_hr = None
+    previous = None
     
-    # Look for significant changes
+    # Calculate statistics and look for significant changes as readings arrive
     significant_changes = []
-    for i in range(1, len(readings)):
-        change = abs(readings[i]['bpm'] - readings[i-1]['bpm'])
-        if change >= 10:  # Consider changes of 10+ BPM significant
-            significant_changes.append({
-                'time': readings[i]['timestamp'],
-                'from': readings[i-1]['bpm'],
-                'to': readings[i]['bpm'],
-                'change': change
-            })
+    for reading in normalize(data):
+        bpm = reading.bpm
+        count += 1
+        total += bpm
+        if max_hr is None or bpm > max_hr:
+            max_hr = bpm
+        if min_hr is None or bpm < min_hr:
+            min_hr = bpm
+        
+        if previous is not None:
+            change = abs(bpm - previous.bpm)
+            if change >= 10:  # Consider changes of 10+ BPM significant
+                significant_changes.append({
+                    'time': epoch_to_iso(reading.epoch),
+                    'epoch': reading.epoch,
+                    'from': previous.bpm,
+                    'to': bpm,
+                    'change': change
+                })
+        previous = reading
+    
+    if not count:
+        return None
     
     return {
-        'average': avg_hr,
+        'average': total / count,
         'maximum': max_hr,
         'minimum': min_hr,
         'significant_changes': significant_changes
     }
 
+def heart_rate_status(bpm):
+    """Classify a heart rate as NORMAL, ELEVATED or LOW"""
+    if bpm > 100:
+        return "ELEVATED"
+    elif bpm < 60:
+        return "LOW"
+    return "NORMAL"
+
+def heart_rate_summary(latest_hr, analysis):
+    """Current, status and hourly average/max/min lines for alert emails"""
+    return (f"Current: {latest_hr} bpm\nStatus: {heart_rate_status(latest_hr)}\n"
+            f"Avg: {analysis['average']:.1f} bpm\nMax: {analysis['maximum']} bpm\nMin: {analysis['minimum']} bpm")
+
+def warm_up_alert_rules(alert_engine, store, user_id, now=None, seconds=3600):
+    """Feed the last hour of stored heart rate to the alert rules so a restart doesn't re-alert on it"""
+    now = now or datetime.now().astimezone()
+    series = store.get_series(user_id, now - timedelta(seconds=seconds), now)
+    alert_engine.warm_up(user_id, 'heart_rate', ((reading.epoch, reading.bpm) for reading in series))
+
+def monitor_tick(oura, store, user_id, analyzer, dispatcher, scheduler, alert_engine, now=None):
+    """Run one fetch, analysis and alert cycle and update the scheduler. Returns the hourly analysis"""
+    now = now or datetime.now().astimezone()
+    if scheduler.last_poll is not None:
+        metrics.SCHEDULER_LAG.observe(max(0, scheduler.clock() - scheduler.next_wakeup()), user=user_id)
+    
+    # Get data for the last hour
+    start_time = now - timedelta(hours=1)
+    end_time = now
+    
+    print(f"\n[{now.strftime('%Y-%m-%d %H:%M:%S')}]")
+    print("Fetching new heart rate data...")
+    
+    added = oura.sync_heart_rate(store, user_id, now)
+    if added is not None:
+        print(f"Stored {added} new readings")
+    if analyzer.last_epoch is not None:
+        start_time = max(start_time, datetime.fromtimestamp(analyzer.last_epoch + 1).astimezone())
+    
+    # Show analysis first, updated incrementally from the new samples only
+    now_epoch = int(now.timestamp())
+    with metrics.ANALYSIS_SECONDS.time(user=user_id):
+        series = store.get_series(user_id, start_time, end_time)
+        new_samples = analyzer.feed(series)
+        analysis = analyzer.result(3600, now_epoch)
+    # Samples from a late ring sync still update rule state, but only those since the previous poll alert
+    alerts = recent_alerts([
+        alert for reading in series
+        for alert in alert_engine.evaluate(user_id, 'heart_rate', reading.epoch, reading.bpm)
+    ], now_epoch, scheduler.last_poll)
+    if analyzer.last_epoch is not None:
+        metrics.LAST_SYNC_AGE.set(now_epoch - analyzer.last_epoch, user=user_id)
+    if analysis:
+        # Check sync status using the actual data
+        oura.check_sync_status({'data': list(analyzer.recent_readings)})
+        # Display recent readings
+        print("\nRecent Heart Rate Readings:")
+        recent_readings = [
+            reading for reading in reversed(analyzer.recent_readings)
+            if reading.epoch >= now_epoch - 3600
+        ]
+        
+        if recent_readings:
+            latest_hr = recent_readings[0].bpm
+            print("\nCurrent Status:")
+            print(f"Latest HR: {latest_hr} bpm")
+            
+            # Determine status
+            status = heart_rate_status(latest_hr)
+            
+            print(f"Status: {status} heart rate range")
+            
+            # Only send email if one of the alert rules fired on the new readings
+            if alerts:
+                subject, message = build_rule_alert_email(alerts, heart_rate_summary(latest_hr, analysis))
+                dispatcher.submit(subject, message)
+                print(f"\nAlert email queued - {', '.join(sorted({alert.rule for alert in alerts}))}")
+        
+        print("\nLast 10 readings:")
+        for reading in recent_readings:
+            timestamp = format_timestamp(reading.epoch)
+            print(f"Time: {timestamp}, HR: {reading.bpm} bpm")
+        
+        # Show analysis results
+        print(f"\nHeart Rate Analysis:")
+        print(f"Average HR: {analysis['average']:.1f} bpm")
+        print(f"Maximum HR: {analysis['maximum']} bpm")
+        print(f"Minimum HR: {analysis['minimum']} bpm")
+        
+        if analysis['significant_changes']:
+            print("\nSignificant Changes (10+ bpm):")
+            for change in analysis['significant_changes'][-3:]:  # Show last 3 significant changes
+                time = format_timestamp(change['epoch'])
+                print(f"Time: {time}, {change['from']} → {change['to']} bpm (Δ{change['change']:.1f})")
+    else:
+        print("No heart rate data available for this period")
+    
+    # Let the scheduler pick the next poll time from how fresh the data is
+    scheduler.observe(
+        new_samples,
+        analyzer.last_epoch,
+        analyzer.last.source if analyzer.last else None
+    )
+    return analysis
+
 def monitor_heart_rate(interval_minutes=5):
     """Monitor heart rate data continuously"""
     print("Starting Oura Heart Rate Monitor")
     print("-------------------------------")
     
     # Load environment variables
+    from dotenv import load_dotenv
     load_dotenv()
+    metrics.configure_logging()
+    metrics.start_metrics_server()
     api_key = os.getenv('OURA_API_KEY')
+    user_id = os.getenv('OURA_USER_ID', 'default')
+    store_path = os.getenv('OURA_STORE_PATH', DEFAULT_STORE_PATH)
     email_address = os.getenv('EMAIL_ADDRESS')
     email_password = os.getenv('EMAIL_APP_PASSWORD')
     
@@ -155,97 +317,25 @@ def monitor_heart_rate(interval_minutes=5):
     
     # Initialize Oura client with email credentials
     oura = OuraHeartRate(api_key, email_address, email_password)
+    store = HeartRateStore(store_path)
+    # Fed only new samples each tick; keeps the 5 minute and 1 hour windows up to date
+    analyzer = OnlineAnalyzer(windows=(300, 3600))
+    # Alerts go out from a background thread so SMTP never delays the next poll
+    dispatcher = AlertDispatcher(email_address, email_password)
+    # Polls every interval_minutes while data flows, backing off while the ring is stale or asleep
+    scheduler = AdaptivePollScheduler(base_seconds=interval_minutes * 60)
+    # Rules from ALERT_RULES_FILE, or the default 10 bpm in 5 minutes change alert
+    alert_engine = load_alert_rules()
+    warm_up_alert_rules(alert_engine, store, user_id)
     
     try:
         while True:
-            now = datetime.now().astimezone()
-            
-            # Get data for the last hour
-            start_time = now - timedelta(hours=1)
-            end_time = now
-            
-            print(f"\n[{now.strftime('%Y-%m-%d %H:%M:%S')}]")
-            print("Fetching heart rate data for the last hour...")
-            
-            data = oura.get_heart_rate(start_time, end_time)
-            if data and 'data' in data and data['data']:
-                # Check sync status using the actual data
-                oura.check_sync_status(data)
-                # Display recent readings
-                print("\nRecent Heart Rate Readings:")
-                recent_readings = sorted(data['data'][-10:], key=lambda x: x['timestamp'], reverse=True)
-                
-                # Show analysis first
-                analysis = analyze_heart_rate(data)
-                
-                if recent_readings:
-                    latest_hr = recent_readings[0]['bpm']
-                    print("\nCurrent Status:")
-                    print(f"Latest HR: {latest_hr} bpm")
-                    
-                    # Determine status
-                    status = "NORMAL"
-                    if latest_hr > 100:
-                        status = "ELEVATED"
-                    elif latest_hr < 60:
-                        status = "LOW"
-                    
-                    print(f"Status: {status} heart rate range")
-                    
-                    if analysis:
-                        # Check for recent significant changes (last 5 minutes)
-                        recent_changes = []
-                        now = datetime.now().astimezone()  # Get current time with timezone
-                        for change in analysis['significant_changes']:
-                            # Convert UTC timestamp to local time with timezone
-                            change_time = datetime.fromisoformat(change['time'].replace('Z', '+00:00')).astimezone()
-                            if (now - change_time).total_seconds() <= 300:  # 5 minutes = 300 seconds
-                                recent_changes.append(change)
-                        
-                        # Only send email if there are recent significant changes
-                        if recent_changes:
-                            # Prepare email subject with alert
-                            subject = f"⚠️ Rapid HR Change - {status} ({latest_hr} bpm)"
-                            
-                            # Prepare email message
-                            message = f"Alert: Significant heart rate change detected!\n\nCurrent: {latest_hr} bpm\nStatus: {status}\nAvg: {analysis['average']:.1f} bpm\nMax: {analysis['maximum']} bpm\nMin: {analysis['minimum']} bpm"
-                            
-                            # Add the recent changes
-                            message += "\n\n⚠️ RECENT SIGNIFICANT CHANGES (Last 5 min):"
-                            for change in recent_changes:
-                                time = format_timestamp(change['time'])
-                                message += f"\n{time}: {change['from']} → {change['to']} bpm (Δ{change['change']:.1f})"
-                            
-                            message += f"\n\nTime: {datetime.now().strftime('%H:%M:%S')}"
-                            oura.send_email(subject, message)
-                            print("\nAlert email sent - Significant HR change detected!")
-                
-                print("\nLast 10 readings:")
-                for reading in recent_readings:
-                    timestamp = format_timestamp(reading['timestamp'])
-                    print(f"Time: {timestamp}, HR: {reading['bpm']} bpm")
-                
-                # Show analysis results
-                if analysis:
-                    print(f"\nHeart Rate Analysis:")
-                    print(f"Average HR: {analysis['average']:.1f} bpm")
-                    print(f"Maximum HR: {analysis['maximum']} bpm")
-                    print(f"Minimum HR: {analysis['minimum']} bpm")
-                    
-                    if analysis['significant_changes']:
-                        print("\nSignificant Changes (10+ bpm):")
-                        for change in analysis['significant_changes'][-3:]:  # Show last 3 significant changes
-                            time = format_timestamp(change['time'])
-                            print(f"Time: {time}, {change['from']} → {change['to']} bpm (Δ{change['change']:.1f})")
-            else:
-                print("No heart rate data available for this period")
-            
-            # Calculate time until next update
-            next_update = now + timedelta(minutes=interval_minutes)
+            monitor_tick(oura, store, user_id, analyzer, dispatcher, scheduler, alert_engine)
+            next_update = datetime.fromtimestamp(scheduler.next_wakeup()).astimezone()
             print(f"\nNext update at: {next_update.strftime('%H:%M:%S')}")
             
             try:
-                sleep(interval_minutes * 60)
+                sleep(scheduler.seconds_until_next())
             except KeyboardInterrupt:
                 print("\nMonitoring stopped by user")
                 return
@@ -258,6 +348,9 @@ def monitor_heart_rate(interval_minutes=5):
         print("\nMonitoring stopped by user")
     except Exception as err:
         print(f"\nError occurred: {err}")
+    finally:
+        dispatcher.close()
+        store.close()
 
 if __name__ == "__main__":
     monitor_heart_rate()
@@ -0,0 +1,50 @@
+import time
+
+# Oura heart rate sources recorded while the wearer is asleep or resting in bed
+SLEEP_SOURCES = {'sleep', 'rest'}
+
+class AdaptivePollScheduler:
+    """Choose the next poll time from how fresh the ring's data is.
+
+    While fresh samples keep arriving the interval stays at base_seconds. While the ring
+    is stale or the wearer is asleep, the interval doubles on every poll up to
+    max_seconds, and drops back to base_seconds as soon as fresh awake data arrives.
+    The clock is injectable so decisions can be tested without waiting.
+    """
+
+    def __init__(self, base_seconds=300, max_seconds=3600, stale_after_seconds=1800,
+                 backoff=2.0, clock=time.time):
+        self.base_seconds = base_seconds
+        self.max_seconds = max_seconds
+        self.stale_after_seconds = stale_after_seconds
+        self.backoff = backoff
+        self.clock = clock
+
+        self.interval = base_seconds
+        self.last_poll = None
+        self.last_new_data = None
+
+    def observe(self, new_samples, latest_epoch=None, latest_source=None):
+        """Record the outcome of a poll. Returns the interval until the next one"""
+        now = self.clock()
+        self.last_poll = now
+        stale = latest_epoch is None or now - latest_epoch > self.stale_after_seconds
+        asleep = latest_source in SLEEP_SOURCES
+
+        if new_samples and not stale and not asleep:
+            self.interval = self.base_seconds
+        elif stale or asleep:
+            self.interval = min(self.max_seconds, self.interval * self.backoff)
+
+        if new_samples:
+            self.last_new_data = now
+        return self.interval
+
+    def next_wakeup(self):
+        """Clock time at which the next poll should run"""
+        if self.last_poll is None:
+            return self.clock()
+        return self.last_poll + self.interval
+
+    def seconds_until_next(self):
+        return max(0, self.next_wakeup() - self.clock())
@@ -0,0 +1,108 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import datetime, timezone
+from functools import lru_cache
+
+# A heart rate sample normalized once at ingest: integer epoch seconds instead of an ISO string
+Reading = namedtuple('Reading', ['epoch', 'bpm', 'source'])
+
+_fromisoformat = datetime.fromisoformat
+
+def parse_timestamp(timestamp):
+    """Convert an Oura ISO timestamp ('2024-01-01T12:00:05+00:00' or '...Z') to integer epoch seconds.
+
+    On Python 3.11 the C fromisoformat accepts Oura's layout directly, including 'Z',
+    and is faster than slicing the string by hand.
+    """
+    return int(_fromisoformat(timestamp).timestamp())
+
+@lru_cache(maxsize=4096)
+def format_epoch(epoch):
+    """Format epoch seconds as a local time string (memoized)"""
+    return datetime.fromtimestamp(epoch).strftime('%Y-%m-%d %H:%M:%S')
+
+def epoch_to_iso(epoch):
+    """Convert epoch seconds back to an Oura-style UTC ISO timestamp"""
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+def normalize(readings):
+    """Yield Reading records from raw API dicts; Readings pass through untouched"""
+    for reading in readings:
+        if isinstance(reading, Reading):
+            yield reading
+        else:
+            yield Reading(parse_timestamp(reading['timestamp']), reading['bpm'], reading.get('source'))
+
+class HeartRateSeries:
+    """Compact time-ordered heart rate samples held in parallel typed arrays.
+
+    Timestamps are uint32 epoch seconds, bpm is uint8 and sources are interned to
+    one-byte codes, so a day of 5-second samples costs ~100KB instead of ~17k dicts.
+    Samples must be appended in time order.
+    """
+    __slots__ = ('epochs', 'bpms', 'sources')
+
+    # Source names are interned process-wide; codes index into this list
+    _source_names = [None]
+    _source_codes = {None: 0}
+
+    def __init__(self, readings=()):
+        self.epochs = array('I')
+        self.bpms = array('B')
+        self.sources = array('B')
+        self.extend(readings)
+
+    @classmethod
+    def _source_code(cls, source):
+        code = cls._source_codes.get(source)
+        if code is None:
+            code = len(cls._source_names)
+            cls._source_names.append(source)
+            cls._source_codes[source] = code
+        return code
+
+    def append(self, reading):
+        self.epochs.append(reading.epoch)
+        self.bpms.append(reading.bpm)
+        self.sources.append(self._source_code(reading.source))
+
+    def extend(self, readings):
+        """Append raw API readings or Reading records"""
+        for reading in normalize(readings):
+            self.append(reading)
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def __iter__(self):
+        names = self._source_names
+        for epoch, bpm, source in zip(self.epochs, self.bpms, self.sources):
+            yield Reading(epoch, bpm, names[source])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            series = HeartRateSeries()
+            series.epochs = self.epochs[index]
+            series.bpms = self.bpms[index]
+            series.sources = self.sources[index]
+            return series
+        return Reading(self.epochs[index], self.bpms[index], self._source_names[self.sources[index]])
+
+    def between(self, start_epoch, end_epoch):
+        """Samples with start_epoch <= epoch <= end_epoch, found by binary search"""
+        lo = bisect_left(self.epochs, start_epoch)
+        hi = bisect_right(self.epochs, end_epoch)
+        return self[lo:hi]
+
+    @property
+    def latest_epoch(self):
+        return self.epochs[-1] if self.epochs else None
+
+    def to_arrays(self):
+        """(int64 epoch, uint8 bpm) NumPy arrays for the vectorized analyzer"""
+        import numpy as np
+        return (
+            np.frombuffer(self.epochs, dtype=np.uint32).astype(np.int64),
+            np.frombuffer(self.bpms, dtype=np.uint8)
+        )
@@ -0,0 +1,252 @@
+import argparse
+import csv
+import heapq
+import json
+import os
+import sys
+import time
+from bisect import bisect_right
+from datetime import date, datetime, timedelta, timezone
+from dotenv import load_dotenv
+
+from alert_rules import load_alert_rules
+from daemon import Job
+from ingest import HEART_RATE, IngestPipeline, Sample
+from readings import HeartRateSeries, format_epoch
+from sample_store import HeartRateStore, DEFAULT_STORE_PATH
+
+class VirtualClock:
+    """Stand-in for time.time that only moves when the replay advances it"""
+
+    def __init__(self, epoch):
+        self.epoch = epoch
+
+    def __call__(self):
+        return self.epoch
+
+    def advance_to(self, epoch):
+        self.epoch = max(self.epoch, epoch)
+
+    def now(self):
+        return datetime.fromtimestamp(self.epoch).astimezone()
+
+class RecordingSink:
+    """Alert dispatcher stand-in that keeps emails in memory instead of sending them"""
+
+    def __init__(self):
+        self.emails = []
+
+    def submit(self, subject, message, recipient=None):
+        self.emails.append((subject, recipient))
+
+    def close(self):
+        pass
+
+class ReplayHeartRateSource:
+    """Recorded heart rate samples handed out as if the ring had synced them by poll time.
+
+    With sync_seconds the ring uploads on that cadence, so a sample only becomes visible
+    at the next multiple of sync_seconds after it was recorded.
+    """
+    source = 'oura'
+    adaptive = True
+
+    def __init__(self, user_id, series, interval_seconds=300, sync_seconds=0):
+        self.user_id = user_id
+        self.series = series
+        self.interval_seconds = interval_seconds
+        self.sync_seconds = sync_seconds
+        self.position = 0
+
+    @property
+    def name(self):
+        return f"replay heartrate ({self.user_id})"
+
+    def poll(self, now):
+        visible = int(now.timestamp())
+        if self.sync_seconds:
+            visible = visible // self.sync_seconds * self.sync_seconds
+        end = bisect_right(self.series.epochs, visible, self.position)
+        batch = self.series[self.position:end]
+        self.position = end
+        for reading in batch:
+            yield Sample(self.source, self.user_id, HEART_RATE, reading.epoch, reading.bpm, reading.source)
+
+class ReplayPipeline(IngestPipeline):
+    """IngestPipeline that notes when each alert fired on the virtual clock, optionally without storage"""
+
+    def __init__(self, store, dispatcher, clock, alert_engine=None):
+        super().__init__(store, dispatcher, alert_engine=alert_engine)
+        self.clock = clock
+        # (detected_at, Alert)
+        self.fired = []
+
+    def persist(self, heart_rate, other):
+        if self.store is not None:
+            super().persist(heart_rate, other)
+
+    def alert(self, alerts, now_epoch, previous_poll=None):
+        # Every detection is recorded for the latency report, even those too stale to email
+        detected_at = self.clock()
+        self.fired.extend((detected_at, alert) for alert in alerts)
+        super().alert(alerts, now_epoch, previous_poll)
+
+def replay(pipeline, sources, start_epoch, end_epoch, clock):
+    """Poll every source on the daemon's schedule from start_epoch to end_epoch on the virtual clock.
+
+    Returns (polls, samples).
+    """
+    jobs = [Job(source, clock) for source in sources]
+    # Stagger first polls across the shortest interval, as the daemon does
+    spacing = min((source.interval_seconds for source in sources), default=0) / max(len(sources), 1)
+    due = [(start_epoch + i * spacing, i) for i in range(len(jobs))]
+    heapq.heapify(due)
+    polls = samples = 0
+    while due:
+        epoch, i = heapq.heappop(due)
+        if epoch > end_epoch:
+            continue
+        clock.advance_to(epoch)
+        job = jobs[i]
+        batch = list(job.source.poll(clock.now()))
+        pipeline.process(batch, clock(), job.last_success)
+        job.last_success = clock()
+        polls += 1
+        samples += len(batch)
+        heapq.heappush(due, (clock() + job.next_delay(batch), i))
+    return polls, samples
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run_replay(history, start_epoch, end_epoch, alert_engine=None, sink=None, store=None,
+               interval_seconds=300, sync_seconds=0):
+    """Replay {user_id: HeartRateSeries} through scheduling, ingest and alerting. Returns (report, alerts)"""
+    clock = VirtualClock(start_epoch)
+    sink = sink or RecordingSink()
+    pipeline = ReplayPipeline(store, sink, clock, alert_engine)
+    sources = [
+        ReplayHeartRateSource(user_id, series, interval_seconds, sync_seconds)
+        for user_id, series in history.items()
+    ]
+    started = time.perf_counter()
+    polls, samples = replay(pipeline, sources, start_epoch, end_epoch, clock)
+    wall = time.perf_counter() - started
+
+    latencies = [detected_at - alert.epoch for detected_at, alert in pipeline.fired]
+    by_rule = {}
+    for _, alert in pipeline.fired:
+        by_rule[alert.rule] = by_rule.get(alert.rule, 0) + 1
+    report = {
+        'users': len(history),
+        'polls': polls,
+        'samples': samples,
+        'alerts': len(pipeline.fired),
+        'alerts_by_rule': by_rule,
+        'emails': len(sink.emails) if isinstance(sink, RecordingSink) else None,
+        'latency_mean': sum(latencies) / len(latencies) if latencies else None,
+        'latency_p50': percentile(latencies, 0.5) if latencies else None,
+        'latency_p95': percentile(latencies, 0.95) if latencies else None,
+        'latency_max': max(latencies) if latencies else None,
+        'simulated_seconds': end_epoch - start_epoch,
+        'wall_seconds': wall,
+        'samples_per_second': samples / wall if wall else None,
+        'speedup': (end_epoch - start_epoch) / wall if wall else None
+    }
+    return report, pipeline.fired
+
+def load_history(store, user_ids, start_dt, end_dt):
+    """{user_id: HeartRateSeries} for users with samples in [start_dt, end_dt]"""
+    history = {}
+    for user_id in user_ids:
+        series = store.get_series(user_id, start_dt, end_dt)
+        if len(series):
+            history[user_id] = series
+    return history
+
+def synthetic_history(users, start_epoch, end_epoch):
+    """{user_id: HeartRateSeries} of generated 5-second samples (see benchmarks/synthetic.py)"""
+    from benchmarks.synthetic import heart_rate_readings
+    days = (end_epoch - start_epoch) / 86400
+    return {
+        f"user{i}": HeartRateSeries(heart_rate_readings(start_epoch, days=days, seed=i))
+        for i in range(users)
+    }
+
+def print_report(report):
+    print(f"Replayed {report['samples']:,} samples for {report['users']} users in {report['polls']:,} polls")
+    print(f"Simulated {report['simulated_seconds'] / 86400:.1f} days in {report['wall_seconds']:.1f}s "
+          f"({report['samples_per_second']:,.0f} samples/s, {report['speedup']:,.0f}x real time)")
+    print(f"Alerts fired: {report['alerts']}")
+    for rule, count in sorted(report['alerts_by_rule'].items()):
+        print(f"  {rule}: {count}")
+    if report['alerts']:
+        print(f"Latency to detect: mean {report['latency_mean']:.0f}s, p50 {report['latency_p50']:.0f}s, "
+              f"p95 {report['latency_p95']:.0f}s, max {report['latency_max']:.0f}s")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay stored or synthetic heart rate history through the monitor on a virtual clock")
+    parser.add_argument('--start', required=True, type=date.fromisoformat, help="First day, YYYY-MM-DD")
+    parser.add_argument('--end', type=date.fromisoformat, default=date.today(), help="Last day, YYYY-MM-DD (default today)")
+    parser.add_argument('--users-file', help="JSON list of users (default: every user in the store)")
+    parser.add_argument('--columns', help="Replay from a columnar history directory instead of the SQLite store")
+    parser.add_argument('--synthetic', type=int, help="Replay this many synthetic users instead of stored history")
+    parser.add_argument('--rules', help="Alert rules file (default: ALERT_RULES_FILE or alert_rules.json)")
+    parser.add_argument('--interval-minutes', type=float, default=5, help="Base poll interval")
+    parser.add_argument('--sync-minutes', type=float, default=0, help="How often the ring uploads (default: continuously)")
+    parser.add_argument('--alerts-csv', help="Also write every fired alert to this CSV file")
+    parser.add_argument('--json', help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    start_dt = datetime.combine(args.start, datetime.min.time(), timezone.utc)
+    end_dt = datetime.combine(args.end + timedelta(days=1), datetime.min.time(), timezone.utc)
+    start_epoch, end_epoch = int(start_dt.timestamp()), int(end_dt.timestamp())
+
+    if args.synthetic:
+        history = synthetic_history(args.synthetic, start_epoch, end_epoch)
+    else:
+        if args.columns:
+            from hr_columnar import ColumnarStore
+            store = ColumnarStore(args.columns)
+        else:
+            store = HeartRateStore(os.getenv('OURA_STORE_PATH', DEFAULT_STORE_PATH))
+        try:
+            if args.users_file:
+                with open(args.users_file) as f:
+                    user_ids = [user['user_id'] for user in json.load(f)]
+            elif args.columns:
+                user_ids = sorted(os.listdir(args.columns))
+            else:
+                user_ids = store.user_ids()
+            history = load_history(store, user_ids, start_dt, end_dt)
+        finally:
+            store.close()
+    if not history:
+        print("No heart rate history for these users and dates", file=sys.stderr)
+        return 1
+
+    report, alerts = run_replay(
+        history,
+        start_epoch,
+        end_epoch,
+        alert_engine=load_alert_rules(args.rules),
+        interval_seconds=int(args.interval_minutes * 60),
+        sync_seconds=int(args.sync_minutes * 60)
+    )
+    print_report(report)
+    if args.alerts_csv:
+        with open(args.alerts_csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['user_id', 'rule', 'sample_time', 'detected_at', 'latency_seconds', 'detail'])
+            for detected_at, alert in alerts:
+                writer.writerow([alert.user_id, alert.rule, format_epoch(alert.epoch), format_epoch(int(detected_at)),
+                                 int(detected_at - alert.epoch), alert.detail])
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+# Seconds a response stays fresh, by endpoint. Endpoints not listed are never cached
+# unless the request covers only past days.
+ENDPOINT_TTLS = {
+    'daily_readiness': 900,
+    'daily_sleep': 900,
+    'daily_activity': 900,
+    'personal_info': 86400,
+}
+
+class CacheEntry:
+    __slots__ = ('body', 'etag', 'last_modified', 'stored_at', 'expires_at')
+
+    def __init__(self, body, etag=None, last_modified=None, stored_at=None, expires_at=None):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at if stored_at is not None else time.time()
+        # None means immutable: never refetched
+        self.expires_at = expires_at
+
+    def is_fresh(self, now=None):
+        return self.expires_at is None or (now or time.time()) < self.expires_at
+
+def endpoint_name(url):
+    return url.rstrip('/').rsplit('/', 1)[-1]
+
+def is_past_range(params, today=None):
+    """True when the requested range ends before today, so its data can no longer change"""
+    if not params:
+        return False
+    today = today or date.today()
+    if params.get('end_date'):
+        return date.fromisoformat(params['end_date']) < today
+    if params.get('end_datetime'):
+        return datetime.fromisoformat(params['end_datetime']).astimezone().date() < today
+    return False
+
+def cache_key(url, api_key, params):
+    """Stable key for an endpoint + params + token (tokens are hashed, never stored)"""
+    token = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    return f"{token}:{url}?{json.dumps(params or {}, sort_keys=True)}"
+
+class ResponseCache:
+    """Two-tier response cache: a byte-bounded in-memory LRU plus an optional SQLite file"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, path=None, ttls=None):
+        self.max_bytes = max_bytes
+        self.ttls = ENDPOINT_TTLS if ttls is None else ttls
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    body BLOB NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    stored_at REAL NOT NULL,
+                    expires_at REAL
+                )
+                """
+            )
+            self.conn.commit()
+
+    def policy(self, url, params):
+        """Return (cacheable, ttl); a ttl of None means the response is immutable"""
+        if is_past_range(params):
+            return True, None
+        ttl = self.ttls.get(endpoint_name(url))
+        return bool(ttl), ttl
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry
+            if self.conn is None:
+                return None
+            row = self.conn.execute(
+                "SELECT body, etag, last_modified, stored_at, expires_at FROM responses WHERE key = ?",
+                (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = CacheEntry(*row)
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        self._remember(key, entry)
+        if self.conn is not None:
+            with self.lock:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, entry.body, entry.etag, entry.last_modified, entry.stored_at, entry.expires_at)
+                )
+                self.conn.commit()
+
+    def _remember(self, key, entry):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old.body)
+            if len(entry.body) > self.max_bytes:
+                return
+            self.entries[key] = entry
+            self.size += len(entry.body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted.body)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
@@ -0,0 +1,219 @@
+import numpy as np
+
+# Bucket widths of the pyramid, finest first: 1 minute, 15 minutes, 1 hour, 1 day (UTC)
+RESOLUTIONS = (60, 900, 3600, 86400)
+
+def bucket_stats(timestamps, bpm, resolution):
+    """(bucket starts, count, sum, sum of squares, min, max) for time-sorted samples"""
+    buckets = timestamps // resolution * resolution
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    values = bpm.astype(np.int64)
+    counts = np.diff(np.append(starts, len(values)))
+    return (
+        buckets[starts],
+        counts,
+        np.add.reduceat(values, starts),
+        np.add.reduceat(values * values, starts),
+        np.minimum.reduceat(values, starts),
+        np.maximum.reduceat(values, starts)
+    )
+
+def change_epochs(timestamps, bpm, threshold):
+    """Epochs of samples that differ from the previous sample by threshold or more"""
+    values = bpm.astype(np.int16)
+    return timestamps[1:][np.abs(np.diff(values)) >= threshold]
+
+def cover(start, end, resolutions=RESOLUTIONS):
+    """Split [start, end) into (resolution, lo, hi) pieces using the coarsest aligned buckets.
+
+    Edges too ragged for the finest resolution come back with resolution None, meaning
+    they must be read from raw samples.
+    """
+    pieces = []
+
+    def split(lo, hi, level):
+        if lo >= hi:
+            return
+        if level < 0:
+            pieces.append((None, lo, hi))
+            return
+        resolution = resolutions[level]
+        aligned_lo = -(-lo // resolution) * resolution
+        aligned_hi = hi // resolution * resolution
+        if aligned_lo >= aligned_hi:
+            split(lo, hi, level - 1)
+            return
+        pieces.append((resolution, aligned_lo, aligned_hi))
+        split(lo, aligned_lo, level - 1)
+        split(aligned_hi, hi, level - 1)
+
+    split(start, end, len(resolutions) - 1)
+    return pieces
+
+class Rollups:
+    """Heart rate rollup pyramid kept in the sample store's SQLite database.
+
+    Every resolution holds count, sum, sum of squares, min, max and significant-change
+    count per user and bucket. Buckets are updated incrementally as samples are inserted,
+    so summaries over weeks or years read a few hundred rows instead of every sample.
+    A change is counted in the bucket of its later sample.
+    """
+
+    def __init__(self, conn, threshold=10):
+        self.conn = conn
+        self.threshold = threshold
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollups'").fetchone()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rollups (
+                user_id TEXT NOT NULL,
+                resolution INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                sum INTEGER NOT NULL,
+                sumsq INTEGER NOT NULL,
+                min INTEGER,
+                max INTEGER,
+                changes INTEGER NOT NULL,
+                PRIMARY KEY (user_id, resolution, bucket)
+            ) WITHOUT ROWID
+            """
+        )
+        if not exists:
+            # Upgrading a store that predates rollups: build them from what is already stored
+            self.rebuild()
+
+    def _changes_by_bucket(self, epochs, resolution):
+        buckets, counts = np.unique(epochs // resolution * resolution, return_counts=True)
+        return dict(zip(buckets.tolist(), counts.tolist()))
+
+    def add(self, user_id, timestamps, bpm, before_ts, before_bpm, after_ts, after_bpm):
+        """Fold newly inserted samples into every resolution.
+
+        before/after are the stored samples around the insert (from the predecessor of
+        the first new sample to the successor of the last) before and after it, so
+        changes between old and new neighbours are re-counted exactly.
+        """
+        if len(timestamps) == 0:
+            return
+        changes_before = change_epochs(before_ts, before_bpm, self.threshold)
+        changes_after = change_epochs(after_ts, after_bpm, self.threshold)
+        rows = []
+        for resolution in RESOLUTIONS:
+            delta = self._changes_by_bucket(changes_after, resolution)
+            for bucket, count in self._changes_by_bucket(changes_before, resolution).items():
+                delta[bucket] = delta.get(bucket, 0) - count
+            stats = bucket_stats(timestamps, bpm, resolution)
+            for bucket, count, total, sumsq, low, high in zip(*(column.tolist() for column in stats)):
+                rows.append((user_id, resolution, bucket, count, total, sumsq, low, high, delta.pop(bucket, 0)))
+            # Buckets whose change count moved without gaining samples
+            rows.extend(
+                (user_id, resolution, bucket, 0, 0, 0, None, None, changes)
+                for bucket, changes in delta.items() if changes
+            )
+        self.conn.executemany(
+            """
+            INSERT INTO rollups (user_id, resolution, bucket, count, sum, sumsq, min, max, changes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, resolution, bucket) DO UPDATE SET
+                count = count + excluded.count,
+                sum = sum + excluded.sum,
+                sumsq = sumsq + excluded.sumsq,
+                min = MIN(COALESCE(min, excluded.min), COALESCE(excluded.min, min)),
+                max = MAX(COALESCE(max, excluded.max), COALESCE(excluded.max, max)),
+                changes = changes + excluded.changes
+            """,
+            rows
+        )
+
+    def rebuild(self, user_id=None):
+        """Recompute rollups from the raw samples, for one user or everyone"""
+        if user_id is None:
+            self.conn.execute("DELETE FROM rollups")
+            user_ids = [row[0] for row in self.conn.execute("SELECT DISTINCT user_id FROM heart_rate")]
+        else:
+            self.conn.execute("DELETE FROM rollups WHERE user_id = ?", (user_id,))
+            user_ids = [user_id]
+        empty = np.empty(0, dtype=np.int64)
+        for uid in user_ids:
+            rows = self.conn.execute("SELECT ts, bpm FROM heart_rate WHERE user_id = ? ORDER BY ts", (uid,)).fetchall()
+            columns = np.array(rows, dtype=np.int64).reshape(-1, 2)
+            self.add(uid, columns[:, 0], columns[:, 1], empty, empty, columns[:, 0], columns[:, 1])
+        self.conn.commit()
+
+    def _raw(self, user_id, lo, hi):
+        """(count, sum, sumsq, min, max, changes) straight from samples in [lo, hi)"""
+        rows = self.conn.execute(
+            """
+            SELECT ts, bpm FROM (
+                SELECT ts, bpm FROM heart_rate WHERE user_id = ? AND ts < ? ORDER BY ts DESC LIMIT 1
+            )
+            UNION ALL
+            SELECT ts, bpm FROM heart_rate WHERE user_id = ? AND ts >= ? AND ts < ?
+            ORDER BY ts
+            """,
+            (user_id, lo, user_id, lo, hi)
+        ).fetchall()
+        columns = np.array(rows, dtype=np.int64).reshape(-1, 2)
+        inside = columns[columns[:, 0] >= lo]
+        if len(inside) == 0:
+            return 0, 0, 0, None, None, 0
+        values = inside[:, 1]
+        changes = change_epochs(columns[:, 0], columns[:, 1], self.threshold)
+        return (len(values), int(values.sum()), int((values * values).sum()),
+                int(values.min()), int(values.max()), int((changes >= lo).sum()))
+
+    def summary(self, user_id, start_epoch, end_epoch):
+        """Average, std, min, max, sample and change counts for [start_epoch, end_epoch), or None.
+
+        The range is covered with the coarsest buckets that fit it exactly, falling back to
+        finer buckets and raw samples only at ragged edges.
+        """
+        count = total = sumsq = changes = 0
+        low = high = None
+        for resolution, lo, hi in cover(start_epoch, end_epoch):
+            if resolution is None:
+                piece = self._raw(user_id, lo, hi)
+            else:
+                piece = self.conn.execute(
+                    "SELECT COALESCE(SUM(count), 0), COALESCE(SUM(sum), 0), COALESCE(SUM(sumsq), 0), MIN(min), "
+                    "MAX(max), COALESCE(SUM(changes), 0) FROM rollups "
+                    "WHERE user_id = ? AND resolution = ? AND bucket >= ? AND bucket < ?",
+                    (user_id, resolution, lo, hi)
+                ).fetchone()
+            count += piece[0]
+            total += piece[1]
+            sumsq += piece[2]
+            changes += piece[5]
+            if piece[3] is not None:
+                low = piece[3] if low is None else min(low, piece[3])
+                high = piece[4] if high is None else max(high, piece[4])
+        if not count:
+            return None
+        average = total / count
+        return {
+            'count': count,
+            'average': average,
+            'std': max(sumsq / count - average * average, 0) ** 0.5,
+            'minimum': low,
+            'maximum': high,
+            'changes': changes
+        }
+
+    def buckets(self, user_id, start_epoch, end_epoch, max_points=500):
+        """Chart rows (bucket, count, average, std, min, max, changes) for [start_epoch, end_epoch).
+
+        Uses the finest resolution that needs at most max_points buckets (daily beyond that).
+        """
+        span = max(end_epoch - start_epoch, 1)
+        resolution = next((r for r in RESOLUTIONS if span / r <= max_points), RESOLUTIONS[-1])
+        rows = self.conn.execute(
+            "SELECT bucket, count, sum, sumsq, min, max, changes FROM rollups "
+            "WHERE user_id = ? AND resolution = ? AND bucket >= ? AND bucket < ? AND count > 0 ORDER BY bucket",
+            (user_id, resolution, start_epoch // resolution * resolution, end_epoch)
+        )
+        result = []
+        for bucket, count, total, sumsq, low, high, changes in rows:
+            average = total / count
+            result.append((bucket, count, average, max(sumsq / count - average * average, 0) ** 0.5, low, high, changes))
+        return resolution, result
@@ -0,0 +1,151 @@
+import itertools
+import sqlite3
+import numpy as np
+from datetime import datetime, timezone
+from readings import Reading, HeartRateSeries, normalize
+from rollups import Rollups
+
+DEFAULT_STORE_PATH = "heart_rate.db"
+
+class HeartRateStore:
+    """Append-only SQLite store for heart rate samples, keyed by user and timestamp"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS heart_rate (
+                user_id TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                bpm INTEGER NOT NULL,
+                source TEXT,
+                PRIMARY KEY (user_id, ts)
+            ) WITHOUT ROWID
+            """
+        )
+        # Everything that is not a heart rate sample: readiness scores, Garmin HRV and stats, ...
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS samples (
+                source TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                value REAL NOT NULL,
+                PRIMARY KEY (source, user_id, metric, ts)
+            ) WITHOUT ROWID
+            """
+        )
+        self.rollups = Rollups(self.conn)
+        self.conn.commit()
+
+    def add_readings(self, user_id, readings):
+        """Insert API readings or Reading records (any iterable), skipping samples already stored.
+
+        The rollup pyramid is updated with the new samples in the same transaction.
+        Returns the number added.
+        """
+        by_epoch = {}
+        for reading in normalize(readings):
+            by_epoch.setdefault(reading.epoch, reading)
+        if not by_epoch:
+            return 0
+
+        # Stored samples from just before the first new one to just after the last
+        around = np.array(self.conn.execute(
+            """
+            SELECT ts, bpm FROM (SELECT ts, bpm FROM heart_rate WHERE user_id = ? AND ts < ? ORDER BY ts DESC LIMIT 1)
+            UNION ALL
+            SELECT ts, bpm FROM heart_rate WHERE user_id = ? AND ts BETWEEN ? AND ?
+            UNION ALL
+            SELECT ts, bpm FROM (SELECT ts, bpm FROM heart_rate WHERE user_id = ? AND ts > ? ORDER BY ts LIMIT 1)
+            """,
+            (user_id, min(by_epoch), user_id, min(by_epoch), max(by_epoch), user_id, max(by_epoch))
+        ).fetchall(), dtype=np.int64).reshape(-1, 2)
+        for epoch in around[:, 0].tolist():
+            by_epoch.pop(epoch, None)
+        if not by_epoch:
+            return 0
+
+        new = [by_epoch[epoch] for epoch in sorted(by_epoch)]
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO heart_rate (user_id, ts, bpm, source) VALUES (?, ?, ?, ?)",
+            ((user_id, reading.epoch, reading.bpm, reading.source) for reading in new)
+        )
+        timestamps = np.array([reading.epoch for reading in new], dtype=np.int64)
+        bpm = np.array([reading.bpm for reading in new], dtype=np.int64)
+        merged = np.concatenate((around, np.column_stack((timestamps, bpm))))
+        merged = merged[np.argsort(merged[:, 0], kind='stable')]
+        self.rollups.add(user_id, timestamps, bpm, around[:, 0], around[:, 1], merged[:, 0], merged[:, 1])
+        self.conn.commit()
+        return len(new)
+
+    def add_samples(self, samples):
+        """Insert or update ingest Samples (source, user_id, metric, epoch, value). Returns the rows written"""
+        rows = ((sample.source, sample.user_id, sample.metric, sample.epoch, sample.value) for sample in samples)
+        before = self.conn.total_changes
+        # Daily values are revised during the day, so a newer value for the same timestamp wins
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO samples (source, user_id, metric, ts, value) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+        self.conn.commit()
+        return self.conn.total_changes - before
+
+    def get_samples(self, source, user_id, metric, start_datetime, end_datetime):
+        """Stored (epoch, value) pairs for one source, user and metric in [start, end], oldest first"""
+        return self.conn.execute(
+            "SELECT ts, value FROM samples WHERE source = ? AND user_id = ? AND metric = ? AND ts BETWEEN ? AND ? "
+            "ORDER BY ts",
+            (source, user_id, metric, int(start_datetime.timestamp()), int(end_datetime.timestamp()))
+        ).fetchall()
+
+    def latest_timestamp(self, user_id):
+        """High-water mark: the newest stored sample time for a user, or None"""
+        row = self.conn.execute(
+            "SELECT MAX(ts) FROM heart_rate WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row[0] is None:
+            return None
+        return datetime.fromtimestamp(row[0], timezone.utc)
+
+    def user_ids(self):
+        """All users with stored samples"""
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT user_id FROM heart_rate ORDER BY user_id")]
+
+    def get_readings(self, user_id, start_datetime, end_datetime):
+        """Return stored samples in [start, end] as Reading records, oldest first"""
+        rows = self.conn.execute(
+            "SELECT ts, bpm, source FROM heart_rate WHERE user_id = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+            (user_id, int(start_datetime.timestamp()), int(end_datetime.timestamp()))
+        )
+        return [Reading(ts, bpm, source) for ts, bpm, source in rows]
+
+    def get_series(self, user_id, start_datetime, end_datetime):
+        """Return stored samples in [start, end] as a compact HeartRateSeries"""
+        rows = self.conn.execute(
+            "SELECT ts, bpm, source FROM heart_rate WHERE user_id = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+            (user_id, int(start_datetime.timestamp()), int(end_datetime.timestamp()))
+        )
+        series = HeartRateSeries()
+        for ts, bpm, source in rows:
+            series.append(Reading(ts, bpm, source))
+        return series
+
+    def get_arrays(self, user_id, start_datetime, end_datetime):
+        """Return stored samples in [start, end] as (int64 epoch, uint8 bpm) NumPy arrays"""
+        rows = self.conn.execute(
+            "SELECT ts, bpm FROM heart_rate WHERE user_id = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+            (user_id, int(start_datetime.timestamp()), int(end_datetime.timestamp()))
+        )
+        # Stream the (ts, bpm) pairs straight into one flat array instead of building a list of tuples
+        columns = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64).reshape(-1, 2)
+        return columns[:, 0].copy(), columns[:, 1].astype(np.uint8)
+
+    def summary(self, user_id, start_datetime, end_datetime):
+        """Heart rate summary for [start, end) from the rollup pyramid (see Rollups.summary)"""
+        return self.rollups.summary(user_id, int(start_datetime.timestamp()), int(end_datetime.timestamp()))
+
+    def close(self):
+        self.conn.close()
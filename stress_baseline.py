@@ -0,0 +1,208 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+from datetime import date
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from api_models import readiness_from_record
+from stress_monitor import STRESS_INDICATORS, STRESS_LEVELS, analyze_wellness
+
+METRICS = ("readiness_score", "hrv_balance", "recovery_index", "resting_hr", "temperature")
+
+# Smallest robust spread used for z-scores, so a perfectly steady history doesn't turn
+# the first small wobble into a huge deviation
+MIN_SCALE = {"temperature": 0.1}
+DEFAULT_MIN_SCALE = 2.0
+# MAD * 1.4826 estimates the standard deviation for normally distributed values
+MAD_TO_STD = 1.4826
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+class WellnessTable:
+    """Daily wellness metrics for many users as parallel NumPy columns, sorted by user then day.
+
+    user indexes into user_ids, day is days since 1970-01-01 and missing values are NaN.
+    """
+
+    def __init__(self, user_ids, user, day, columns):
+        self.user_ids = user_ids
+        self.user = user
+        self.day = day
+        self.columns = columns
+
+    @classmethod
+    def from_readiness(cls, records_by_user):
+        """Table from {user_id: daily_readiness records (DailyReadiness or raw dicts)}; the last record per day wins"""
+        user_ids = sorted(records_by_user)
+        users, days = [], []
+        values = {metric: [] for metric in METRICS}
+        for index, user_id in enumerate(user_ids):
+            for record in records_by_user[user_id]:
+                if isinstance(record, dict):
+                    record = readiness_from_record(record)
+                wellness = analyze_wellness([record])
+                users.append(index)
+                days.append(date.fromisoformat(record.day).toordinal())
+                for metric in METRICS:
+                    values[metric].append(wellness[metric])
+
+        user = np.array(users, dtype=np.int64)
+        day = np.array(days, dtype=np.int64) - EPOCH_ORDINAL
+        columns = {metric: np.array(column, dtype=np.float64) for metric, column in values.items()}
+        # Stable sort keeps arrival order within a day, so the last duplicate is the one kept
+        order = np.lexsort((day, user))
+        user, day = user[order], day[order]
+        keep = np.ones(len(order), dtype=bool)
+        keep[:-1] = (user[1:] != user[:-1]) | (day[1:] != day[:-1])
+        return cls(user_ids, user[keep], day[keep], {metric: column[order][keep] for metric, column in columns.items()})
+
+    def __len__(self):
+        return len(self.day)
+
+    def row(self, index):
+        """One row as an analyze_wellness-style dict (None for missing values)"""
+        return {metric: None if np.isnan(column[index]) else column[index].item()
+                for metric, column in self.columns.items()}
+
+def window_mask(user, day, window_days):
+    """For each row, which of the window_days rows before it belong to the same user and its previous window_days days"""
+    n = len(user)
+    users = sliding_window_view(np.concatenate((np.full(window_days, -1), user)), window_days)[:n]
+    days = sliding_window_view(np.concatenate((np.full(window_days, np.iinfo(np.int64).min // 2), day)), window_days)[:n]
+    return (users == user[:, None]) & (days >= (day - window_days)[:, None])
+
+def sorted_median(ordered, count):
+    """Median of the first count entries of each sorted row (NaN for rows with none)"""
+    rows = np.arange(len(ordered))
+    median = (ordered[rows, np.maximum(count - 1, 0) // 2] + ordered[rows, count // 2]) / 2
+    median[count == 0] = np.nan
+    return median
+
+def rolling_baseline(values, in_window):
+    """(median, MAD, count) of each row's values over its window (see window_mask), ignoring NaNs"""
+    n, window_days = in_window.shape
+    padded = np.concatenate((np.full(window_days, np.nan), values))
+    windows = sliding_window_view(padded.astype(np.float32), window_days)[:n]
+    # Rows sort as: baseline values, then inf for rows outside the window, then NaN for missing values
+    ordered = np.where(in_window, windows, np.float32(np.inf))
+    ordered.sort(axis=1)
+    # A row's window is a contiguous run of the rows just before it, so prefix sums give its NaN count
+    missing = np.concatenate(([0], np.cumsum(np.isnan(padded))))
+    rows = np.arange(n) + window_days
+    span = np.count_nonzero(in_window, axis=1)
+    count = span - (missing[rows] - missing[rows - span])
+    median = sorted_median(ordered, count)
+    with np.errstate(invalid='ignore'):
+        # Deviations keep inf/NaN past the first count entries, so no re-masking is needed
+        np.subtract(ordered, median[:, None].astype(np.float32), out=ordered)
+        np.abs(ordered, out=ordered)
+    ordered.sort(axis=1)
+    return median, sorted_median(ordered, count), count
+
+def score_table(table, window_days=30, min_history=7, z_threshold=1.5):
+    """Personal-baseline stress scoring for every row of a WellnessTable in one pass.
+
+    Each indicator metric is z-scored against the user's own median and MAD over the
+    previous window_days days. Rows with at least min_history days of baseline flag an
+    indicator at |z| >= z_threshold in its stress direction; rows with less history fall
+    back to the fixed limits of assess_stress_level. Returns a dict of arrays: z (per
+    metric), flags (per reason), baseline, indicators and level.
+    """
+    in_window = window_mask(table.user, table.day, window_days)
+    z = {}
+    flags = {}
+    baseline = np.ones(len(table), dtype=bool)
+    for metric, direction, limit, reason in STRESS_INDICATORS:
+        column = table.columns[metric]
+        median, mad, count = rolling_baseline(column, in_window)
+        scale = np.maximum(mad * MAD_TO_STD, MIN_SCALE.get(metric, DEFAULT_MIN_SCALE))
+        score = z[metric] = (column - median) / scale
+        has_baseline = count >= min_history
+        baseline &= has_baseline
+        with np.errstate(invalid='ignore'):
+            if direction == "low":
+                personal, fixed = score <= -z_threshold, column < limit
+            else:
+                personal, fixed = np.abs(score) >= z_threshold, np.abs(column) > limit
+        flags[reason] = np.where(has_baseline, personal, fixed)
+
+    indicators = np.sum(list(flags.values()), axis=0, dtype=np.int64)
+    levels = np.array(STRESS_LEVELS)
+    return {
+        'z': z,
+        'flags': flags,
+        'baseline': baseline,
+        'indicators': indicators,
+        'level': levels[np.minimum(indicators, len(levels) - 1)]
+    }
+
+def stress_at(scores, index):
+    """(level, reasons) for one scored row, in the shape assess_stress_level returns"""
+    reasons = [reason for reason, flagged in scores['flags'].items() if flagged[index]]
+    return str(scores['level'][index]), reasons or ["All metrics look good"]
+
+def load_backfill_readiness(out_dir, user_ids=None):
+    """{user_id: raw daily_readiness records} from backfill.py output"""
+    from hr_columnar import load_json_records
+    if user_ids is None:
+        user_ids = sorted(name for name in os.listdir(out_dir) if not name.startswith('.'))
+    records_by_user = {}
+    for user_id in user_ids:
+        paths = sorted(glob.glob(os.path.join(out_dir, user_id, 'daily_readiness', 'day=*.jsonl.gz')))
+        records = [record for path in paths for record in load_json_records(path)]
+        if records:
+            records_by_user[user_id] = records
+    return records_by_user
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score stress against each user's own rolling baseline from backfilled readiness")
+    parser.add_argument('--backfill', default="backfill", help="backfill.py output directory")
+    parser.add_argument('--users-file', help="JSON list of users (default: every user in the backfill)")
+    parser.add_argument('--window', type=int, default=30, help="Baseline window in days")
+    parser.add_argument('--min-history', type=int, default=7, help="Days of baseline needed before z-scores are used")
+    parser.add_argument('--z', type=float, default=1.5, help="z-score that counts as an indicator")
+    parser.add_argument('--csv', help="Also write every scored row to this CSV file")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.backfill):
+        print(f"Backfill directory {args.backfill} not found; run backfill.py first", file=sys.stderr)
+        return 1
+    user_ids = None
+    if args.users_file:
+        with open(args.users_file) as f:
+            user_ids = [user['user_id'] for user in json.load(f)]
+    table = WellnessTable.from_readiness(load_backfill_readiness(args.backfill, user_ids))
+    if not len(table):
+        print("No backfilled daily_readiness records found", file=sys.stderr)
+        return 1
+    scores = score_table(table, args.window, args.min_history, args.z)
+
+    # Latest day per user
+    last_rows = np.flatnonzero(np.append(table.user[1:] != table.user[:-1], True))
+    print(f"{'user':20} {'day':10} {'level':9} reasons")
+    for index in last_rows:
+        level, reasons = stress_at(scores, index)
+        day = date.fromordinal(int(table.day[index]) + EPOCH_ORDINAL)
+        print(f"{table.user_ids[table.user[index]]:20} {day.isoformat():10} {level:9} {', '.join(reasons)}")
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['user_id', 'day', *METRICS, *(f"z_{metric}" for metric in scores['z']), 'baseline', 'level'])
+            for index in range(len(table)):
+                writer.writerow([
+                    table.user_ids[table.user[index]],
+                    date.fromordinal(int(table.day[index]) + EPOCH_ORDINAL).isoformat(),
+                    *(table.columns[metric][index] for metric in METRICS),
+                    *(round(float(z[index]), 2) for z in scores['z'].values()),
+                    bool(scores['baseline'][index]),
+                    scores['level'][index]
+                ])
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
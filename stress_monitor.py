@@ -1,4 +1,5 @@
-import requests
+import oura_client
+from api_models import decode_page, readiness_from_record
 import time
 from datetime import datetime, timedelta
 
@@ -6,10 +7,7 @@ API_KEY = "GCB6HLCP5FTDPDK3HGFKDAUNUHAKPD4V"
 READINESS_URL = "https://api.ouraring.com/v2/usercollection/daily_readiness"
 
 def get_readiness_metrics():
-    headers = {
-        "Authorization": f"Bearer {API_KEY}"
-    }
-    
+    import requests
     # Get today's data
     today = datetime.now().date()
     params = {
@@ -18,61 +16,59 @@ def get_readiness_metrics():
     }
     
     try:
-        response = requests.get(READINESS_URL, headers=headers, params=params)
+        response = oura_client.get(READINESS_URL, API_KEY, params=params)
         response.raise_for_status()
-        data = response.json()
-        return data
-    except requests.exceptions.RequestException as e:
+        records, _ = decode_page(response.content, readiness_from_record)
+        return records
+    except (requests.exceptions.RequestException, ValueError) as e:
         print(f"Error fetching data: {e}")
         return None
 
 def analyze_wellness(data):
-    if not data or "data" not in data or not data["data"]:
+    """Wellness metrics from DailyReadiness records or a raw daily_readiness response"""
+    if isinstance(data, dict):
+        data = data.get("data")
+    if not data:
         return None
 
     # Get today's metrics
-    metrics = data["data"][0]
-    contributors = metrics.get("contributors", {})
+    readiness = data[0]
+    if isinstance(readiness, dict):
+        readiness = readiness_from_record(readiness)
+    contributors = readiness.contributors
     
     return {
-        "readiness_score": metrics.get("score"),
-        "hrv_balance": contributors.get("hrv_balance"),
-        "recovery_index": contributors.get("recovery_index"),
-        "resting_hr": contributors.get("resting_heart_rate"),
-        "temperature": metrics.get("temperature_deviation")
+        "readiness_score": readiness.score,
+        "hrv_balance": contributors.hrv_balance,
+        "recovery_index": contributors.recovery_index,
+        "resting_hr": contributors.resting_heart_rate,
+        "temperature": readiness.temperature_deviation
     }
 
+# (metric, direction, fixed limit, reason): 'low' flags values under the limit,
+# 'abs' flags deviations beyond it either way. Shared with stress_baseline.py.
+STRESS_INDICATORS = (
+    ("readiness_score", "low", 70, "Low readiness score"),
+    ("hrv_balance", "low", 70, "Low HRV balance"),
+    ("recovery_index", "low", 70, "Low recovery index"),
+    ("temperature", "abs", 0.5, "Temperature deviation"),
+)
+
+# Stress level by number of indicators, capped at HIGH
+STRESS_LEVELS = ("LOW", "MILD", "MODERATE", "HIGH")
+
 def assess_stress_level(metrics):
     if not metrics:
         return "UNKNOWN"
     
-    stress_indicators = 0
     reasons = []
+    for metric, direction, limit, reason in STRESS_INDICATORS:
+        value = metrics[metric]
+        if value and (value < limit if direction == "low" else abs(value) > limit):
+            reasons.append(reason)
     
-    if metrics["readiness_score"] and metrics["readiness_score"] < 70:
-        stress_indicators += 1
-        reasons.append("Low readiness score")
-    
-    if metrics["hrv_balance"] and metrics["hrv_balance"] < 70:
-        stress_indicators += 1
-        reasons.append("Low HRV balance")
-    
-    if metrics["recovery_index"] and metrics["recovery_index"] < 70:
-        stress_indicators += 1
-        reasons.append("Low recovery index")
-    
-    if metrics["temperature"] and abs(metrics["temperature"]) > 0.5:
-        stress_indicators += 1
-        reasons.append("Temperature deviation")
-    
-    if stress_indicators >= 3:
-        return "HIGH", reasons
-    elif stress_indicators >= 2:
-        return "MODERATE", reasons
-    elif stress_indicators >= 1:
-        return "MILD", reasons
-    else:
-        return "LOW", ["All metrics look good"]
+    level = STRESS_LEVELS[min(len(reasons), len(STRESS_LEVELS) - 1)]
+    return level, reasons or ["All metrics look good"]
 
 def display_metrics(metrics):
     if not metrics:
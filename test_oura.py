@@ -1,19 +1,16 @@
 import requests
+import oura_client
+from api_models import decode_personal_info
 
 API_KEY = "GCB6HLCP5FTDPDK3HGFKDAUNUHAKPD4V"
 BASE_URL = "https://api.ouraring.com/v2/usercollection/personal_info"
 
 def get_personal_info():
-    headers = {
-        "Authorization": f"Bearer {API_KEY}"
-    }
-    
     try:
-        response = requests.get(BASE_URL, headers=headers)
+        response = oura_client.get(BASE_URL, API_KEY)
         response.raise_for_status()
-        data = response.json()
-        return data
-    except requests.exceptions.RequestException as e:
+        return decode_personal_info(response.content)
+    except (requests.exceptions.RequestException, ValueError) as e:
         print(f"Error fetching data: {e}")
         return None
 
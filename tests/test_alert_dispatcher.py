@@ -0,0 +1,171 @@
+import socketserver
+import threading
+import time
+from email import message_from_string, policy
+
+import pytest
+
+from alert_dispatcher import AlertDispatcher
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: EHLO, MAIL, RCPT, DATA, RSET, NOOP and QUIT"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 localhost ready")
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line.decode().strip()[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply("250 localhost")
+            elif verb == 'RCPT':
+                if server.reject_recipients:
+                    self.reply("550 no such user")
+                else:
+                    recipients.append(line.decode().split(':', 1)[1].strip().strip('<>'))
+                    self.reply("250 OK")
+            elif verb == 'DATA':
+                self.reply("354 end with .")
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if data in (b".\r\n", b""):
+                        break
+                    lines.append(data.decode())
+                with server.lock:
+                    server.messages.append((recipients, message_from_string("".join(lines), policy=policy.default)))
+                recipients = []
+                self.reply("250 queued")
+                if server.drop_after_each:
+                    return
+            elif verb == 'QUIT':
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 OK")
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """Local stand-in SMTP server that records what it receives"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.reject_recipients = False
+        self.drop_after_each = False
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+@pytest.fixture
+def smtp_server():
+    server = LocalSMTPServer()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def make_dispatcher(server, **kwargs):
+    options = dict(smtp_host='127.0.0.1', smtp_port=server.port, use_tls=False, use_auth=False,
+                   coalesce_seconds=0.1, min_interval_seconds=0)
+    options.update(kwargs)
+    return AlertDispatcher('alerts@example.com', None, **options)
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out waiting for the dispatcher")
+        time.sleep(0.01)
+
+def test_sends_without_password_when_auth_is_off(smtp_server):
+    dispatcher = make_dispatcher(smtp_server)
+    dispatcher.submit("⚠️ rapid_change", "heart rate rose 15")
+    dispatcher.close()
+
+    [(recipients, message)] = smtp_server.messages
+    assert recipients == ['alerts@example.com']
+    assert message['Subject'] == "⚠️ rapid_change"
+
+def test_drops_alerts_without_password_when_auth_is_on(smtp_server):
+    dispatcher = make_dispatcher(smtp_server, use_auth=True)
+    dispatcher.submit("subject", "message")
+    dispatcher.close()
+
+    assert smtp_server.messages == []
+    assert smtp_server.connections == 0
+
+def test_coalesces_alerts_into_one_digest(smtp_server):
+    dispatcher = make_dispatcher(smtp_server, coalesce_seconds=0.5)
+    for i in range(3):
+        dispatcher.submit(f"alert {i}", f"message {i}")
+    dispatcher.close()
+
+    [(_, message)] = smtp_server.messages
+    assert message['Subject'] == "alert 2 (+2 more)"
+    body = message.get_body().get_content()
+    assert all(f"message {i}" in body for i in range(3))
+
+def test_one_digest_per_recipient(smtp_server):
+    dispatcher = make_dispatcher(smtp_server)
+    dispatcher.submit("a", "for alice", recipient='alice@example.com')
+    dispatcher.submit("b", "for bob", recipient='bob@example.com')
+    dispatcher.close()
+
+    assert sorted(recipients[0] for recipients, _ in smtp_server.messages) == ['alice@example.com', 'bob@example.com']
+
+def test_holds_alerts_until_min_interval_then_flushes_on_close(smtp_server):
+    dispatcher = make_dispatcher(smtp_server, min_interval_seconds=60)
+    dispatcher.submit("first", "message")
+    wait_for(lambda: len(smtp_server.messages) == 1)
+
+    dispatcher.submit("second", "message")
+    time.sleep(0.3)
+    assert len(smtp_server.messages) == 1
+
+    dispatcher.close()
+    assert [message['Subject'] for _, message in smtp_server.messages] == ["first", "second"]
+
+def test_reuses_one_connection(smtp_server):
+    dispatcher = make_dispatcher(smtp_server)
+    dispatcher.submit("first", "message")
+    wait_for(lambda: len(smtp_server.messages) == 1)
+    dispatcher.submit("second", "message")
+    dispatcher.close()
+
+    assert len(smtp_server.messages) == 2
+    assert smtp_server.connections == 1
+
+def test_reconnects_after_server_drops_connection(smtp_server):
+    smtp_server.drop_after_each = True
+    dispatcher = make_dispatcher(smtp_server)
+    dispatcher.submit("first", "message")
+    wait_for(lambda: len(smtp_server.messages) == 1)
+    dispatcher.submit("second", "message")
+    dispatcher.close()
+
+    assert [message['Subject'] for _, message in smtp_server.messages] == ["first", "second"]
+    assert smtp_server.connections == 2
+
+def test_rejected_recipient_is_not_retried_on_a_new_connection(smtp_server):
+    smtp_server.reject_recipients = True
+    dispatcher = make_dispatcher(smtp_server, min_interval_seconds=60)
+    dispatcher.submit("subject", "message")
+    time.sleep(0.3)
+    dispatcher.close(timeout=5)
+
+    assert smtp_server.messages == []
+    assert smtp_server.connections == 1
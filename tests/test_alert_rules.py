@@ -0,0 +1,132 @@
+import json
+import time
+
+import pytest
+
+from alert_rules import AlertEngine, build_rule_alert_email, load_alert_rules, recent_alerts
+
+def local_epoch(hour, minute=0):
+    """Epoch of a local wall-clock time on a fixed day, for quiet hours"""
+    return int(time.mktime((2024, 1, 10, hour, minute, 0, 0, 0, -1)))
+
+def run(engine, values, start=None, step=5, user_id='u', metric='heart_rate'):
+    start = local_epoch(12) if start is None else start
+    alerts = []
+    for i, value in enumerate(values):
+        alerts.extend(engine.evaluate(user_id, metric, start + i * step, value))
+    return alerts
+
+def rule(**spec):
+    spec.setdefault('name', 'r')
+    spec.setdefault('metric', 'heart_rate')
+    spec.setdefault('cooldown_seconds', 0)
+    return spec
+
+def test_default_rule_fires_on_rapid_change():
+    alerts = run(AlertEngine(), [60, 62, 65, 71])
+    assert [(alert.rule, alert.value) for alert in alerts] == [('rapid_change', 71)]
+    assert "rose 11" in alerts[0].detail
+
+def test_delta_rule_respects_direction_and_window():
+    engine = AlertEngine({'rules': [rule(type='delta', change=10, window_seconds=60, direction='down')]})
+    assert run(engine, [60, 75]) == []
+    assert [alert.value for alert in run(engine, [70, 64, 60], start=local_epoch(13))] == [60]
+
+    engine = AlertEngine({'rules': [rule(type='delta', change=10, window_seconds=60)]})
+    # 15 bpm apart, but two minutes apart
+    assert run(engine, [60, 75], step=120) == []
+
+def test_threshold_fires_once_per_excursion():
+    engine = AlertEngine({'rules': [rule(type='threshold', above=100)]})
+    alerts = run(engine, [90, 105, 110, 95, 120])
+    assert [alert.value for alert in alerts] == [105, 120]
+
+def test_sustained_fires_after_duration():
+    engine = AlertEngine({'rules': [rule(type='sustained', above=100, duration_seconds=60)]})
+    alerts = run(engine, [110] * 20, step=5)
+    assert len(alerts) == 1
+    assert alerts[0].epoch == local_epoch(12) + 60
+
+    # Dropping below the bound restarts the clock
+    engine = AlertEngine({'rules': [rule(type='sustained', above=100, duration_seconds=60)]})
+    assert run(engine, [110] * 10 + [90] + [110] * 10, step=5) == []
+
+def test_cooldown_suppresses_repeats():
+    engine = AlertEngine({'rules': [rule(type='threshold', above=100, cooldown_seconds=300)]})
+    alerts = run(engine, [110, 90, 110, 90] + [90] * 60 + [110], step=5)
+    assert len(alerts) == 2
+
+def test_quiet_hours_wrap_past_midnight():
+    engine = AlertEngine({'rules': [rule(type='threshold', above=100)], 'quiet_hours': ["22:00", "07:00"]})
+    assert run(engine, [90, 110], start=local_epoch(3)) == []
+    assert len(run(engine, [90, 110], start=local_epoch(8))) == 1
+    assert run(engine, [90, 110], start=local_epoch(23, 30)) == []
+
+def test_user_rules_add_to_or_replace_defaults():
+    config = {
+        'rules': [rule(name='default', type='threshold', above=100)],
+        'users': {
+            'alice': {'rules': [rule(name='low', type='threshold', below=50)]},
+            'bob': {'rules': [rule(name='low', type='threshold', below=50)], 'replace_defaults': True},
+        }
+    }
+    engine = AlertEngine(config)
+    assert {alert.rule for alert in run(engine, [70, 110, 70, 40], user_id='alice')} == {'default', 'low'}
+    assert {alert.rule for alert in run(engine, [70, 110, 70, 40], user_id='bob')} == {'low'}
+
+def test_rules_only_see_their_metric():
+    engine = AlertEngine({'rules': [rule(metric='hrv', type='threshold', below=30)]})
+    assert run(engine, [20]) == []
+    assert len(run(engine, [40, 20], metric='hrv')) == 1
+
+def test_old_and_repeated_samples_are_ignored():
+    engine = AlertEngine({'rules': [rule(type='threshold', above=100)]})
+    start = local_epoch(12)
+    assert engine.evaluate('u', 'heart_rate', start, 90) == []
+    assert len(engine.evaluate('u', 'heart_rate', start + 5, 110)) == 1
+    engine.evaluate('u', 'heart_rate', start + 10, 90)
+    assert engine.evaluate('u', 'heart_rate', start + 5, 110) == []
+
+@pytest.mark.parametrize('spec', [
+    {'metric': 'heart_rate', 'type': 'threshold', 'above': 1},
+    rule(type='bogus'),
+    rule(type='threshold'),
+    rule(type='delta', change=10),
+    rule(type='sustained', above=100),
+])
+def test_invalid_rules_are_rejected(spec):
+    with pytest.raises(ValueError):
+        AlertEngine({'rules': [spec]})
+
+def test_warm_up_updates_state_without_alerting():
+    engine = AlertEngine()
+    start = local_epoch(12)
+    engine.warm_up('u', 'heart_rate', [(start, 60), (start + 5, 80)])
+    # Already-seen samples don't alert again, and the window remembers the warm-up values
+    assert engine.evaluate('u', 'heart_rate', start + 5, 80) == []
+    assert engine.rules_for('u', 'heart_rate').windows[300].minimum == 60
+
+def test_recent_alerts_drops_late_samples():
+    alerts = run(AlertEngine({'rules': [rule(type='threshold', above=100)]}), [110, 90, 110, 90, 110], step=200)
+    now = local_epoch(12) + 900
+    assert [alert.epoch for alert in recent_alerts(alerts, now)] == [local_epoch(12) + 800]
+
+def test_recent_alerts_keep_everything_since_a_distant_previous_poll():
+    alerts = run(AlertEngine({'rules': [rule(type='threshold', above=100)]}), [110, 90, 110, 90, 110], step=600)
+    now = local_epoch(12) + 3000
+    # An hour-long overnight backoff: every alert since the previous poll is still sent
+    assert len(recent_alerts(alerts, now, previous_poll=now - 3600)) == 3
+    assert [alert.epoch for alert in recent_alerts(alerts, now, previous_poll=now - 300)] == [local_epoch(12) + 2400]
+
+def test_load_alert_rules_reads_file(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps({'rules': [rule(name='high', type='threshold', above=100)]}))
+    assert [alert.rule for alert in run(load_alert_rules(str(path)), [90, 110])] == ['high']
+    assert [alert.rule for alert in run(load_alert_rules(str(tmp_path / 'missing.json')), [60, 75])] == ['rapid_change']
+
+def test_alert_email_combines_alerts_and_context():
+    alerts = run(AlertEngine({'rules': [rule(type='threshold', above=100)]}), [110, 90, 110])
+    subject, message = build_rule_alert_email(alerts, "Current: 110 bpm")
+    assert subject == "⚠️ 2 alerts - r"
+    assert message.count("[r]") == 2
+    assert message.endswith("Current: 110 bpm")
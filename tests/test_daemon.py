@@ -0,0 +1,67 @@
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from alert_rules import AlertEngine
+from daemon import warm_up
+from ingest import GarminSource, IngestPipeline, OuraReadinessSource, Sample
+from sample_store import HeartRateStore
+
+NOW = datetime.combine(date.today(), time(12)).astimezone()
+LOW_READINESS = {'rules': [{'name': 'low_readiness', 'metric': 'readiness_score', 'type': 'threshold', 'below': 70}]}
+
+class Outbox:
+    """Dispatcher stand-in that keeps submitted email subjects"""
+
+    def __init__(self):
+        self.subjects = []
+
+    def submit(self, subject, message, recipient=None):
+        self.subjects.append(subject)
+
+class FakeGarmin:
+    """GarminSession stand-in that records calls and returns one stats value per day"""
+    email = 'g@example.com'
+
+    def __init__(self):
+        self.calls = []
+
+    def call(self, method, day):
+        self.calls.append((method, day))
+        return {'restingHeartRate': 50} if method == 'get_stats' else None
+
+@pytest.fixture
+def store(tmp_path):
+    store = HeartRateStore(str(tmp_path / 'store.db'))
+    yield store
+    store.close()
+
+def run_once(store, source, now):
+    """One --once invocation: a fresh pipeline warmed from the store, then a single poll"""
+    outbox = Outbox()
+    pipeline = IngestPipeline(store, outbox, alert_engine=AlertEngine(LOW_READINESS))
+    warm_up(pipeline, store, [source], now)
+    pipeline.process(source.poll(now), int(now.timestamp()))
+    return outbox.subjects
+
+def test_consecutive_runs_alert_on_daily_metrics_once(store):
+    now = NOW
+    today = int(datetime.combine(now.date(), datetime.min.time()).timestamp())
+
+    class Readiness(OuraReadinessSource):
+        def poll(self, now):
+            yield Sample('oura', 'u', 'readiness_score', today, 60)
+
+    assert run_once(store, Readiness('u', 'token'), now) == ["⚠️ low_readiness - readiness_score 60"]
+    assert run_once(store, Readiness('u', 'token'), now + timedelta(minutes=5)) == []
+
+def test_completed_garmin_days_are_not_fetched_again(store):
+    now = NOW
+    today, yesterday = now.date().isoformat(), (now.date() - timedelta(days=1)).isoformat()
+    session = FakeGarmin()
+    run_once(store, GarminSource('u', session), now)
+    assert [day for _, day in session.calls] == [yesterday, yesterday, today, today]
+
+    session.calls.clear()
+    run_once(store, GarminSource('u', session), now + timedelta(minutes=5))
+    assert [day for _, day in session.calls] == [today, today]
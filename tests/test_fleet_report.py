@@ -0,0 +1,46 @@
+from datetime import date
+
+import numpy as np
+
+from fleet_report import build_report, summarize_days
+from readings import Reading
+from sample_store import HeartRateStore
+
+DAY = 1_704_067_200  # 2024-01-01 00:00 UTC
+
+def arrays(*runs):
+    """(epochs, bpm) from (start, count, bpm) runs of 5-second samples"""
+    epochs = np.concatenate([start + 5 * np.arange(count) for start, count, _ in runs]).astype(np.int64)
+    bpm = np.concatenate([np.full(count, value) for _, count, value in runs]).astype(np.uint8)
+    return epochs, bpm
+
+def test_summary_columns():
+    epochs, bpm = arrays((DAY + 3600, 120, 60), (DAY + 7200, 120, 80))
+    [(day, samples, average, minimum, maximum, changes, resting)] = summarize_days(epochs, bpm)
+    assert (day, samples, average, minimum, maximum, changes, resting) == ('2024-01-01', 240, 70.0, 60, 80, 1, 60.0)
+
+def test_resting_hr_ignores_a_lone_sample_after_a_gap():
+    # A steady 70 bpm, then one 45 bpm sample after an hour off the finger
+    epochs, bpm = arrays((DAY + 3600, 120, 70), (DAY + 3 * 3600, 1, 45), (DAY + 3 * 3600 + 600, 120, 72))
+    [row] = summarize_days(epochs, bpm)
+    assert row[3] == 45
+    assert row[6] == 70.0
+
+def test_resting_hr_windows_stay_within_the_day():
+    # The previous evening's low heart rate must not pull down the next day's first windows
+    epochs, bpm = arrays((DAY - 600, 120, 40), (DAY, 120, 65))
+    rows = summarize_days(epochs, bpm)
+    assert [(row[0], row[6]) for row in rows] == [('2023-12-31', 40.0), ('2024-01-01', 65.0)]
+
+def test_resting_hr_is_blank_without_a_covered_window():
+    epochs, bpm = arrays((DAY + 3600, 10, 60))
+    [row] = summarize_days(epochs, bpm)
+    assert row[6] is None
+
+def test_build_report_in_process():
+    store = HeartRateStore(':memory:')
+    epochs, bpm = arrays((DAY + 3600, 120, 60))
+    store.add_readings('u', [Reading(int(epoch), int(value), None) for epoch, value in zip(epochs, bpm)])
+    rows = build_report(store, ['u'], date(2024, 1, 1), date(2024, 1, 1), workers=1)
+    assert rows == [('u', '2024-01-01', 120, 60.0, 60, 60, 0, 60.0)]
+    store.close()
@@ -0,0 +1,69 @@
+import random
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from hr_columnar import ColumnarDay, ColumnarStore
+from readings import Reading
+
+START = 1_704_067_200  # 2024-01-01 00:00 UTC
+SOURCES = ['awake', 'rest', 'sleep', None]
+
+def readings(start, count, step=5, seed=0):
+    rng = random.Random(seed)
+    return [Reading(start + i * step, rng.randint(40, 180), rng.choice(SOURCES)) for i in range(count)]
+
+def as_datetime(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc)
+
+@pytest.fixture
+def store(tmp_path):
+    store = ColumnarStore(str(tmp_path))
+    yield store
+    store.close()
+
+def test_round_trip_across_days(store):
+    # A day and a half of 5 second samples with every kind of source
+    samples = readings(START, 86400 * 3 // 2 // 5)
+    assert store.add_readings('u', samples) == len(samples)
+
+    series = store.get_series('u', as_datetime(START), as_datetime(START + 2 * 86400))
+    assert list(series) == samples
+
+def test_range_bounds_are_inclusive_and_use_the_hour_index(store):
+    samples = readings(START, 86400 // 5)
+    store.add_readings('u', samples)
+
+    lo, hi = START + 3 * 3600 + 17, START + 5 * 3600 + 5
+    epochs, bpm = store.get_arrays('u', as_datetime(lo), as_datetime(hi))
+    expected = [r for r in samples if lo <= r.epoch <= hi]
+    assert epochs.tolist() == [r.epoch for r in expected]
+    assert bpm.tolist() == [r.bpm for r in expected]
+    assert epochs[-1] == hi
+
+def test_single_day_bpm_is_a_read_only_view_of_the_file(store):
+    store.add_readings('u', readings(START, 1000))
+    _, bpm = store.get_arrays('u', as_datetime(START), as_datetime(START + 3600))
+    assert bpm.dtype == np.uint8
+    assert not bpm.flags.writeable
+    assert not bpm.flags.owndata
+
+def test_add_readings_merges_and_skips_stored_samples(store):
+    samples = readings(START, 2000)
+    store.add_readings('u', samples[::2])
+    assert store.add_readings('u', samples) == 1000
+    assert store.add_readings('u', samples) == 0
+    series = store.get_series('u', as_datetime(START), as_datetime(START + 86399))
+    assert list(series) == samples
+
+def test_missing_days_and_users_are_empty(store):
+    epochs, bpm = store.get_arrays('nobody', as_datetime(START), as_datetime(START + 86400))
+    assert len(epochs) == 0 and len(bpm) == 0
+    assert len(store.get_series('nobody', as_datetime(START), as_datetime(START + 86400))) == 0
+
+def test_rejects_files_in_another_format(tmp_path):
+    path = tmp_path / 'bad.hrc'
+    path.write_bytes(b'not a column file' * 20)
+    with pytest.raises(ValueError):
+        ColumnarDay(str(path))
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from alert_rules import AlertEngine
+from ingest import HEART_RATE, IngestPipeline, Sample
+from sample_store import HeartRateStore
+
+NOW = 1_704_880_800  # 2024-01-10 10:00 UTC
+
+class Outbox:
+    """Dispatcher stand-in that keeps submitted emails"""
+
+    def __init__(self):
+        self.emails = []
+
+    def submit(self, subject, message, recipient=None):
+        self.emails.append((subject, message, recipient))
+
+@pytest.fixture
+def store():
+    store = HeartRateStore(':memory:')
+    yield store
+    store.close()
+
+def heart_rate(start, values, step=5, user_id='u'):
+    return [Sample('oura', user_id, HEART_RATE, start + i * step, value, 'awake') for i, value in enumerate(values)]
+
+def test_late_synced_heart_rate_is_stored_without_alerting(store):
+    outbox = Outbox()
+    pipeline = IngestPipeline(store, outbox, alert_engine=AlertEngine())
+    # A jump from two hours ago, only now uploaded by the ring
+    added = pipeline.process(heart_rate(NOW - 7200, [60, 75]), NOW, previous_poll=NOW - 300)
+    assert added == 2
+    assert outbox.emails == []
+    assert store.latest_timestamp('u').timestamp() == NOW - 7195
+
+    pipeline.process(heart_rate(NOW - 60, [60, 75]), NOW, previous_poll=NOW - 300)
+    assert [subject for subject, _, _ in outbox.emails] == ["⚠️ rapid_change - heart_rate 75"]
+
+def test_alerts_since_a_distant_previous_poll_are_sent(store):
+    outbox = Outbox()
+    pipeline = IngestPipeline(store, outbox, alert_engine=AlertEngine())
+    # Overnight backoff: an hour between polls
+    pipeline.process(heart_rate(NOW - 3000, [60, 75]), NOW, previous_poll=NOW - 3600)
+    assert len(outbox.emails) == 1
+
+def test_daily_metrics_alert_for_today_but_not_old_days(store):
+    outbox = Outbox()
+    engine = AlertEngine({'rules': [
+        {'name': 'low_readiness', 'metric': 'readiness_score', 'type': 'threshold', 'below': 70},
+    ]})
+    pipeline = IngestPipeline(store, outbox, {'u': 'u@example.com'}, alert_engine=engine)
+    day = 86400
+    pipeline.process([Sample('oura', 'u', 'readiness_score', NOW - 5 * day, 60)], NOW)
+    pipeline.process([Sample('oura', 'u', 'readiness_score', NOW - 4 * day, 80)], NOW)
+    assert outbox.emails == []
+    pipeline.process([Sample('oura', 'u', 'readiness_score', NOW - 36000, 60)], NOW)
+    assert [(subject, recipient) for subject, _, recipient in outbox.emails] == [
+        ("⚠️ low_readiness - readiness_score 60", 'u@example.com')
+    ]
+
+def test_process_defaults_to_the_current_time(store):
+    outbox = Outbox()
+    pipeline = IngestPipeline(store, outbox, alert_engine=AlertEngine())
+    now = int(time.time())
+    pipeline.process(heart_rate(now - 30, [60, 75]))
+    assert len(outbox.emails) == 1
@@ -0,0 +1,87 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import oura_client
+from oura_client import TokenBucket
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class CountingBucket:
+    """Rate limit stand-in that counts acquires"""
+
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self):
+        self.acquired += 1
+
+class PagedHandler(BaseHTTPRequestHandler):
+    """Two pages of heart rate, answering the first request of each with a 503"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests += 1
+        if self.server.requests in (1, 3):
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        second = 'next_token=2' in self.path
+        body = (b'{"data": [{"bpm": 61, "source": "awake", "timestamp": "2024-01-01T00:00:05+00:00"}], "next_token": null}'
+                if second else
+                b'{"data": [{"bpm": 60, "source": "awake", "timestamp": "2024-01-01T00:00:00+00:00"}], "next_token": "2"}')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture
+def api(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PagedHandler)
+    server.requests = 0
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    monkeypatch.setattr(oura_client, 'retry_delay', lambda attempt, response=None: 0)
+    monkeypatch.setattr(oura_client, '_rate_limits', {})
+    yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def test_bucket_allows_a_burst_then_the_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=3, clock=clock, sleep=clock.sleep)
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.sleeps == [0.5, 0.5]
+    assert clock.now == 1.0
+
+def test_every_page_and_retry_takes_a_token(api):
+    server, base_url = api
+    bucket = CountingBucket()
+    oura_client.set_rate_limit('token', bucket)
+    records = list(oura_client.iter_collection(f"{base_url}/heartrate", 'token', {'start_datetime': 'x'}))
+    assert [record['bpm'] for record in records] == [60, 61]
+    assert server.requests == 4
+    assert bucket.acquired == 4
+
+def test_other_tokens_are_not_limited(api):
+    _, base_url = api
+    bucket = CountingBucket()
+    oura_client.set_rate_limit('token', bucket)
+    list(oura_client.iter_collection(f"{base_url}/heartrate", 'other', {'start_datetime': 'x'}))
+    assert bucket.acquired == 0
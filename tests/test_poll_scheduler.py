@@ -0,0 +1,74 @@
+from poll_scheduler import AdaptivePollScheduler
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+def make_scheduler(**kwargs):
+    clock = FakeClock()
+    return AdaptivePollScheduler(clock=clock, **kwargs), clock
+
+def test_first_poll_is_due_immediately():
+    scheduler, clock = make_scheduler()
+    assert scheduler.next_wakeup() == clock.now
+    assert scheduler.seconds_until_next() == 0
+
+def test_stays_at_base_interval_while_fresh_data_arrives():
+    scheduler, clock = make_scheduler(base_seconds=300)
+    for _ in range(5):
+        assert scheduler.observe(60, clock.now - 30, 'awake') == 300
+        clock.advance(300)
+
+def test_backs_off_while_data_is_stale():
+    scheduler, clock = make_scheduler(base_seconds=300, stale_after_seconds=1800)
+    latest = clock.now - 3600
+    intervals = []
+    for _ in range(4):
+        intervals.append(scheduler.observe(0, latest, 'awake'))
+        clock.advance(intervals[-1])
+    assert intervals == [600, 1200, 2400, 3600]
+
+def test_backoff_is_capped_at_max_seconds():
+    scheduler, clock = make_scheduler(base_seconds=300, max_seconds=900)
+    for _ in range(10):
+        clock.advance(scheduler.observe(0, None))
+    assert scheduler.interval == 900
+
+def test_backs_off_while_wearer_is_asleep():
+    scheduler, clock = make_scheduler(base_seconds=300)
+    assert scheduler.observe(60, clock.now - 30, 'sleep') == 600
+    clock.advance(600)
+    assert scheduler.observe(60, clock.now - 30, 'rest') == 1200
+
+def test_resets_to_base_on_fresh_awake_data():
+    scheduler, clock = make_scheduler(base_seconds=300)
+    for _ in range(4):
+        clock.advance(scheduler.observe(0, None))
+    assert scheduler.interval == 3600
+
+    assert scheduler.observe(12, clock.now - 10, 'awake') == 300
+    assert scheduler.last_new_data == clock.now
+
+def test_empty_poll_with_recent_data_keeps_interval():
+    scheduler, clock = make_scheduler(base_seconds=300)
+    scheduler.observe(60, clock.now - 30, 'awake')
+    clock.advance(300)
+    # Nothing new since the last poll, but the newest sample is not yet stale
+    assert scheduler.observe(0, clock.now - 330, 'awake') == 300
+
+def test_next_wakeup_follows_injected_clock():
+    scheduler, clock = make_scheduler(base_seconds=300)
+    scheduler.observe(60, clock.now - 30, 'awake')
+    polled_at = clock.now
+    assert scheduler.next_wakeup() == polled_at + 300
+
+    clock.advance(120)
+    assert scheduler.seconds_until_next() == 180
+    clock.advance(500)
+    assert scheduler.seconds_until_next() == 0
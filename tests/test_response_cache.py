@@ -0,0 +1,133 @@
+import threading
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import oura_client
+from response_cache import CacheEntry, ResponseCache, cache_key, is_past_range
+
+def entry(size, **kwargs):
+    return CacheEntry(b'x' * size, **kwargs)
+
+def test_policy():
+    cache = ResponseCache()
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    today = date.today().isoformat()
+    assert cache.policy('https://api/daily_readiness', {'end_date': yesterday}) == (True, None)
+    assert cache.policy('https://api/daily_readiness', {'end_date': today}) == (True, 900)
+    assert cache.policy('https://api/heartrate', {'end_datetime': f"{today}T12:00:00+00:00"}) == (False, None)
+
+def test_is_past_range():
+    today = date(2024, 3, 10)
+    assert is_past_range({'end_date': '2024-03-09'}, today)
+    assert not is_past_range({'end_date': '2024-03-10'}, today)
+    assert not is_past_range(None, today)
+    assert not is_past_range({'start_date': '2024-01-01'}, today)
+
+def test_cache_key_hashes_the_token_and_ignores_param_order():
+    key = cache_key('https://api/heartrate', 'secret-token', {'b': 1, 'a': 2})
+    assert 'secret-token' not in key
+    assert key == cache_key('https://api/heartrate', 'secret-token', {'a': 2, 'b': 1})
+    assert key != cache_key('https://api/heartrate', 'other-token', {'a': 2, 'b': 1})
+
+def test_entry_freshness():
+    assert entry(1, expires_at=None).is_fresh(now=10 ** 12)
+    assert entry(1, expires_at=100).is_fresh(now=99)
+    assert not entry(1, expires_at=100).is_fresh(now=100)
+
+def test_memory_tier_is_a_byte_bounded_lru():
+    cache = ResponseCache(max_bytes=100)
+    cache.put('a', entry(40))
+    cache.put('b', entry(40))
+    cache.get('a')
+    cache.put('c', entry(40))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.size == 80
+
+    # Larger than the whole cache: not kept in memory
+    cache.put('huge', entry(101))
+    assert cache.get('huge') is None
+    assert cache.size == 80
+
+def test_sqlite_tier_survives_restarts(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ResponseCache(path=path)
+    cache.put('k', CacheEntry(b'{"data": []}', etag='"v1"', expires_at=None))
+    cache.close()
+
+    cache = ResponseCache(path=path)
+    restored = cache.get('k')
+    assert restored.body == b'{"data": []}'
+    assert restored.etag == '"v1"'
+    assert restored.is_fresh()
+    cache.close()
+
+class ConditionalHandler(BaseHTTPRequestHandler):
+    """Serves one JSON body with an ETag and answers matching If-None-Match with 304"""
+    body = b'{"data": [{"day": "2024-01-01", "score": 80}], "next_token": null}'
+    etag = '"v1"'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.send_header('ETag', self.etag)
+        self.end_headers()
+        self.wfile.write(self.body)
+
+@pytest.fixture
+def api(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ConditionalHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    monkeypatch.setattr(oura_client, '_cache', ResponseCache())
+    yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def test_client_serves_fresh_entries_without_a_request(api):
+    server, base_url = api
+    params = {'start_date': date.today().isoformat(), 'end_date': date.today().isoformat()}
+    first = oura_client.get(f"{base_url}/daily_readiness", 'token', params)
+    second = oura_client.get(f"{base_url}/daily_readiness", 'token', params)
+    assert first.content == second.content == ConditionalHandler.body
+    assert server.requests == [None]
+
+def test_client_revalidates_stale_entries_with_etag(api):
+    server, base_url = api
+    params = {'start_date': date.today().isoformat(), 'end_date': date.today().isoformat()}
+    url = f"{base_url}/daily_readiness"
+    oura_client.get(url, 'token', params)
+    oura_client.get_cache().get(cache_key(url, 'token', params)).expires_at = 0
+
+    response = oura_client.get(url, 'token', params)
+    assert response.status_code == 200
+    assert response.content == ConditionalHandler.body
+    assert server.requests == [None, '"v1"']
+    assert oura_client.get_cache().get(cache_key(url, 'token', params)).is_fresh()
+
+def test_client_does_not_cache_live_heart_rate(api):
+    server, base_url = api
+    now = date.today().isoformat()
+    params = {'start_datetime': f"{now}T00:00:00+00:00", 'end_datetime': f"{now}T23:59:59+00:00"}
+    oura_client.get(f"{base_url}/heartrate", 'token', params)
+    oura_client.get(f"{base_url}/heartrate", 'token', params)
+    assert server.requests == [None, None]
+
+def test_client_bypasses_cache_when_asked(api):
+    server, base_url = api
+    params = {'end_date': (date.today() - timedelta(days=1)).isoformat()}
+    oura_client.get(f"{base_url}/daily_readiness", 'token', params, use_cache=False)
+    oura_client.get(f"{base_url}/daily_readiness", 'token', params, use_cache=False)
+    assert server.requests == [None, None]
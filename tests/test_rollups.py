@@ -0,0 +1,124 @@
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+from readings import Reading
+from rollups import RESOLUTIONS, cover
+from sample_store import HeartRateStore
+
+START = 1_704_067_200  # 2024-01-01 00:00 UTC
+
+def readings(start, count, step=5, seed=0):
+    rng = random.Random(seed)
+    bpm = 65
+    result = []
+    for i in range(count):
+        bpm = min(180, max(40, bpm + rng.choice((-12, -2, -1, 0, 1, 2, 12))))
+        result.append(Reading(start + i * step, bpm, 'awake'))
+    return result
+
+def expected_summary(samples, lo, hi, threshold=10):
+    """Brute-force summary of [lo, hi); changes count against the later sample"""
+    ordered = sorted(samples)
+    inside = [r.bpm for r in ordered if lo <= r.epoch < hi]
+    changes = sum(
+        1 for prev, cur in zip(ordered, ordered[1:])
+        if lo <= cur.epoch < hi and abs(cur.bpm - prev.bpm) >= threshold
+    )
+    average = sum(inside) / len(inside)
+    std = max(sum(v * v for v in inside) / len(inside) - average * average, 0) ** 0.5
+    return {'count': len(inside), 'average': average, 'std': std,
+            'minimum': min(inside), 'maximum': max(inside), 'changes': changes}
+
+def assert_summary(actual, expected):
+    assert actual['count'] == expected['count']
+    assert actual['minimum'] == expected['minimum']
+    assert actual['maximum'] == expected['maximum']
+    assert actual['changes'] == expected['changes']
+    assert actual['average'] == pytest.approx(expected['average'])
+    assert actual['std'] == pytest.approx(expected['std'], abs=1e-6)
+
+def as_datetime(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc)
+
+@pytest.fixture
+def store():
+    store = HeartRateStore(':memory:')
+    yield store
+    store.close()
+
+def test_cover_tiles_the_range_exactly():
+    lo, hi = START + 37, START + 3 * 86400 + 5000
+    pieces = sorted(cover(lo, hi), key=lambda piece: piece[1])
+    assert pieces[0][1] == lo and pieces[-1][2] == hi
+    for (_, _, end), (_, start, _) in zip(pieces, pieces[1:]):
+        assert end == start
+    for resolution, start, end in pieces:
+        if resolution is not None:
+            assert start % resolution == 0 and end % resolution == 0
+    assert 86400 in {resolution for resolution, _, _ in pieces}
+
+def test_summary_matches_raw_samples(store):
+    samples = readings(START, 2 * 86400 // 5)
+    store.add_readings('u', samples)
+    for lo, hi in [(START, START + 2 * 86400), (START + 123, START + 86400 + 4567), (START + 3600, START + 3660)]:
+        assert_summary(store.rollups.summary('u', lo, hi), expected_summary(samples, lo, hi))
+
+def test_out_of_order_inserts_recount_changes_at_the_seams(store):
+    samples = readings(START, 5000, seed=3)
+    shuffled = samples[:]
+    random.Random(1).shuffle(shuffled)
+    for i in range(0, len(shuffled), 700):
+        store.add_readings('u', shuffled[i:i + 700])
+
+    hi = START + 5000 * 5
+    assert_summary(store.rollups.summary('u', START, hi), expected_summary(samples, START, hi))
+    incremental = store.conn.execute("SELECT * FROM rollups ORDER BY 1, 2, 3").fetchall()
+    store.rollups.rebuild('u')
+    rebuilt = store.conn.execute("SELECT * FROM rollups ORDER BY 1, 2, 3").fetchall()
+    # Buckets whose changes cancelled out may remain as empty rows; ignore them
+    assert [row for row in incremental if row[3] or row[8]] == [row for row in rebuilt if row[3] or row[8]]
+
+def test_duplicates_are_not_counted_twice(store):
+    samples = readings(START, 1000)
+    assert store.add_readings('u', samples) == 1000
+    assert store.add_readings('u', samples[500:]) == 0
+    assert store.rollups.summary('u', START, START + 86400)['count'] == 1000
+
+def test_users_are_kept_apart(store):
+    store.add_readings('a', readings(START, 100, seed=1))
+    store.add_readings('b', readings(START, 50, seed=2))
+    assert store.rollups.summary('a', START, START + 86400)['count'] == 100
+    assert store.rollups.summary('b', START, START + 86400)['count'] == 50
+    assert store.rollups.summary('c', START, START + 86400) is None
+
+def test_store_summary_takes_datetimes(store):
+    samples = readings(START, 720)
+    store.add_readings('u', samples)
+    summary = store.summary('u', as_datetime(START), as_datetime(START + 3600))
+    assert_summary(summary, expected_summary(samples, START, START + 3600))
+
+def test_buckets_pick_the_finest_resolution_within_max_points(store):
+    store.add_readings('u', readings(START, 2 * 86400 // 5))
+    resolution, rows = store.rollups.buckets('u', START, START + 2 * 86400, max_points=100)
+    assert resolution == 3600
+    assert len(rows) == 48
+    assert sum(row[1] for row in rows) == 2 * 86400 // 5
+
+    resolution, _ = store.rollups.buckets('u', START, START + 365 * 86400, max_points=100)
+    assert resolution == RESOLUTIONS[-1]
+
+def test_rollups_are_built_for_a_store_that_predates_them(tmp_path):
+    path = str(tmp_path / 'hr.db')
+    store = HeartRateStore(path)
+    samples = readings(START, 2000)
+    store.add_readings('u', samples)
+    store.conn.execute("DROP TABLE rollups")
+    store.conn.commit()
+    store.close()
+
+    store = HeartRateStore(path)
+    hi = START + 2000 * 5
+    assert_summary(store.rollups.summary('u', START, hi), expected_summary(samples, START, hi))
+    store.close()